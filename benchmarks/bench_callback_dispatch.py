@@ -0,0 +1,88 @@
+"""
+Время маршрутизации одного callback_query через Dispatcher при большом числе хендлеров:
+прежняя схема (цепочка F.data.startswith(...) + разбор call.data.split("_")) против
+CallbackRoutes (поиск по префиксу в словаре + типизированный CallbackData).
+Запуск: python -m benchmarks.bench_callback_dispatch [--handlers 60] [--updates 2000]
+"""
+import argparse
+import asyncio
+import random
+import time
+import types
+from datetime import datetime
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery, Chat, Message, Update, User
+
+from bot.routing import CallbackRoutes
+
+USER = User(id=1, is_bot=False, first_name="Официант")
+MESSAGE = Message(message_id=1, date=datetime.now(), chat=Chat(id=1, type="private"))
+
+
+def legacy_dispatcher(handlers: int) -> tuple[Dispatcher, list[str]]:
+    router = Router()
+    for i in range(handlers):
+        async def handler(call: CallbackQuery):
+            int(call.data.split("_")[1])
+        router.callback_query.register(handler, F.data.startswith(f"legacy{i}_"))
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp, [f"legacy{i}_{1000 + i}" for i in range(handlers)]
+
+
+def table_dispatcher(handlers: int) -> tuple[Dispatcher, list[str]]:
+    router = Router()
+    routes = CallbackRoutes(router)
+    data = []
+    for i in range(handlers):
+        factory = types.new_class(
+            f"Callback{i}", (CallbackData,), {"prefix": f"c{i}"},
+            lambda ns: ns.update({"__annotations__": {"id": int}}),
+        )
+
+        async def handler(call: CallbackQuery, callback_data):
+            callback_data.id
+
+        routes(factory)(handler)
+        data.append(factory(id=1000 + i).pack())
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp, data
+
+
+async def measure(dp: Dispatcher, bot: Bot, data: list[str]) -> float:
+    updates = [
+        Update(update_id=n, callback_query=CallbackQuery(
+            id=str(n), from_user=USER, chat_instance="1", data=callback_data, message=MESSAGE,
+        ))
+        for n, callback_data in enumerate(data)
+    ]
+    started = time.perf_counter()
+    for update in updates:
+        await dp.feed_update(bot, update)
+    return (time.perf_counter() - started) / len(updates) * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--handlers", type=int, default=60)
+    parser.add_argument("--updates", type=int, default=2000)
+    args = parser.parse_args()
+    bot = Bot(token="123456:benchmark")
+    random.seed(1)
+    picks = [random.randrange(args.handlers) for _ in range(args.updates)]
+    print(f"хендлеров: {args.handlers}, апдейтов: {args.updates}")
+    print(f"{'схема':<24} {'первый':>10} {'последний':>10} {'случайный':>10}  мкс/апдейт")
+    for name, build in (("startswith-цепочка", legacy_dispatcher), ("таблица префиксов", table_dispatcher)):
+        dp, data = build(args.handlers)
+        first = await measure(dp, bot, [data[0]] * args.updates)
+        last = await measure(dp, bot, [data[-1]] * args.updates)
+        mixed = await measure(dp, bot, [data[i] for i in picks])
+        print(f"{name:<24} {first:>10.1f} {last:>10.1f} {mixed:>10.1f}")
+    await bot.session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,139 @@
+"""
+Число обращений к БД (BEGIN/COMMIT/ROLLBACK + SQL-команды) и время на одну операцию DAO:
+старая схема add → commit → refresh и чтение строки перед UPDATE против
+INSERT ... RETURNING, точечного UPDATE и unit_of_work.
+Нужна живая база: DATABASE_URL=... python -m benchmarks.bench_dao_roundtrips [--repeat 50]
+Созданные строки удаляются в конце.
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+from sqlalchemy import event, delete, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from database.dao import DAO
+from database.engine import engine, async_session_maker
+from database.models import User, Restaurant, Category, Dish, TestResult
+
+# До переделки сессии были с expire_on_commit=True (по умолчанию)
+legacy_session_maker = async_sessionmaker(engine, class_=AsyncSession)
+
+trips = Counter()
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    trips["statements"] += 1
+
+
+@event.listens_for(engine.sync_engine, "begin")
+def _count_begin(conn):
+    trips["begin"] += 1
+
+
+@event.listens_for(engine.sync_engine, "commit")
+def _count_commit(conn):
+    trips["commit"] += 1
+
+
+@event.listens_for(engine.sync_engine, "rollback")
+def _count_rollback(conn):
+    trips["rollback"] += 1
+
+
+# ---- старая реализация (как было в DAO) ----
+async def legacy_add(session, obj):
+    session.add(obj)
+    await session.commit()
+    await session.refresh(obj)
+    return obj
+
+
+async def legacy_set_video_file_id(session, dish_id, file_id):
+    result = await session.get(Dish, dish_id)
+    result.video_file_id = file_id
+    await session.commit()
+
+
+async def legacy_ops(rid):
+    async with legacy_session_maker() as session:
+        category = await legacy_add(session, Category(name="Супы", restaurant_id=rid))
+        # id запоминаем сразу: следующий commit снова «протухает» объект
+        dish_id = (await legacy_add(session, Dish(name="Борщ", category_id=category.id, restaurant_id=rid))).id
+        user = await legacy_add(session, User(first_name="И", last_name="П", tg_id=None, role="waiter", restaurant_id=rid))
+        await legacy_add(session, TestResult(user_id=user.id, score=90))
+        await legacy_set_video_file_id(session, dish_id, "file-id")
+
+
+async def legacy_dish_flow(rid):
+    # Категория + блюдо + file_id: три отдельные транзакции
+    async with legacy_session_maker() as session:
+        category = await legacy_add(session, Category(name="Салаты", restaurant_id=rid))
+        dish = await legacy_add(session, Dish(name="Оливье", category_id=category.id, restaurant_id=rid))
+        await legacy_set_video_file_id(session, dish.id, "file-id")
+
+
+# ---- текущая реализация ----
+async def current_ops(rid):
+    async with async_session_maker() as session:
+        dao = DAO(session)
+        category = await dao.create_category("Супы", rid)
+        dish = await dao.create_dish("Борщ", category.id, rid)
+        user = await dao.create_user("И", "П", None, None, "waiter", rid)
+        await dao.add_test_result(user.id, 90, restaurant_id=rid)
+        await dao.set_dish_video_file_id(dish.id, "file-id")
+
+
+async def current_dish_flow(rid):
+    async with async_session_maker() as session:
+        dao = DAO(session)
+        async with dao.unit_of_work():
+            category = await dao.create_category("Салаты", rid)
+            dish = await dao.create_dish("Оливье", category.id, rid)
+            await dao.set_dish_video_file_id(dish.id, "file-id")
+
+
+async def measure(name, ops_per_call, func, rid, repeat):
+    await func(rid)  # прогрев: соединение и кэш prepared statements
+    trips.clear()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        await func(rid)
+    elapsed = time.perf_counter() - started
+    total = sum(trips.values())
+    per_call = total / repeat
+    print(
+        f"{name:<26} {per_call:>9.1f} {per_call / ops_per_call:>9.1f}"
+        f" {trips['begin'] / repeat:>6.1f} {trips['commit'] / repeat:>7.1f}"
+        f" {trips['statements'] / repeat:>6.1f} {elapsed / repeat * 1000:>9.2f}"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+    async with async_session_maker() as session:
+        rid = (await DAO(session).create_restaurant("bench_dao_roundtrips")).id
+    try:
+        print(f"{'сценарий':<26} {'обращ.':>9} {'на опер.':>9} {'BEGIN':>6} {'COMMIT':>7} {'SQL':>6} {'мс':>9}")
+        await measure("5 операций, было", 5, legacy_ops, rid, args.repeat)
+        await measure("5 операций, стало", 5, current_ops, rid, args.repeat)
+        await measure("создание блюда, было", 3, legacy_dish_flow, rid, args.repeat)
+        await measure("создание блюда, стало", 3, current_dish_flow, rid, args.repeat)
+    finally:
+        async with async_session_maker() as session:
+            user_ids = select(User.id).where(User.restaurant_id == rid)
+            await session.execute(delete(TestResult).where(TestResult.user_id.in_(user_ids)))
+            await session.execute(delete(User).where(User.restaurant_id == rid))
+            await session.execute(delete(Dish).where(Dish.restaurant_id == rid))
+            await session.execute(delete(Category).where(Category.restaurant_id == rid))
+            await session.execute(delete(Restaurant).where(Restaurant.id == rid))
+            await session.commit()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
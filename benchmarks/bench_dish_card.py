@@ -0,0 +1,74 @@
+"""
+Стоимость подготовки карточки блюда на один показ: прежняя сборка в хендлере
+(regex по составу, f-строка, новая InlineKeyboardMarkup) против кэша подписей
+dish_cards и заранее собранных клавиатур.
+Запуск: python -m benchmarks.bench_dish_card [--dishes 300] [--views 100000]
+"""
+import argparse
+import random
+import re
+import time
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from bot.dish_cards import WAITER_CARD_KEYBOARDS, DishCardCache
+from database.menu_cache import DishCard, MenuSnapshot
+
+
+def legacy_card(dish):
+    # Так карточка собиралась в waiter_choose_dish до кэша
+    kb = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="⬅️ Назад", callback_data="waiter_prev_dish"), InlineKeyboardButton(text="➡️ Далее", callback_data="waiter_next_dish")],
+            [InlineKeyboardButton(text="📸 Фотография", callback_data="waiter_toggle_media")],
+            [InlineKeyboardButton(text="🔙 К категориям", callback_data="waiter_back_dishes")]
+        ]
+    )
+    if dish.composition:
+        raw_ingredients = re.split(r",\s*|\s{2,}", dish.composition)
+        ingredients_text = '\n'.join([f"• {i.strip()}" for i in raw_ingredients if i.strip()])
+    else:
+        ingredients_text = "Нет данных"
+    caption = f"<b>{dish.name} 🍽️</b>\n\n<b>Состав:</b>\n{ingredients_text}\n\n<b>Описание:</b>\n{dish.description}"
+    return caption, kb
+
+
+def make_menu(dishes: int) -> MenuSnapshot:
+    menu = MenuSnapshot(restaurant_id=1, version=0)
+    words = ["картофель", "говядина", "лук", "морковь", "сметана", "укроп", "чеснок", "соль", "перец", "масло"]
+    for dish_id in range(1, dishes + 1):
+        menu.dishes[dish_id] = DishCard(
+            id=dish_id,
+            name=f"Блюдо {dish_id}",
+            category_id=dish_id % 10,
+            composition=", ".join(random.sample(words, 6)),
+            description="Подаётся горячим, со сметаной и зеленью. " * 3,
+        )
+    return menu
+
+
+def measure(views, render) -> float:
+    started = time.perf_counter()
+    for dish in views:
+        render(dish)
+    return (time.perf_counter() - started) / len(views) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dishes", type=int, default=300)
+    parser.add_argument("--views", type=int, default=100000)
+    args = parser.parse_args()
+    random.seed(1)
+    menu = make_menu(args.dishes)
+    views = random.choices(list(menu.dishes.values()), k=args.views)
+    cache = DishCardCache()
+    legacy = measure(views, legacy_card)
+    cached = measure(views, lambda dish: (cache.caption(menu, dish), WAITER_CARD_KEYBOARDS["photo"]))
+    print(f"блюд: {args.dishes}, показов: {args.views}")
+    print(f"{'сборка в хендлере':<22} {legacy:>8.2f} мкс/показ")
+    print(f"{'кэш карточек':<22} {cached:>8.2f} мкс/показ  (x{legacy / cached:.0f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Время поиска блюда по меню: построение индекса на версию меню и один запрос
+(с опечатками и незаконченными словами, как в inline-режиме).
+Запуск: python -m benchmarks.bench_dish_search [--dishes 5000] [--queries 2000]
+"""
+import argparse
+import random
+import time
+
+from bot.dish_search import build_search_index
+from database.menu_cache import DishCard, MenuSnapshot
+
+WORDS = [
+    "картофель", "говядина", "свинина", "курица", "лосось", "креветки", "лук", "морковь",
+    "сметана", "укроп", "чеснок", "соль", "перец", "масло", "сыр", "томаты", "огурцы",
+    "грибы", "рис", "гречка", "капуста", "свекла", "яйцо", "мука", "сливки", "базилик",
+]
+NAMES = ["Борщ", "Солянка", "Пельмени", "Вареники", "Оливье", "Цезарь", "Плов", "Жаркое", "Котлета", "Блины"]
+QUERIES = ["борщ", "борща", "пелмени", "салат цезар", "картофил", "сливоч", "грибы сметана", "лосос креветк"]
+
+
+def make_menu(dishes: int) -> MenuSnapshot:
+    menu = MenuSnapshot(restaurant_id=1, version=0)
+    for dish_id in range(1, dishes + 1):
+        menu.dishes[dish_id] = DishCard(
+            id=dish_id,
+            name=f"{random.choice(NAMES)} {random.choice(WORDS)} {dish_id}",
+            category_id=dish_id % 20,
+            composition=", ".join(random.sample(WORDS, 6)),
+            description=" ".join(random.choices(WORDS, k=25)),
+        )
+    return menu
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dishes", type=int, default=5000)
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+    random.seed(1)
+    menu = make_menu(args.dishes)
+    started = time.perf_counter()
+    index = build_search_index(menu)
+    built = (time.perf_counter() - started) * 1000
+    queries = random.choices(QUERIES, k=args.queries)
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        index.search(query)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+    print(f"блюд: {args.dishes}, слов в словаре: {len(index.word_list)}, запросов: {args.queries}")
+    print(f"построение индекса: {built:.1f} мс")
+    print(f"запрос: медиана {timings[len(timings) // 2]:.2f} мс, p99 {timings[int(len(timings) * 0.99)]:.2f} мс")
+
+
+if __name__ == "__main__":
+    main()
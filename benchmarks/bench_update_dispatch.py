@@ -0,0 +1,104 @@
+"""
+Время маршрутизации текстового сообщения через Dispatcher: прежняя схема (три роутера
+с CommandStart, цепочки F.text.lower() == ... и проверка роли внутри хендлера) против
+нынешней (RoleFilter на роутере + таблица кнопок TextRoutes, один /start).
+Пользователь с ролью кладётся в data внешним middleware, как это делает DbSessionMiddleware.
+Запуск: python -m benchmarks.bench_update_dispatch [--updates 2000]
+"""
+import argparse
+import asyncio
+import time
+import types
+from datetime import datetime
+
+from aiogram import Bot, Dispatcher, F, Router
+from aiogram.filters import CommandStart
+from aiogram.types import Chat, Message, Update, User
+
+from bot.routing import RoleFilter, TextRoutes
+
+TG_USER = User(id=1, is_bot=False, first_name="Официант")
+CHAT = Chat(id=1, type="private")
+
+WAITER_BUTTONS = ["меню", "тест"]
+ADMIN_BUTTONS = [
+    "🍽️ блюдо", "📂 категории", "📋 меню", "📥 импорт меню", "📤 экспорт меню",
+    "📊 статистика", "🤝 сделать приглашение", "🧑‍🤝‍🧑 штат",
+]
+SUPER_ADMIN_BUTTONS = ["создать ресторан", "сделать администратора"]
+
+
+async def handler(message: Message, user):
+    pass
+
+
+def with_user(dp: Dispatcher, role: str) -> Dispatcher:
+    user = types.SimpleNamespace(role=role, restaurant_id=1)
+
+    async def inject_user(handler, event, data):
+        data["user"] = user
+        return await handler(event, data)
+
+    dp.message.outer_middleware(inject_user)
+    return dp
+
+
+def legacy_dispatcher() -> Dispatcher:
+    dp = Dispatcher()
+    for buttons in (WAITER_BUTTONS, ADMIN_BUTTONS, SUPER_ADMIN_BUTTONS):
+        router = Router()
+        router.message.register(handler, CommandStart())
+        for text in buttons:
+            router.message.register(handler, F.text.lower() == text)
+        dp.include_router(router)
+    return dp
+
+
+def table_dispatcher() -> Dispatcher:
+    dp = Dispatcher()
+    start = Router()
+    start.message.register(handler, CommandStart())
+    dp.include_router(start)
+    for role, buttons in (("waiter", WAITER_BUTTONS), ("admin", ADMIN_BUTTONS), ("superadmin", SUPER_ADMIN_BUTTONS)):
+        router = Router()
+        router.message.filter(RoleFilter(role))
+        routes = TextRoutes(router)
+        for text in buttons:
+            routes(text)(handler)
+        dp.include_router(router)
+    return dp
+
+
+async def measure(dp: Dispatcher, bot: Bot, text: str, updates: int) -> float:
+    batch = [
+        Update(update_id=n, message=Message(message_id=n, date=datetime.now(), chat=CHAT, from_user=TG_USER, text=text))
+        for n in range(updates)
+    ]
+    started = time.perf_counter()
+    for update in batch:
+        await dp.feed_update(bot, update)
+    return (time.perf_counter() - started) / len(batch) * 1e6
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", type=int, default=2000)
+    args = parser.parse_args()
+    bot = Bot(token="123456:benchmark")
+    cases = (
+        ("официант: Меню", "waiter", "Меню"),
+        ("админ: 📊 Статистика", "admin", "📊 Статистика"),
+        ("супер-админ: кнопка", "superadmin", "Сделать администратора"),
+        ("/start", "admin", "/start"),
+    )
+    print(f"апдейтов на случай: {args.updates}")
+    print(f"{'случай':<26} {'прежняя':>10} {'таблица':>10}  мкс/апдейт")
+    for name, role, text in cases:
+        legacy = await measure(with_user(legacy_dispatcher(), role), bot, text, args.updates)
+        table = await measure(with_user(table_dispatcher(), role), bot, text, args.updates)
+        print(f"{name:<26} {legacy:>10.1f} {table:>10.1f}")
+    await bot.session.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
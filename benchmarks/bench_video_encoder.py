@@ -0,0 +1,60 @@
+"""
+Сравнение кодировщиков видео из картинки и аудио: moviepy (24 fps, покадрово в Python)
+и still (ffmpeg напрямую, 1 кадр/с). Для каждой длины аудио печатает время и CPU-секунды
+(процесс + дочерние ffmpeg).
+Запуск: python -m benchmarks.bench_video_encoder [--durations 10 60 180]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import tempfile
+import time
+
+import imageio_ffmpeg
+from PIL import Image
+
+from bot.utils import make_video_from_image_and_audio
+
+
+def cpu_seconds() -> float:
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+def make_inputs(workdir: str, duration: int) -> tuple[str, str]:
+    image_path = os.path.join(workdir, "dish.jpg")
+    if not os.path.exists(image_path):
+        Image.effect_mandelbrot((1280, 960), (-2.0, -1.2, 1.0, 1.2), 100).convert("RGB").save(image_path, quality=90)
+    audio_path = os.path.join(workdir, f"voice_{duration}.mp3")
+    subprocess.run([
+        imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-loglevel", "error",
+        "-f", "lavfi", "-i", f"sine=frequency=220:duration={duration}",
+        "-c:a", "libmp3lame", "-b:a", "128k", audio_path,
+    ], check=True)
+    return image_path, audio_path
+
+
+def measure(encoder: str, image_path: str, audio_path: str, output_path: str) -> tuple[float, float, int]:
+    wall, cpu = time.perf_counter(), cpu_seconds()
+    make_video_from_image_and_audio(image_path, audio_path, output_path, encoder=encoder)
+    return time.perf_counter() - wall, cpu_seconds() - cpu, os.path.getsize(output_path)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--durations", type=int, nargs="+", default=[10, 60, 180])
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"{'аудио, с':>9} {'кодировщик':>10} {'время, с':>9} {'CPU, с':>8} {'размер, КБ':>11}")
+        for duration in args.durations:
+            image_path, audio_path = make_inputs(workdir, duration)
+            for encoder in ("moviepy", "still"):
+                output_path = os.path.join(workdir, f"{encoder}_{duration}.mp4")
+                wall, cpu, size = measure(encoder, image_path, audio_path, output_path)
+                print(f"{duration:>9} {encoder:>10} {wall:>9.2f} {cpu:>8.2f} {size // 1024:>11}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,100 @@
-import os
 import asyncio
 
 from aiogram import Bot, Dispatcher
-from bot.midlewares import UserMiddleware
+from bot.broadcast import run_broadcast_sender
+from bot.callbacks import fallback_router
+from bot.media_store import media_store, run_media_gc
+from bot.midlewares import CommitBeforeApiCallMiddleware, DbSessionMiddleware, updates_concurrency_limit
+from bot.rate_limit import api_limiter, report_api_stats
+from bot.render import RENDER_JOBS_QUEUE, consume_render_results
+from bot.storage import create_fsm_storage
+from bot.webhook import run_webhook
 
 from bot.handlers.admin_handlers import admin_router
+from bot.handlers.start_handlers import start_router
 from bot.handlers.super_admin_handlers import super_admin_router
 from bot.handlers.waiter_handlers import waiter_router
 from config import settings
+from database.engine import report_pool_stats
+from database.invite_token_service import InviteTokenService
+from database.menu_cache import menu_cache
+from database.redis_queue import RedisQueue, create_redis
+from database.test_results_buffer import test_results_buffer
+from database.user_cache import user_cache
 
 bot = Bot(token=settings.BOT_TOKEN)
+# Перед запросом к Bot API транзакция апдейта фиксируется — ожидание лимита
+# не держит соединение из пула. Затем запрос проходит лимиты частоты и повторы на 429
+bot.session.middleware(CommitBeforeApiCallMiddleware())
+bot.session.middleware(api_limiter)
 
-dp = Dispatcher()
-dp.message.middleware(UserMiddleware())
-dp.callback_query.middleware(UserMiddleware())
+# Один пул соединений Redis на всё время жизни бота: FSM, приглашения, очередь рендера.
+# Соединения открываются лениво, при первой команде.
+redis = create_redis()
+storage, events_isolation = create_fsm_storage(redis)
 
+dp = Dispatcher(storage=storage, events_isolation=events_isolation)
+# outer: user нужен уже фильтрам роли роутеров (bot/routing.py)
+dp.message.outer_middleware(DbSessionMiddleware())
+dp.callback_query.outer_middleware(DbSessionMiddleware())
+dp.inline_query.outer_middleware(DbSessionMiddleware())
+
+# Сервисы попадают в хендлеры через workflow data по имени аргумента
+dp["redis"] = redis
+dp["invite_service"] = InviteTokenService(redis)
+dp["render_queue"] = RedisQueue(RENDER_JOBS_QUEUE, redis)
+# Версии меню и пользователей общие для реплик: правка в одной сбрасывает кэши во всех
+menu_cache.connect(redis)
+user_cache.connect(redis)
+
+dp.include_router(start_router)
 dp.include_router(waiter_router)
 dp.include_router(admin_router)
 dp.include_router(super_admin_router)
+dp.include_router(fallback_router)
+
+background_tasks = set()
+
+
+@dp.startup()
+async def on_startup(bot: Bot):
+    background_tasks.add(asyncio.create_task(consume_render_results(bot, redis)))
+    background_tasks.add(asyncio.create_task(run_broadcast_sender(bot, redis)))
+    background_tasks.add(asyncio.create_task(test_results_buffer.run(settings.TEST_RESULTS_FLUSH_INTERVAL)))
+    if settings.API_METRICS_INTERVAL:
+        background_tasks.add(asyncio.create_task(report_api_stats(api_limiter, settings.API_METRICS_INTERVAL)))
+    if settings.DB_POOL_METRICS_INTERVAL:
+        background_tasks.add(asyncio.create_task(report_pool_stats(settings.DB_POOL_METRICS_INTERVAL)))
+    if settings.MEDIA_GC_INTERVAL:
+        background_tasks.add(asyncio.create_task(
+            run_media_gc(media_store, settings.MEDIA_GC_INTERVAL, settings.MEDIA_GC_GRACE)
+        ))
+
 
+@dp.shutdown()
+async def on_shutdown(dispatcher: Dispatcher):
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    background_tasks.clear()
+    # Результаты тестов, не успевшие попасть в базу
+    try:
+        await test_results_buffer.flush()
+    except Exception as e:
+        print(f"Не удалось записать результаты тестов при остановке: {e!r}")
+    await dispatcher.storage.close()
+    await dispatcher.fsm.events_isolation.close()
+    await redis.aclose()
 
 
 async def main():
     print("Бот запущен!")
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    # Апдейты, пришедшие во время перезапуска, по умолчанию не выбрасываем
+    await bot.delete_webhook(drop_pending_updates=settings.DROP_PENDING_UPDATES)
+    await dp.start_polling(bot, tasks_concurrency_limit=updates_concurrency_limit())
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if settings.BOT_MODE == "webhook":
+        run_webhook(dp, bot)
+    else:
+        asyncio.run(main())
@@ -0,0 +1,215 @@
+"""
+Рассылка сообщения админа всем официантам ресторана.
+
+start_broadcast кладёт в Redis-список по заданию на получателя, а прогресс —
+в хэш broadcast:<id> (total, sent, blocked, failed, done). BroadcastSender — фоновая
+задача бота: забирает задания и копирует сообщение получателям не чаще
+BROADCAST_RATE в секунду; лимит на чат соблюдает ApiRateLimiter сессии бота.
+Очередь и прогресс живут в Redis, поэтому переживают перезапуск бота. Ограничение
+частоты считается в памяти, поэтому отправляет только одна реплика — та, что держит
+блокировку BROADCAST_SENDER_LOCK в Redis; остальные ждут её истечения.
+"""
+import asyncio
+import uuid
+
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter, TelegramServerError,
+)
+
+from bot.rate_limit import TokenBucket
+from config import settings
+from database.redis_queue import RedisQueue
+
+BROADCAST_QUEUE = "broadcast_jobs"
+BROADCAST_SENDER_LOCK = "broadcast_sender_lock"
+
+# Продлить / снять блокировку, только если она всё ещё наша
+EXTEND_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("expire", KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_LOCK = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+
+def broadcast_key(broadcast_id: str) -> str:
+    return f"broadcast:{broadcast_id}"
+
+
+async def start_broadcast(redis, restaurant_id: int, from_chat_id: int, message_id: int, recipients) -> str:
+    """Ставит рассылку сообщения message_id из чата from_chat_id в очередь. Возвращает id рассылки."""
+    broadcast_id = uuid.uuid4().hex
+    key = broadcast_key(broadcast_id)
+    await redis.hset(key, mapping={
+        "restaurant_id": restaurant_id,
+        "from_chat_id": from_chat_id,
+        "total": len(recipients),
+        "sent": 0,
+        "blocked": 0,
+        "failed": 0,
+        "done": 0,
+        "status": "sending",
+    })
+    await redis.expire(key, settings.BROADCAST_TTL)
+    await RedisQueue(BROADCAST_QUEUE, redis).enqueue_many(
+        {"broadcast_id": broadcast_id, "chat_id": chat_id, "from_chat_id": from_chat_id, "message_id": message_id}
+        for chat_id in recipients
+    )
+    return broadcast_id
+
+
+async def get_broadcast_stats(redis, broadcast_id: str) -> dict | None:
+    """Прогресс рассылки; None — рассылки нет или её хэш истёк."""
+    stats = await redis.hgetall(broadcast_key(broadcast_id))
+    return stats or None
+
+
+def format_broadcast_stats(stats: dict) -> str:
+    return (
+        f"Доставлено: {stats['sent']} из {stats['total']}\n"
+        f"Заблокировали бота: {stats['blocked']}\n"
+        f"Ошибок: {stats['failed']}"
+    )
+
+
+class BroadcastSender:
+    """Пул отправок: не больше concurrency сообщений одновременно в работе."""
+
+    def __init__(self, bot, redis, rate: float = None, concurrency: int = None):
+        self.bot = bot
+        self.redis = redis
+        self.queue = RedisQueue(BROADCAST_QUEUE, redis)
+        self.bucket = TokenBucket(rate or settings.BROADCAST_RATE)
+        self._slots = asyncio.Semaphore(concurrency or settings.BROADCAST_CONCURRENCY)
+        self._sending = set()
+
+    async def run(self):
+        try:
+            while True:
+                item = await self.queue.dequeue()
+                if item is None:
+                    continue
+                try:
+                    await self._slots.acquire()
+                except asyncio.CancelledError:
+                    await self.queue.requeue(item)
+                    raise
+                task = asyncio.create_task(self._deliver(item))
+                self._sending.add(task)
+                task.add_done_callback(self._sending.discard)
+        except asyncio.CancelledError:
+            # Остановка бота: незавершённые отправки возвращаются в очередь
+            for task in self._sending:
+                task.cancel()
+            await asyncio.gather(*self._sending, return_exceptions=True)
+
+    async def _deliver(self, item: dict):
+        try:
+            # Хэша нет — рассылка истекла или отменена
+            if not await self.redis.exists(broadcast_key(item["broadcast_id"])):
+                return
+            outcome = await self._send(item)
+        except asyncio.CancelledError:
+            if not item.get("maybe_sent"):
+                await self.queue.requeue(item)
+                raise
+            # Сообщение могло уже уйти: повтор после перезапуска продублировал бы его.
+            # Получатель засчитывается, чтобы рассылка всё равно завершилась
+            print(f"Рассылка {item['broadcast_id']} в чат {item['chat_id']} прервана во время отправки")
+            await self._record(item, "failed")
+            raise
+        except Exception as e:
+            print(f"Ошибка рассылки {item['broadcast_id']} в чат {item['chat_id']}: {e!r}")
+            outcome = "failed"
+        finally:
+            self._slots.release()
+        await self._record(item, outcome)
+
+    async def _send(self, item: dict) -> str:
+        chat_id = item["chat_id"]
+        for attempt in range(settings.BROADCAST_MAX_ATTEMPTS):
+            await self.bucket.acquire()
+            # Пока идёт запрос, сообщение могло уйти — такое задание в очередь не возвращается (см. _deliver)
+            item["maybe_sent"] = True
+            try:
+                await self.bot.copy_message(chat_id, item["from_chat_id"], item["message_id"])
+                return "sent"
+            except TelegramRetryAfter as e:
+                # 429 — сообщение точно не отправлено
+                item["maybe_sent"] = False
+                # Повторы ApiRateLimiter исчерпаны — притормаживаем всю рассылку
+                print(f"Рассылка: Telegram просит подождать {e.retry_after} с")
+                self.bucket.pause(e.retry_after)
+            except TelegramForbiddenError:
+                return "blocked"
+            except TelegramBadRequest as e:
+                print(f"Рассылка в чат {chat_id} отклонена: {e.message}")
+                return "failed"
+            except (TelegramNetworkError, TelegramServerError) as e:
+                print(f"Рассылка в чат {chat_id}, попытка {attempt + 1}: {e!r}")
+                await asyncio.sleep(2 ** attempt)
+        return "failed"
+
+    async def _record(self, item: dict, outcome: str):
+        key = broadcast_key(item["broadcast_id"])
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hincrby(key, outcome, 1)
+            pipe.hincrby(key, "done", 1)
+            pipe.hgetall(key)
+            *_, stats = await pipe.execute()
+        if "total" not in stats:
+            # Хэш истёк во время отправки, HINCRBY создал его заново без TTL
+            await self.redis.delete(key)
+            return
+        if int(stats["done"]) == int(stats["total"]):
+            await self.redis.hset(key, "status", "done")
+            await self.bucket.acquire()
+            try:
+                await self.bot.send_message(
+                    int(stats["from_chat_id"]), "Рассылка завершена.\n" + format_broadcast_stats(stats)
+                )
+            except Exception as e:
+                print(f"Не удалось отправить итоги рассылки {item['broadcast_id']}: {e!r}")
+
+
+async def _send_while_locked(bot, redis, owner: str, ttl: int):
+    sender = asyncio.create_task(BroadcastSender(bot, redis).run())
+    try:
+        # Продлеваем блокировку втрое чаще её TTL; потеряли — сразу перестаём отправлять
+        while not sender.done():
+            await asyncio.sleep(ttl / 3)
+            if not await redis.eval(EXTEND_LOCK, 1, BROADCAST_SENDER_LOCK, owner, ttl):
+                print("Рассылка: блокировка отправителя перешла к другой реплике")
+                return
+    finally:
+        sender.cancel()
+        await asyncio.gather(sender, return_exceptions=True)
+        await redis.eval(RELEASE_LOCK, 1, BROADCAST_SENDER_LOCK, owner)
+
+
+async def run_broadcast_sender(bot, redis):
+    """
+    Фоновая задача бота: отправка рассылок из очереди. Запускается в каждой реплике,
+    но отправляет только владелец блокировки; при его остановке или сбое блокировка
+    истекает через BROADCAST_LOCK_TTL секунд и её забирает другая реплика.
+    """
+    owner = uuid.uuid4().hex
+    ttl = settings.BROADCAST_LOCK_TTL
+    try:
+        while True:
+            try:
+                if await redis.set(BROADCAST_SENDER_LOCK, owner, nx=True, ex=ttl):
+                    await _send_while_locked(bot, redis, owner, ttl)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Рассылка: ошибка отправителя: {e!r}")
+            await asyncio.sleep(ttl / 3)
+    except asyncio.CancelledError:
+        pass
@@ -0,0 +1,103 @@
+"""
+callback_data inline-кнопок: типизированные фабрики CallbackData.
+
+Все callback_data имеют вид "<префикс>[:<поле>...]" — короткий префикс и значения полей;
+кнопки без полей — просто строка-префикс. Обработчик по префиксу выбирает
+CallbackRoutes (bot/routing.py) одним поиском в словаре.
+"""
+from aiogram import Router
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import CallbackQuery
+
+
+# ---- официант ----
+class WaiterCategory(CallbackData, prefix="wc"):
+    id: int
+
+
+class WaiterDish(CallbackData, prefix="wd"):
+    id: int
+
+
+class WaiterPage(CallbackData, prefix="wp"):
+    """Листание списков официанта; v — версия меню, по которой собрана страница."""
+    view: str
+    page: int
+    v: int
+    category_id: int = 0
+
+
+class QuizAnswer(CallbackData, prefix="qa"):
+    position: int
+    option: int
+
+
+WAITER_BACK_CATEGORIES = "w_cats"
+WAITER_PREV_DISH = "w_prev"
+WAITER_NEXT_DISH = "w_next"
+WAITER_TOGGLE_MEDIA = "w_media"
+WAITER_BACK_DISHES = "w_dishes"
+
+
+# ---- админ ----
+class DishView(CallbackData, prefix="dv"):
+    id: int
+
+
+class DishEdit(CallbackData, prefix="de"):
+    id: int
+
+
+class DishDelete(CallbackData, prefix="dd"):
+    id: int
+
+
+class CategoryEdit(CallbackData, prefix="ce"):
+    id: int
+
+
+class CategoryDelete(CallbackData, prefix="cd"):
+    id: int
+
+
+class CategoryChoose(CallbackData, prefix="cc"):
+    id: int
+
+
+class AdminPage(CallbackData, prefix="ap"):
+    """Листание списков меню админа; v — версия меню, по которой собрана страница."""
+    view: str
+    page: int
+    v: int
+
+
+class MenuExport(CallbackData, prefix="mx"):
+    fmt: str
+
+
+class StaffPage(CallbackData, prefix="sp"):
+    after_id: int
+
+
+class StaffDelete(CallbackData, prefix="sd"):
+    """after_id — страница списка (см. StaffPage), на которую вернуться после удаления."""
+    id: int
+    after_id: int = 0
+
+
+class BroadcastStatus(CallbackData, prefix="bs"):
+    id: str
+
+
+ADD_DISH = "a_dish"
+ADD_CATEGORY = "a_cat"
+CANCEL_DISH = "a_cancel"
+
+
+# Подключается последним: кнопки, которые не разобрал ни один роутер
+fallback_router = Router()
+
+
+@fallback_router.callback_query()
+async def stale_callback(call: CallbackQuery):
+    await call.answer("Кнопка устарела, откройте меню заново.")
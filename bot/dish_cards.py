@@ -0,0 +1,63 @@
+"""
+Карточки блюд: подпись (HTML) и клавиатура.
+Подпись строится один раз на блюдо в версии меню и дальше берётся из кэша;
+любое изменение меню поднимает его версию (menu_cache.invalidate), и кэш ресторана
+пересобирается при следующем показе.
+"""
+import html
+import re
+
+from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from bot.callbacks import WAITER_BACK_DISHES, WAITER_NEXT_DISH, WAITER_PREV_DISH, WAITER_TOGGLE_MEDIA
+from database.menu_cache import DishCard, MenuSnapshot
+
+INGREDIENTS_SPLIT = re.compile(r",\s*|\s{2,}")
+NO_DATA = "Нет данных"
+
+
+def render_caption(dish: DishCard) -> str:
+    """HTML-подпись карточки: название, состав списком, описание."""
+    ingredients = [i.strip() for i in INGREDIENTS_SPLIT.split(dish.composition or "") if i.strip()]
+    ingredients_text = "\n".join(f"• {html.escape(i, quote=False)}" for i in ingredients) or NO_DATA
+    description = html.escape(dish.description, quote=False) if dish.description else NO_DATA
+    name = html.escape(dish.name, quote=False)
+    return f"<b>{name} 🍽️</b>\n\n<b>Состав:</b>\n{ingredients_text}\n\n<b>Описание:</b>\n{description}"
+
+
+def _waiter_card_keyboard(media_text: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="⬅️ Назад", callback_data=WAITER_PREV_DISH), InlineKeyboardButton(text="➡️ Далее", callback_data=WAITER_NEXT_DISH)],
+            [InlineKeyboardButton(text=media_text, callback_data=WAITER_TOGGLE_MEDIA)],
+            [InlineKeyboardButton(text="🔙 К категориям", callback_data=WAITER_BACK_DISHES)]
+        ]
+    )
+
+
+# Клавиатура карточки официанта зависит только от показанного медиа — собираем заранее
+WAITER_CARD_KEYBOARDS = {
+    "photo": _waiter_card_keyboard("📸 Фотография"),
+    "video": _waiter_card_keyboard("🎬 Видео"),
+}
+
+
+class DishCardCache:
+    """Готовые подписи карточек: {restaurant_id: (версия меню, {dish_id: подпись})}."""
+
+    def __init__(self):
+        self._captions: dict[int, tuple[int, dict[int, str]]] = {}
+
+    def caption(self, menu: MenuSnapshot, dish: DishCard) -> str:
+        version, captions = self._captions.get(menu.restaurant_id, (None, None))
+        if version != menu.version:
+            # Меню изменилось — подписи старой версии больше не нужны
+            captions = {}
+            self._captions[menu.restaurant_id] = (menu.version, captions)
+        caption = captions.get(dish.id)
+        if caption is None:
+            caption = captions[dish.id] = render_caption(dish)
+        return caption
+
+
+dish_cards = DishCardCache()
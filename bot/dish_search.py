@@ -0,0 +1,119 @@
+"""
+Поиск блюд по меню ресторана: название, состав, описание.
+Индекс строится в памяти из снимка меню один раз на версию меню, как банк вопросов
+теста. Слова запроса сравниваются со словарём меню по триграммам (как pg_trgm), поэтому
+поиск прощает опечатки и окончания («борща», «картофил»), а незаконченное слово
+находится по префиксу — это нужно для inline-режима, где запрос приходит на ходу.
+"""
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+
+from database.menu_cache import DishCard, MenuSnapshot
+
+WORD = re.compile(r"[0-9a-zа-я]+")
+# Вес совпадения в зависимости от поля блюда
+FIELD_WEIGHTS = (("name", 3.0), ("composition", 2.0), ("description", 1.0))
+# Минимальная похожесть слов по триграммам (порог pg_trgm по умолчанию)
+SIMILARITY_THRESHOLD = 0.3
+# Похожесть для слова, которое начинается с набранного
+PREFIX_SIMILARITY = 0.8
+
+
+def words(text: str | None) -> list[str]:
+    return WORD.findall((text or "").lower().replace("ё", "е"))
+
+
+def trigrams(word: str) -> set[str]:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class SearchIndex:
+    menu: MenuSnapshot
+    vocabulary: dict[str, int] = field(default_factory=dict)
+    word_list: list[str] = field(default_factory=list)
+    word_trigram_counts: list[int] = field(default_factory=list)
+    # триграмма -> номера слов словаря
+    trigram_words: dict[str, list[int]] = field(default_factory=dict)
+    # номер слова -> {dish_id: наибольший вес поля, где встретилось слово}
+    postings: list[dict[int, float]] = field(default_factory=list)
+
+    def _word_id(self, word: str) -> int:
+        word_id = self.vocabulary.get(word)
+        if word_id is None:
+            word_id = self.vocabulary[word] = len(self.word_list)
+            self.word_list.append(word)
+            grams = trigrams(word)
+            self.word_trigram_counts.append(len(grams))
+            for gram in grams:
+                self.trigram_words.setdefault(gram, []).append(word_id)
+            self.postings.append({})
+        return word_id
+
+    def add(self, dish: DishCard):
+        for attr, weight in FIELD_WEIGHTS:
+            for word in words(getattr(dish, attr)):
+                posting = self.postings[self._word_id(word)]
+                if posting.get(dish.id, 0) < weight:
+                    posting[dish.id] = weight
+
+    def similar_words(self, word: str) -> list[tuple[int, float]]:
+        """Слова словаря, похожие на слово запроса: [(номер слова, похожесть)]."""
+        exact = self.vocabulary.get(word)
+        grams = trigrams(word)
+        shared = Counter(word_id for gram in grams for word_id in self.trigram_words.get(gram, ()))
+        found = []
+        for word_id, common in shared.items():
+            if word_id == exact:
+                similarity = 1.0
+            else:
+                similarity = common / (len(grams) + self.word_trigram_counts[word_id] - common)
+                if similarity < PREFIX_SIMILARITY and self.word_list[word_id].startswith(word):
+                    similarity = PREFIX_SIMILARITY
+            if similarity >= SIMILARITY_THRESHOLD:
+                found.append((word_id, similarity))
+        return found
+
+    def search(self, query: str, limit: int = 10) -> list[DishCard]:
+        """
+        Блюда по убыванию релевантности: сначала те, где нашлось больше слов запроса,
+        затем по сумме (похожесть слова x вес поля).
+        """
+        matched: Counter = Counter()
+        scores: Counter = Counter()
+        for word in dict.fromkeys(words(query)):
+            best: dict[int, float] = {}
+            for word_id, similarity in self.similar_words(word):
+                for dish_id, weight in self.postings[word_id].items():
+                    score = similarity * weight
+                    if score > best.get(dish_id, 0):
+                        best[dish_id] = score
+            matched.update(best.keys())
+            scores.update(best)
+        ranked = sorted(scores, key=lambda dish_id: (-matched[dish_id], -scores[dish_id], dish_id))
+        return [self.menu.dishes[dish_id] for dish_id in ranked[:limit]]
+
+
+def build_search_index(menu: MenuSnapshot) -> SearchIndex:
+    index = SearchIndex(menu)
+    for dish in menu.dishes.values():
+        index.add(dish)
+    return index
+
+
+class SearchIndexCache:
+    """Поисковые индексы: {restaurant_id: индекс последней версии меню}."""
+
+    def __init__(self):
+        self._indexes: dict[int, SearchIndex] = {}
+
+    def get(self, menu: MenuSnapshot) -> SearchIndex:
+        index = self._indexes.get(menu.restaurant_id)
+        if index is None or index.menu.version != menu.version:
+            index = self._indexes[menu.restaurant_id] = build_search_index(menu)
+        return index
+
+
+search_indexes = SearchIndexCache()
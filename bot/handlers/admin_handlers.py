@@ -1,37 +1,55 @@
+import html
+import os
 import secrets
 import tempfile
-from aiogram import Router, F
-from aiogram.filters import CommandStart
+from aiogram import Router
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
-from sqlalchemy.ext.asyncio import AsyncSession
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, FSInputFile
 
 from database.dao import DAO
-from database.engine import async_session_maker
+from database.menu_cache import menu_cache
 from bot.keyboards.reply import get_keyboard
+from bot.keyboards.inline import clamp_page, get_paginated_keyboard, keyboard_pages
+from bot.callbacks import (
+	ADD_CATEGORY, ADD_DISH, CANCEL_DISH, AdminPage, BroadcastStatus, CategoryChoose, CategoryDelete, CategoryEdit,
+	DishDelete, DishEdit, DishView, MenuExport, StaffDelete, StaffPage,
+)
+from bot.routing import CallbackRoutes, RoleFilter, TextRoutes
+from bot.broadcast import format_broadcast_stats, get_broadcast_stats, start_broadcast
 from database.invite_token_service import InviteTokenService
-from bot.utils import make_video_from_image_and_audio, send_video_to_tech_group
-invite_service = InviteTokenService()
+from bot.utils import has_dish_media, send_dish_media
+from bot.dish_cards import dish_cards
+from bot.media_store import media_store
+from bot.render import enqueue_render_job
+from database.redis_queue import RedisQueue
+from database.menu_io import FIELDS, FORMATS, MenuImportError, detect_format, export_menu, import_menu, read_menu_rows
+from config import settings
 
 admin_router = Router()
+admin_router.message.filter(RoleFilter("admin"))
+admin_router.callback_query.filter(RoleFilter("admin"))
+admin_buttons = TextRoutes(admin_router)
+admin_callbacks = CallbackRoutes(admin_router)
 
 admin_kb = get_keyboard(
 	"🍽️ Блюдо",
 	"📂 Категории",
 	"🤝 Сделать приглашение",
 	"🧑‍🤝‍🧑 Штат",
-	sizes=(2, 2)
+	"📥 Импорт меню",
+	"📤 Экспорт меню",
+	"📊 Статистика",
+	"📣 Рассылка",
+	sizes=(2, 2, 2, 2)
 )
 
 
 class CategoryEditStates(StatesGroup):
-	waiting_for_category = State()
 	waiting_for_new_name = State()
 
 
 class DishEditStates(StatesGroup):
-	waiting_for_id = State()
 	waiting_for_name = State()
 	waiting_for_category = State()
 	waiting_for_composition = State()
@@ -39,7 +57,6 @@ class DishEditStates(StatesGroup):
 	waiting_for_ingredients_photo = State()
 	waiting_for_ready_photo = State()
 	waiting_for_audio = State()
-	waiting_for_video = State()
 
 
 class AddDishStates(StatesGroup):
@@ -50,130 +67,104 @@ class AddDishStates(StatesGroup):
 	waiting_for_category = State()
 
 
-class WaiterRegisterStates(StatesGroup):
-	waiting_for_first_name = State()
-	waiting_for_last_name = State()
-
-
 class CategoryCreateStates(StatesGroup):
 	waiting_for_name = State()
 
-async def is_user_allowed(tg_id: str, session: AsyncSession) -> bool:
-	dao = DAO(session)
-	user = await dao.get_user_by_tg_id(tg_id)
-	return user is not None and user.role in ("admin", "superadmin")
-
-
-@admin_router.message(CommandStart())
-async def cmd_start(message: Message, state: FSMContext, user):
-	args = message.text.split()
-	if len(args) > 1:
-		# Обработка приглашения по токену
-		token = args[1]
-		restaurant_id = await invite_service.get_restaurant_id(token)
-		print(f"Получен токен: {token}, restaurant_id: {restaurant_id}")
-		if restaurant_id:
-			await state.update_data(invite_token=token, restaurant_id=restaurant_id)
-			await message.answer("Введите ваше имя:")
-			await state.set_state(WaiterRegisterStates.waiting_for_first_name)
-			return
-		await message.answer("Ссылка недействительна или устарела.")
-		return
-	if not user or user.role not in ("admin", "superadmin", "waiter"):
-		await message.answer("У вас нет доступа к этому боту. Обратитесь к администратору.")
-		return
-
-	kb = admin_kb if user.role == "admin" else None
-	await message.answer(f"Добро пожаловать, {user.first_name}! Вы вошли как {user.role}.", reply_markup=kb)
-
-
-############_______FSM: регистрация официанта по приглашению_____############################
-@admin_router.message(WaiterRegisterStates.waiting_for_first_name)
-async def waiter_first_name(message: Message, state: FSMContext):
-	await state.update_data(first_name=message.text)
-	await message.answer("Введите вашу фамилию:")
-	await state.set_state(WaiterRegisterStates.waiting_for_last_name)
-
-
-@admin_router.message(WaiterRegisterStates.waiting_for_last_name)
-async def waiter_last_name(message: Message, state: FSMContext):
-
-	data = await state.get_data()
 
-	rest_id = data.get("restaurant_id")
-	if not rest_id or rest_id == "None":
-		await message.answer("Ошибка регистрации: не удалось определить ресторан. Обратитесь к администратору.")
-		await state.clear()
+class MenuImportStates(StatesGroup):
+	waiting_for_file = State()
+
+
+class BroadcastStates(StatesGroup):
+	waiting_for_message = State()
+
+
+# Списки меню админа: (элементы снимка меню, ряд кнопок элемента, ряды над списком).
+# Код списка попадает в callback_data листания (AdminPage.view)
+ADMIN_LISTS = {
+	"ad": (
+		lambda menu: list(menu.dishes.values()),
+		lambda d: [
+			InlineKeyboardButton(text=f"👁️ {d.name}", callback_data=DishView(id=d.id).pack()),
+			InlineKeyboardButton(text="✏️", callback_data=DishEdit(id=d.id).pack()),
+			InlineKeyboardButton(text="🗑️", callback_data=DishDelete(id=d.id).pack())
+		],
+		[[InlineKeyboardButton(text="➕ Добавить блюдо", callback_data=ADD_DISH)]],
+	),
+	"ac": (
+		lambda menu: menu.categories,
+		lambda c: [
+			InlineKeyboardButton(text=f"✏️ {c.name}", callback_data=CategoryEdit(id=c.id).pack()),
+			InlineKeyboardButton(text="🗑️", callback_data=CategoryDelete(id=c.id).pack())
+		],
+		[[InlineKeyboardButton(text="➕ Добавить категорию", callback_data=ADD_CATEGORY)]],
+	),
+	"am": (
+		lambda menu: menu.categories,
+		lambda c: [InlineKeyboardButton(text=f"🗑️ 📂 {c.name}", callback_data=CategoryDelete(id=c.id).pack())],
+		(),
+	),
+	"ak": (
+		lambda menu: menu.categories,
+		lambda c: [InlineKeyboardButton(text=f"📂 {c.name}", callback_data=CategoryChoose(id=c.id).pack())],
+		(),
+	),
+}
+
+
+def admin_list_keyboard(view: str, menu, page: int = 0) -> InlineKeyboardMarkup:
+	"""Страница списка из ADMIN_LISTS; готовые страницы живут до смены версии меню."""
+	get_items, row, top = ADMIN_LISTS[view]
+	items = get_items(menu)
+	page = clamp_page(page, len(items))
+	return keyboard_pages.get((view, menu.restaurant_id), menu.version, page, lambda: get_paginated_keyboard(
+		items, row, lambda p: AdminPage(view=view, page=p, v=menu.version).pack(), page, top=top
+	))
+
+
+@admin_callbacks(AdminPage)
+async def admin_list_page(call: CallbackQuery, callback_data: AdminPage, *, user, dao: DAO):
+	if not user or user.role != "admin":
+		await call.answer("Нет прав", show_alert=True)
 		return
-
-	async with async_session_maker() as session:
-		dao = DAO(session)
-		# Проверяем, не зарегистрирован ли уже этот tg_id
-		user = await dao.get_user_by_tg_id(str(message.from_user.id))
-		if user:
-			await message.answer("Вы уже зарегистрированы.")
-			await state.clear()
-			return
-		# Регистрируем официанта
-		await dao.create_user(
-			first_name=data["first_name"],
-			last_name=message.text,
-			tg_username=message.from_user.username,
-			tg_id=str(message.from_user.id),
-			role="waiter",
-			restaurant_id=int(rest_id)
-		)
-
-	await invite_service.delete_token(data['invite_token'])
-	await message.answer("Вы успешно зарегистрированы как официант! Теперь вы можете пользоваться ботом.")
-	await state.clear()
+	if callback_data.view not in ADMIN_LISTS:
+		await call.answer()
+		return
+	menu = await menu_cache.get(user.restaurant_id, dao)
+	kb = admin_list_keyboard(callback_data.view, menu, callback_data.page)
+	# Кнопка с номером страницы ведёт на текущую страницу — клавиатура та же
+	if kb != call.message.reply_markup:
+		await call.message.edit_reply_markup(reply_markup=kb)
+	# Страница собрана по другой версии меню — состав списка мог сдвинуться
+	await call.answer("Меню обновилось." if callback_data.v != menu.version else None)
 
 
-@admin_router.message(F.text.lower() == "🍽️ блюдо")
-async def show_dishes_menu(message: Message, user):
+@admin_buttons("🍽️ Блюдо")
+async def show_dishes_menu(message: Message, user, dao: DAO):
 	if not user or user.role != "admin":
 		await message.answer("Только админ может работать с блюдами.")
 		return
-	async with async_session_maker() as session:
-		dao = DAO(session)
-		dishes = await dao.get_dishes_by_restaurant(user.restaurant_id)
-	kb = InlineKeyboardMarkup(
-		inline_keyboard=[
-			[InlineKeyboardButton(text="➕ Добавить блюдо", callback_data="add_dish")],
-			*[[
-				InlineKeyboardButton(text=f"👁️ {d.name}", callback_data=f"viewdish_{d.id}"),
-				InlineKeyboardButton(text="✏️", callback_data=f"editdish_{d.id}"),
-				InlineKeyboardButton(text="🗑️", callback_data=f"deldish_{d.id}")
-			] for d in dishes]
-		]
-	)
-	await message.answer("Меню блюд:", reply_markup=kb)
+	menu = await menu_cache.get(user.restaurant_id, dao)
+	await message.answer("Меню блюд:", reply_markup=admin_list_keyboard("ad", menu))
 
 # --- Просмотр блюда ---
-@admin_router.callback_query(F.data.startswith("viewdish_"))
-async def admin_view_dish(call: CallbackQuery, user):
-	dish_id = int(call.data.split("_")[1])
-	async with async_session_maker() as session:
-		dao = DAO(session)
-		dish = await dao.get_dish_by_id(dish_id)
-	if not dish or dish.restaurant_id != user.restaurant_id:
+@admin_callbacks(DishView)
+async def admin_view_dish(call: CallbackQuery, callback_data: DishView, user, dao: DAO):
+	dish_id = callback_data.id
+	# Снимок меню содержит только блюда ресторана пользователя
+	menu = await menu_cache.get(user.restaurant_id, dao)
+	dish = menu.get_dish(dish_id)
+	if not dish:
 		await call.message.answer("Блюдо не найдено или нет доступа.")
 		await call.answer()
 		return
-	# Формируем карточку блюда
-	from aiogram.types.input_file import FSInputFile
-	from aiogram.types import InputMediaPhoto
-	import re
-	if dish.composition:
-		raw_ingredients = re.split(r",\s*|\s{2,}", dish.composition)
-		ingredients_text = '\n'.join([f"• {i.strip()}" for i in raw_ingredients if i.strip()])
-	else:
-		ingredients_text = "Нет данных"
-	caption = f"<b>{dish.name} 🍽️</b>\n\n<b>Состав:</b>\n{ingredients_text}\n\n<b>Описание:</b>\n{dish.description}"
-	if dish.ready_photo_url:
+	caption = dish_cards.caption(menu, dish)
+	if has_dish_media(dish, "photo"):
 		try:
-			media = InputMediaPhoto(media=FSInputFile(dish.ready_photo_url), caption=caption, parse_mode="HTML")
-			await call.message.answer_photo(photo=FSInputFile(dish.ready_photo_url), caption=caption, parse_mode="HTML")
+			await send_dish_media(
+				lambda m: call.message.answer_photo(photo=m, caption=caption, parse_mode="HTML"),
+				dish, "photo", dao
+			)
 		except Exception:
 			await call.message.answer(caption, parse_mode="HTML")
 	else:
@@ -181,58 +172,39 @@ async def admin_view_dish(call: CallbackQuery, user):
 	await call.answer()
 
 # --- Удаление блюда ---
-@admin_router.callback_query(F.data.startswith("deldish_"))
-async def admin_delete_dish(call: CallbackQuery, user):
-	dish_id = int(call.data.split("_")[1])
-	async with async_session_maker() as session:
-		dao = DAO(session)
-		dish = await dao.get_dish_by_id(dish_id)
-		if not dish or dish.restaurant_id != user.restaurant_id:
-			await call.answer("Нет доступа или блюдо не найдено", show_alert=True)
-			return
-		await session.delete(dish)
-		await session.commit()
+@admin_callbacks(DishDelete)
+async def admin_delete_dish(call: CallbackQuery, callback_data: DishDelete, user, dao: DAO):
+	dish_id = callback_data.id
+	dish = await dao.get_dish_for_restaurant(user.restaurant_id, dish_id)
+	if not dish:
+		await call.answer("Нет доступа или блюдо не найдено", show_alert=True)
+		return
+	await dao.delete_dish(dish)
+	dao.on_commit(lambda: menu_cache.invalidate(user.restaurant_id))
 	await call.message.answer("Блюдо удалено.")
 	await call.answer()
 
-@admin_router.message(F.text.lower() == "📂 категории")
-async def show_categories_menu(message: Message, user):
+@admin_buttons("📂 Категории")
+async def show_categories_menu(message: Message, user, dao: DAO):
 	if not user or user.role != "admin":
 		await message.answer("Только админ может работать с категориями.")
 		return
-	async with async_session_maker() as session:
-		dao = DAO(session)
-		categories = await dao.get_categories_by_restaurant(user.restaurant_id)
-	kb = InlineKeyboardMarkup(
-		inline_keyboard=[
-			[InlineKeyboardButton(text="➕ Добавить категорию", callback_data="add_category")],
-			*[[
-				InlineKeyboardButton(text=f"✏️ {c.name}", callback_data=f"editcat_{c.id}"),
-				InlineKeyboardButton(text="🗑️", callback_data=f"delcat_{c.id}")
-			] for c in categories]
-		]
-	)
-	await message.answer("Меню категорий:", reply_markup=kb)
+	menu = await menu_cache.get(user.restaurant_id, dao)
+	await message.answer("Меню категорий:", reply_markup=admin_list_keyboard("ac", menu))
 
 
 # ------------------------------ РАБОТА С МЕНЮ --------------------------------------------------------------------------------------
 
-@admin_router.message(F.text.lower() == "📋 меню")
-async def show_categories(message: Message, user):
+@admin_buttons("📋 Меню")
+async def show_categories(message: Message, user, dao: DAO):
 	if not user or user.role != "admin":
 		await message.answer("Только админ может просматривать категории.")
 		return
-	async with async_session_maker() as session:
-		dao = DAO(session)
-		categories = await dao.get_categories_by_restaurant(user.restaurant_id)
-	if not categories:
+	menu = await menu_cache.get(user.restaurant_id, dao)
+	if not menu.categories:
 		await message.answer("В вашем ресторане нет категорий.")
 		return
-	for c in categories:
-		kb = InlineKeyboardMarkup(inline_keyboard=[
-			[InlineKeyboardButton(text="🗑️ Удалить", callback_data=f"delcat_{c.id}")]
-		])
-		await message.answer(f"Категория: 📂 {c.name} (id: {c.id})", reply_markup=kb)
+	await message.answer("Категории ресторана:", reply_markup=admin_list_keyboard("am", menu))
 
 
 # ----------------------------- СОЗДАНИЕ/РЕДАКТИРОВАНИЕ КАТЕГОРИИ ---------------------------------------------------------------
@@ -242,72 +214,59 @@ async def show_categories(message: Message, user):
 
 
 # --- СОЗДАНИЕ КАТЕГОРИИ ---
-@admin_router.message(F.text.lower() == "Категории")
-async def category_edit_start(message: Message, state: FSMContext, user):
-	if not user or user.role != "admin":
-		await message.answer("Только админ может редактировать категории.")
-		return
-	async with async_session_maker() as session:
-		dao = DAO(session)
-		categories = await dao.get_categories_by_restaurant(user.restaurant_id)
-	if not categories:
-		await message.answer("Нет категорий для редактирования.")
-		return
-	kb = InlineKeyboardMarkup(
-		inline_keyboard=[[InlineKeyboardButton(text=f"📂 {c.name}", callback_data=f"editcat_{c.id}")] for c in categories]
-	)
-	await message.answer("Выберите категорию для редактирования:", reply_markup=kb)
-	await state.set_state(CategoryEditStates.waiting_for_category)
-
 @admin_router.message(CategoryCreateStates.waiting_for_name)
-async def category_create_name(message: Message, state: FSMContext, user):
-	async with async_session_maker() as session:
-		dao = DAO(session)
-		category = await dao.create_category(message.text, user.restaurant_id)
+async def category_create_name(message: Message, state: FSMContext, user, dao: DAO):
+	category = await dao.create_category(message.text, user.restaurant_id)
+	dao.on_commit(lambda: menu_cache.invalidate(user.restaurant_id))
 	await message.answer(f"Категория '{category.name}' успешно создана!")
 	await state.clear()
 
 
-@admin_router.callback_query(F.data.startswith("delcat_"))
-async def delete_category_callback(call: CallbackQuery, *, user):
+@admin_callbacks(CategoryDelete)
+async def delete_category_callback(call: CallbackQuery, callback_data: CategoryDelete, *, user, dao: DAO):
 	if not user or user.role != "admin":
 		await call.answer("Нет прав", show_alert=True)
 		return
-	cat_id = int(call.data.split("_")[1])
-	async with async_session_maker() as session:
-		dao = DAO(session)
-		categories = await dao.get_categories_by_restaurant(user.restaurant_id)
-		category = next((c for c in categories if c.id == cat_id), None)
-		if not category:
-			await call.answer("Нет такой категории", show_alert=True)
-			return
-		await session.delete(category)
-		await session.commit()
-	await call.message.edit_text("Категория удалена.")
+	cat_id = callback_data.id
+	category = await dao.get_category_for_restaurant(user.restaurant_id, cat_id)
+	if not category:
+		await call.answer("Нет такой категории", show_alert=True)
+		return
+	menu = await menu_cache.get(user.restaurant_id, dao)
+	# Страница списка, на которой была категория: её и показываем после удаления
+	position = next((i for i, c in enumerate(menu.categories) if c.id == cat_id), 0)
+	await dao.delete_category(category)
+	dao.on_commit(lambda: menu_cache.invalidate(user.restaurant_id))
+	# Фиксируем сразу: список строится по снимку меню уже без категории
+	await dao.commit()
+	menu = await menu_cache.get(user.restaurant_id, dao)
+	if menu.categories:
+		kb = admin_list_keyboard("am", menu, position // settings.KEYBOARD_PAGE_SIZE)
+		await call.message.edit_reply_markup(reply_markup=kb)
+	else:
+		await call.message.edit_text("В вашем ресторане нет категорий.")
+	await call.answer(f"Категория '{category.name}' удалена.")
 
 
 
-@admin_router.callback_query(F.data.startswith("editcat_"), CategoryEditStates.waiting_for_category)
-async def category_edit_choose(call: CallbackQuery, state: FSMContext, *, user):
-    cat_id = int(call.data.split("_")[1])
+@admin_callbacks(CategoryEdit)
+async def category_edit_choose(call: CallbackQuery, callback_data: CategoryEdit, state: FSMContext, *, user):
+    cat_id = callback_data.id
     await state.update_data(edit_id=cat_id)
     await call.message.answer("Введите новое название категории:")
     await state.set_state(CategoryEditStates.waiting_for_new_name)
     await call.answer()
 
 @admin_router.message(CategoryEditStates.waiting_for_new_name)
-async def category_edit_new_name(message: Message, state: FSMContext, user):
+async def category_edit_new_name(message: Message, state: FSMContext, user, dao: DAO):
 	data = await state.get_data()
-	async with async_session_maker() as session:
-		dao = DAO(session)
-		category = await dao.get_category_by_id(data["edit_id"])
-		if category and category.restaurant_id == user.restaurant_id:
-			category.name = message.text
-			await session.commit()
-			await session.refresh(category)
-			await message.answer(f"Категория обновлена: {category.name}")
-		else:
-			await message.answer("Ошибка: категория не найдена или нет доступа.")
+	category = await dao.get_category_for_restaurant(user.restaurant_id, data["edit_id"])
+	if category:
+		category.name = message.text
+		dao.on_commit(lambda: menu_cache.invalidate(user.restaurant_id))
+		await message.answer(f"Категория обновлена: {category.name}")
+	else:
+		await message.answer("Ошибка: категория не найдена или нет доступа.")
 	await state.clear()
 # --------------------- СОЗДАНИЕ И РЕДАКТИРОВАНИЕ БЛЮДА ---------------------------------------------------------------------------
 
@@ -315,31 +274,12 @@ async def category_edit_new_name(message: Message, state: FSMContext, user):
 # --- СОЗДАНИЕ БЛЮДА ---
 
 # --- РЕДАКТИРОВАНИЕ БЛЮДА ---
-@admin_router.message(F.text.lower() == "🍽️ блюдо")
-async def dish_edit_start(message: Message, state: FSMContext, user):
-	if not user or user.role != "admin":
-		await message.answer("Только админ может редактировать блюда.")
-		return
-	async with async_session_maker() as session:
-		dao = DAO(session)
-		dishes = await dao.get_dishes_by_restaurant(user.restaurant_id)
-	if not dishes:
-		await message.answer("Нет блюд для редактирования.")
-		return
-	kb = InlineKeyboardMarkup(
-		inline_keyboard=[[InlineKeyboardButton(text=f"🍽️ {d.name}", callback_data=f"editdish_{d.id}")] for d in dishes]
-	)
-	await message.answer("Выберите блюдо для редактирования:", reply_markup=kb)
-	await state.set_state(DishEditStates.waiting_for_id)
-
-@admin_router.callback_query(F.data.startswith("editdish_"), DishEditStates.waiting_for_id)
-async def dish_edit_choose(call: CallbackQuery, state: FSMContext, *, user):
-	dish_id = int(call.data.split("_")[1])
+@admin_callbacks(DishEdit)
+async def dish_edit_choose(call: CallbackQuery, callback_data: DishEdit, state: FSMContext, *, user, dao: DAO):
+	dish_id = callback_data.id
 	await state.update_data(edit_id=dish_id)
-	async with async_session_maker() as session:
-		dao = DAO(session)
-		dish = await dao.get_dish_by_id(dish_id)
-	if not dish or dish.restaurant_id != user.restaurant_id:
+	dish = await dao.get_dish_for_restaurant(user.restaurant_id, dish_id)
+	if not dish:
 		await call.message.answer("Блюдо не найдено или нет доступа.")
 		await state.clear()
 		await call.answer()
@@ -350,35 +290,27 @@ async def dish_edit_choose(call: CallbackQuery, state: FSMContext, *, user):
 
 
 @admin_router.message(DishEditStates.waiting_for_name)
-async def dish_edit_name(message: Message, state: FSMContext, user):
-	data = await state.get_data()
+async def dish_edit_name(message: Message, state: FSMContext, user, dao: DAO):
 	await state.update_data(name=message.text)
 	# Показываем inline-кнопки с категориями
-	async with async_session_maker() as session:
-		dao = DAO(session)
-		categories = await dao.get_categories_by_restaurant(user.restaurant_id)
-	if not categories:
+	menu = await menu_cache.get(user.restaurant_id, dao)
+	if not menu.categories:
 		await message.answer("Нет категорий. Сначала создайте категорию!")
 		await state.clear()
 		return
-	kb = InlineKeyboardMarkup(
-		inline_keyboard=[
-			[InlineKeyboardButton(text=f"📂 {c.name}", callback_data=f"choosecat_{c.id}") for c in categories]
-		]
-	)
-	await message.answer("Выберите категорию для блюда:", reply_markup=kb)
+	await message.answer("Выберите категорию для блюда:", reply_markup=admin_list_keyboard("ak", menu))
 	await state.set_state(DishEditStates.waiting_for_category)
 
 
 
 # Выбор категории через inline-кнопку
-@admin_router.callback_query(F.data.startswith("choosecat_"), DishEditStates.waiting_for_category)
-async def dish_choose_category(call: CallbackQuery, state: FSMContext):
-    cat_id = int(call.data.split("_")[1])
+@admin_callbacks(CategoryChoose, DishEditStates.waiting_for_category)
+async def dish_choose_category(call: CallbackQuery, callback_data: CategoryChoose, state: FSMContext):
+    cat_id = callback_data.id
     await state.update_data(category_id=cat_id)
     kb = InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="❌ Отмена", callback_data="cancel_dish")]
+            [InlineKeyboardButton(text="❌ Отмена", callback_data=CANCEL_DISH)]
         ]
     )
     await call.message.answer(
@@ -389,7 +321,7 @@ async def dish_choose_category(call: CallbackQuery, state: FSMContext):
     await call.answer()
 
 
-@admin_router.callback_query(F.data == "cancel_dish", DishEditStates.waiting_for_composition)
+@admin_callbacks(CANCEL_DISH, DishEditStates.waiting_for_composition)
 async def cancel_dish_creation(call: CallbackQuery, state: FSMContext):
     await state.clear()
     await call.message.answer("Создание блюда отменено.")
@@ -410,43 +342,6 @@ async def dish_edit_description(message: Message, state: FSMContext):
 	await state.set_state(DishEditStates.waiting_for_ingredients_photo)
 
 
-@admin_router.message(DishEditStates.waiting_for_video)
-async def dish_edit_video(message: Message, state: FSMContext, user):
-	data = await state.get_data()
-	video_url = None
-	if message.video:
-		video_url = message.video.file_id
-	elif message.text and message.text.lower() == "нет":
-		video_url = None
-	else:
-		await message.answer("Пожалуйста, отправьте видео или напишите 'нет'.")
-		return
-	async with async_session_maker() as session:
-		dao = DAO(session)
-		if "edit_id" in data:
-			dish = await dao.get_dish_by_id(data["edit_id"])
-			if dish and dish.restaurant_id == user.restaurant_id:
-				dish.name = data["name"]
-				dish.category_id = data["category_id"]
-				dish.composition = data["composition"]
-				dish.description = data["description"]
-				dish.video_url = video_url
-				await session.commit()
-				await message.answer(f"Блюдо обновлено: {dish.name}")
-			else:
-				await message.answer("Ошибка: блюдо не найдено или нет доступа.")
-		else:
-			await dao.create_dish(
-				name=data["name"],
-				category_id=data["category_id"],
-				restaurant_id=user.restaurant_id,
-				composition=data["composition"],
-				description=data["description"],
-				video_url=video_url
-			)
-			await message.answer(f"Блюдо '{data['name']}' успешно создано!")
-	await state.clear()
-
 	# ----------- Хендлеры для генерации видео из фото и аудио, отправки в тех. группу и сохранения file_id -----------
 
 
@@ -458,10 +353,8 @@ async def dish_edit_ingredients_photo(message: Message, state: FSMContext):
 	photo = message.photo[-1]
 	file_id = photo.file_id
 	bot = message.bot
-	file = await bot.get_file(file_id)
-	with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as f:
-		await bot.download(file, f)
-		await state.update_data(ingredients_photo_path=f.name)
+	path = await media_store.save_telegram_file(bot, file_id, ".jpg")
+	await state.update_data(ingredients_photo_path=path)
 	await message.answer("Фото ингредиентов получено. Теперь отправьте фото готового блюда:")
 	await state.set_state(DishEditStates.waiting_for_ready_photo)
 
@@ -473,74 +366,195 @@ async def dish_edit_ready_photo(message: Message, state: FSMContext):
 	photo = message.photo[-1]
 	file_id = photo.file_id
 	bot = message.bot
-	file = await bot.get_file(file_id)
-	with tempfile.NamedTemporaryFile(delete=False, suffix=".jpg") as f:
-		await bot.download(file, f)
-		await state.update_data(ready_photo_path=f.name)
+	path = await media_store.save_telegram_file(bot, file_id, ".jpg")
+	await state.update_data(ready_photo_path=path)
 	await message.answer("Фото готового блюда получено. Теперь отправьте аудиофайл (mp3):")
 	await state.set_state(DishEditStates.waiting_for_audio)
 
 @admin_router.message(DishEditStates.waiting_for_audio)
-async def dish_edit_audio(message: Message, state: FSMContext, user):
+async def dish_edit_audio(message: Message, state: FSMContext, user, render_queue: RedisQueue):
 	audio = message.audio or message.document
 	if not audio:
 		await message.answer("Пожалуйста, отправьте аудиофайл (mp3).")
 		return
 	file_id = audio.file_id
 	bot = message.bot
-	file = await bot.get_file(file_id)
-	with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as f:
-		await bot.download(file, f)
-		await state.update_data(audio_path=f.name)
-	await message.answer("Аудио получено. Генерирую видео...")
+	path = await media_store.save_telegram_file(bot, file_id, ".mp3")
+	await state.update_data(audio_path=path)
 	data = await state.get_data()
-	# Генерация видео из фото ингредиентов
-	with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as vf:
-		make_video_from_image_and_audio(data["ingredients_photo_path"], data["audio_path"], vf.name)
-		video_path = vf.name
-	# Формируем карточку блюда (фото готового блюда)
-	dish_card = {
-		"name": data.get("name", "Блюдо"),
-		"description": data.get("description", ""),
-		"ingredients": data.get("composition", ""),
-		"photo_path": data.get("ready_photo_path"),
-		"video_path": video_path
-	}
-	# Сохраняем блюдо в базу
-	async with async_session_maker() as session:
-		dao = DAO(session)
-		await dao.create_dish(
-			name=data.get("name", "Блюдо"),
-			category_id=data.get("category_id"),
-			restaurant_id=user.restaurant_id,
-			composition=data.get("composition", ""),
-			description=data.get("description", ""),
-			video_url=video_path,
-			ingredients_photo_url=data.get("ingredients_photo_path"),
-			ready_photo_url=data.get("ready_photo_path")
-		)
-	from bot.utils import send_dish_card_to_tech_group
-	await send_dish_card_to_tech_group(message.bot, dish_card)
-	await message.answer("Карточка блюда успешно создана, фото и видео сохранены!")
+	# Видео кодируется в отдельном воркере, чтобы не блокировать event loop бота
+	await enqueue_render_job(
+		render_queue,
+		chat_id=message.chat.id,
+		restaurant_id=user.restaurant_id,
+		image_path=data["ingredients_photo_path"],
+		audio_path=data["audio_path"],
+		dish={
+			# id есть при редактировании: готовое видео обновит это блюдо, а не создаст новое
+			"id": data.get("edit_id"),
+			"name": data.get("name", "Блюдо"),
+			"category_id": data.get("category_id"),
+			"composition": data.get("composition", ""),
+			"description": data.get("description", ""),
+			"ingredients_photo_url": data.get("ingredients_photo_path"),
+			"ready_photo_url": data.get("ready_photo_path"),
+		},
+	)
+	await message.answer("Аудио получено. Генерирую видео — пришлю сообщение, когда карточка блюда будет готова.")
 	await state.clear()
 
 
+# ------------------------------ ИМПОРТ/ЭКСПОРТ МЕНЮ ------------------------------------------------------------------------
+
+@admin_buttons("📥 Импорт меню")
+async def menu_import_start(message: Message, state: FSMContext, user):
+	if not user or user.role != "admin":
+		await message.answer("Только админ может импортировать меню.")
+		return
+	await message.answer(
+		"Отправьте файл меню документом: CSV (.csv), JSON Lines (.jsonl) или JSON-массив (.json).\n"
+		f"Поля: {', '.join(FIELDS)}.\n"
+		"Обязательны category и name. Блюдо с тем же названием в той же категории будет обновлено."
+	)
+	await state.set_state(MenuImportStates.waiting_for_file)
+
+
+@admin_router.message(MenuImportStates.waiting_for_file)
+async def menu_import_file(message: Message, state: FSMContext, user, dao: DAO):
+	document = message.document
+	fmt = detect_format(document.file_name) if document else None
+	if not fmt:
+		await message.answer("Пришлите файл .csv, .jsonl или .json документом.")
+		return
+	if document.file_size and document.file_size > settings.MENU_IMPORT_MAX_BYTES:
+		await message.answer("Файл слишком большой. Разбейте меню на несколько файлов.")
+		return
+	with tempfile.TemporaryDirectory() as tmpdir:
+		path = os.path.join(tmpdir, f"menu.{fmt}")
+		await message.bot.download(document, destination=path)
+		try:
+			stats = await import_menu(dao, user.restaurant_id, read_menu_rows(path, fmt))
+		except MenuImportError as e:
+			await message.answer("Меню не импортировано, ничего не сохранено:\n" + "\n".join(e.errors))
+			return
+	dao.on_commit(lambda: menu_cache.invalidate(user.restaurant_id))
+	await dao.commit()
+	await message.answer(
+		f"Импорт завершён: создано категорий — {stats['categories']}, "
+		f"добавлено блюд — {stats['created']}, обновлено — {stats['updated']}."
+	)
+	await state.clear()
+
+
+@admin_buttons("📤 Экспорт меню")
+async def menu_export_start(message: Message, user):
+	if not user or user.role != "admin":
+		await message.answer("Только админ может выгружать меню.")
+		return
+	kb = InlineKeyboardMarkup(inline_keyboard=[
+		[InlineKeyboardButton(text=fmt.upper(), callback_data=MenuExport(fmt=fmt).pack()) for fmt in FORMATS]
+	])
+	await message.answer("Выберите формат выгрузки:", reply_markup=kb)
+
+
+@admin_callbacks(MenuExport)
+async def menu_export(call: CallbackQuery, callback_data: MenuExport, *, user, dao: DAO):
+	if not user or user.role != "admin":
+		await call.answer("Нет прав", show_alert=True)
+		return
+	fmt = callback_data.fmt
+	if fmt not in FORMATS:
+		await call.answer()
+		return
+	await call.answer("Готовлю файл...")
+	with tempfile.TemporaryDirectory() as tmpdir:
+		filename = f"menu_{user.restaurant_id}.{fmt}"
+		path = os.path.join(tmpdir, filename)
+		count = await export_menu(dao, user.restaurant_id, path, fmt)
+		if not count:
+			await call.message.answer("В меню пока нет блюд.")
+			return
+		await call.message.answer_document(FSInputFile(path, filename=filename), caption=f"Блюд в выгрузке: {count}")
+
+
+@admin_buttons("📊 Статистика")
+async def test_stats(message: Message, user, dao: DAO):
+	if not user or user.role != "admin":
+		await message.answer("Только админ может смотреть статистику.")
+		return
+	# Обе выборки читают готовые агрегаты, а не все результаты тестов
+	stats = await dao.get_restaurant_test_stats(user.restaurant_id)
+	if not stats or not stats.attempts:
+		await message.answer("Официанты ещё не проходили тест.")
+		return
+	top = await dao.get_top_performers(user.restaurant_id)
+	lines = [
+		"<b>📊 Тест по меню</b>",
+		f"Попыток: {stats.attempts}",
+		f"Средний балл: {stats.total_score / stats.attempts:.0f}%",
+		f"Сдано (от {settings.TEST_PASS_SCORE}%): {100 * stats.passed_count / stats.attempts:.0f}%",
+	]
+	if top:
+		lines.append("\n<b>Лучшие официанты:</b>")
+		for place, (waiter, waiter_stats) in enumerate(top, 1):
+			average = waiter_stats.total_score / waiter_stats.attempts
+			lines.append(
+				f"{place}. {html.escape(waiter.first_name or '')} {html.escape(waiter.last_name or '')} — "
+				f"{average:.0f}% (лучший {waiter_stats.best_score}%, попыток {waiter_stats.attempts})"
+			)
+	await message.answer("\n".join(lines), parse_mode="HTML")
+
+
+# --- Рассылка официантам ---
+@admin_buttons("📣 Рассылка")
+async def broadcast_start(message: Message, state: FSMContext, user):
+	await message.answer("Отправьте сообщение для всех официантов ресторана (текст, фото или видео):")
+	await state.set_state(BroadcastStates.waiting_for_message)
+
+
+@admin_router.message(BroadcastStates.waiting_for_message)
+async def broadcast_message(message: Message, state: FSMContext, user, dao: DAO, redis):
+	await state.clear()
+	recipients = await dao.get_broadcast_recipients(user.restaurant_id)
+	if not recipients:
+		await message.answer("В ресторане пока нет официантов.")
+		return
+	# Получатели получат копию этого сообщения — оно должно остаться в чате до конца рассылки
+	broadcast_id = await start_broadcast(redis, user.restaurant_id, message.chat.id, message.message_id, recipients)
+	kb = InlineKeyboardMarkup(inline_keyboard=[
+		[InlineKeyboardButton(text="🔄 Прогресс", callback_data=BroadcastStatus(id=broadcast_id).pack())]
+	])
+	await message.answer(f"Рассылка поставлена в очередь, получателей: {len(recipients)}.", reply_markup=kb)
+
+
+@admin_callbacks(BroadcastStatus)
+async def broadcast_status(call: CallbackQuery, callback_data: BroadcastStatus, *, redis):
+	stats = await get_broadcast_stats(redis, callback_data.id)
+	if stats is None:
+		await call.answer("Рассылка не найдена.", show_alert=True)
+		return
+	status = "завершена" if stats["status"] == "done" else "идёт"
+	await call.answer(f"Рассылка {status}.\n" + format_broadcast_stats(stats), show_alert=True)
+
+
 # --- Добавление категории через inline ---
-@admin_router.callback_query(F.data == "add_category")
+@admin_callbacks(ADD_CATEGORY)
 async def add_category_inline(call: CallbackQuery, state: FSMContext, *, user):
 	await call.message.answer("Введите название новой категории:")
 	await state.set_state(CategoryCreateStates.waiting_for_name)
 	await call.answer()
 
 # --- Добавление блюда через inline ---
-@admin_router.callback_query(F.data == "add_dish")
+@admin_callbacks(ADD_DISH)
 async def add_dish_inline(call: CallbackQuery, state: FSMContext, *, user):
+	# Сбрасываем данные прерванного редактирования (edit_id), иначе новое блюдо заменит старое
+	await state.set_data({})
 	await call.message.answer("Введите название нового блюда:")
 	await state.set_state(DishEditStates.waiting_for_name)
 	await call.answer()
 
-@admin_router.message(F.text.lower() == "🤝 сделать приглашение")
-async def invite_waiter_button(message: Message, user):
+@admin_buttons("🤝 Сделать приглашение")
+async def invite_waiter_button(message: Message, user, invite_service: InviteTokenService):
 	if not user or user.role != "admin":
 		await message.answer("Только админ может приглашать официантов.")
 		return
@@ -557,20 +571,76 @@ async def invite_waiter_button(message: Message, user):
 		reply_markup=kb
 	)
 
-@admin_router.message(F.text.lower() == "🧑‍🤝‍🧑 штат")
-async def show_waiters(message: Message, user):
+STAFF_PAGE_SIZE = 20
+
+
+async def build_staff_page(dao: DAO, restaurant_id, after_id=None):
+    """Страница официантов ресторана (keyset по id): текст и клавиатура. None — официантов нет."""
+    # Берём на одного больше, чтобы узнать, есть ли следующая страница
+    waiters = await dao.get_staff(restaurant_id, "waiter", after_id=after_id, limit=STAFF_PAGE_SIZE + 1)
+    has_next = len(waiters) > STAFF_PAGE_SIZE
+    waiters = waiters[:STAFF_PAGE_SIZE]
+    if not waiters:
+        return None
+    text = "Официанты ресторана:\n\n" + "\n".join(
+        f"{w.first_name} {w.last_name} (@{w.tg_username or '-'}), id: {w.id}" for w in waiters
+    )
+    rows = [
+        [InlineKeyboardButton(text=f"🗑️ {w.first_name} {w.last_name}", callback_data=StaffDelete(id=w.id, after_id=after_id or 0).pack())]
+        for w in waiters
+    ]
+    if has_next:
+        rows.append([InlineKeyboardButton(text="➡️ Далее", callback_data=StaffPage(after_id=waiters[-1].id).pack())])
+    return text, InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+@admin_buttons("🧑‍🤝‍🧑 Штат")
+async def show_waiters(message: Message, user, dao: DAO):
     if not user or user.role != "admin":
         await message.answer("Только админ может просматривать официантов.")
         return
-    async with async_session_maker() as session:
-        dao = DAO(session)
-        waiters = await dao.get_users_by_role("waiter")
-        waiters = [w for w in waiters if w.restaurant_id == user.restaurant_id]
-    if not waiters:
+    page = await build_staff_page(dao, user.restaurant_id)
+    if not page:
         await message.answer("В вашем ресторане нет официантов.")
         return
-    for w in waiters:
-        kb = InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🗑️ Удалить", callback_data=f"delwaiter_{w.id}")]
-        ])
-        await message.answer(f"{w.first_name} {w.last_name} (@{w.tg_username or '-'}), id: {w.id}", reply_markup=kb)
\ No newline at end of file
+    text, kb = page
+    await message.answer(text, reply_markup=kb)
+
+
+@admin_callbacks(StaffPage)
+async def show_waiters_page(call: CallbackQuery, callback_data: StaffPage, *, user, dao: DAO):
+    if not user or user.role != "admin":
+        await call.answer("Нет прав", show_alert=True)
+        return
+    page = await build_staff_page(dao, user.restaurant_id, after_id=callback_data.after_id)
+    if not page:
+        await call.answer("Больше официантов нет.")
+        return
+    text, kb = page
+    await call.message.edit_text(text, reply_markup=kb)
+    await call.answer()
+
+
+@admin_callbacks(StaffDelete)
+async def delete_waiter_callback(call: CallbackQuery, callback_data: StaffDelete, *, user, dao: DAO):
+    if not user or user.role != "admin":
+        await call.answer("Нет прав", show_alert=True)
+        return
+    waiter_id = callback_data.id
+    waiter = await dao.get_staff_member(user.restaurant_id, waiter_id, role="waiter")
+    if not waiter:
+        await call.answer("Официант не найден или нет доступа", show_alert=True)
+        return
+    full_name = f"{waiter.first_name} {waiter.last_name}"
+    # delete_user сам сбрасывает запись официанта в кэше пользователей
+    await dao.delete_user(waiter_id)
+    # Та же страница списка уже без удалённого; если она опустела — первая
+    page = await build_staff_page(dao, user.restaurant_id, after_id=callback_data.after_id)
+    if not page and callback_data.after_id:
+        page = await build_staff_page(dao, user.restaurant_id)
+    if page:
+        text, kb = page
+        await call.message.edit_text(text, reply_markup=kb)
+    else:
+        await call.message.edit_text("В вашем ресторане нет официантов.")
+    await call.answer(f"Официант {full_name} удалён.")
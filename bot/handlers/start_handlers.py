@@ -0,0 +1,80 @@
+from aiogram import Router
+from aiogram.filters import CommandStart
+from aiogram.fsm.context import FSMContext
+from aiogram.types import Message
+
+from bot.handlers.admin_handlers import admin_kb
+from bot.handlers.super_admin_handlers import super_admin_kb
+from bot.handlers.waiter_handlers import WaiterMenuStates, waiter_kb
+from database.dao import DAO
+from database.invite_token_service import InviteTokenService
+
+# Подключается первым и без фильтра роли: /start и регистрация по приглашению
+# нужны и тем, кого ещё нет в базе
+start_router = Router()
+
+
+@start_router.message(CommandStart())
+async def universal_start(message: Message, state: FSMContext, user, invite_service: InviteTokenService):
+    # Если пользователь не найден, пробуем регистрацию по токену
+    if not user:
+        # Проверяем, есть ли токен в deep-link
+        if message.text and len(message.text.split()) > 1:
+            token = message.text.split()[1]
+            restaurant_id = await invite_service.get_restaurant_id(token)
+            if not restaurant_id:
+                await message.answer("Некорректная или устаревшая ссылка-приглашение. Обратитесь к администратору.")
+                return
+            await state.update_data(token=token, restaurant_id=restaurant_id)
+            await message.answer("Введите ваше имя:")
+            await state.set_state(WaiterMenuStates.reg_name)
+            return
+        await message.answer("У вас нет доступа к этому боту. Обратитесь к администратору.")
+        return
+    if user.role == "waiter":
+        await message.answer("Выберите действие:", reply_markup=waiter_kb)
+        await state.set_state(WaiterMenuStates.waiting_for_choice)
+    elif user.role == "admin":
+        await message.answer(f"Добро пожаловать, {user.first_name}! Вы вошли как {user.role}.", reply_markup=admin_kb)
+    elif user.role == "superadmin":
+        await message.answer("Вы вошли как супер-админ.", reply_markup=super_admin_kb)
+    else:
+        await message.answer("У вас нет доступа к этому боту. Обратитесь к администратору.")
+
+
+# FSM: регистрация официанта по deep-link токену
+@start_router.message(WaiterMenuStates.reg_name)
+async def reg_name(message: Message, state: FSMContext):
+    await state.update_data(first_name=message.text.strip())
+    await message.answer("Введите вашу фамилию:")
+    await state.set_state(WaiterMenuStates.reg_surname)
+
+
+@start_router.message(WaiterMenuStates.reg_surname)
+async def reg_surname(message: Message, state: FSMContext, invite_service: InviteTokenService, dao: DAO):
+    data = await state.get_data()
+    first_name = data.get("first_name")
+    last_name = message.text.strip()
+    restaurant_id = int(data.get("restaurant_id"))
+    token = data.get("token")
+    user_id = str(message.from_user.id)
+    username = message.from_user.username or ""
+    # Проверяем, не существует ли уже такой пользователь
+    existing = await dao.get_user_by_tg_id(user_id)
+    if existing:
+        await message.answer("Вы уже зарегистрированы.")
+        await state.clear()
+        return
+    await dao.create_user(
+        first_name=first_name,
+        last_name=last_name,
+        tg_username=username,
+        tg_id=user_id,
+        role="waiter",
+        restaurant_id=restaurant_id
+    )
+    await dao.commit()
+    # Удаляем токен, чтобы нельзя было использовать повторно
+    await invite_service.delete_token(token)
+    await message.answer(f"Регистрация завершена! Добро пожаловать, {first_name}!", reply_markup=waiter_kb)
+    await state.set_state(WaiterMenuStates.waiting_for_choice)
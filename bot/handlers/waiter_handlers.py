@@ -1,142 +1,142 @@
-from aiogram import Router, F
-from aiogram.filters import CommandStart
+from datetime import datetime, timezone
+
+from aiogram import Router
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardMarkup, KeyboardButton
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, InputMediaPhoto, InputMediaVideo, InlineQuery, InlineQueryResultArticle, InputTextMessageContent
 from database.dao import DAO
-from database.engine import async_session_maker
-from bot.utils import send_dish_card_to_tech_group
+from database.menu_cache import menu_cache
+from bot.utils import has_dish_media, is_file_id_error, send_dish_card_to_tech_group, send_dish_media, schedule_dish_prefetch
+from bot.dish_cards import WAITER_CARD_KEYBOARDS, dish_cards
+from bot.dish_search import search_indexes
+from bot.quiz import quiz_banks, score_percent, start_quiz
+from config import settings
+from database.test_results_buffer import test_results_buffer
 from bot.keyboards.reply import get_keyboard
+from bot.keyboards.inline import clamp_page, get_paginated_keyboard, keyboard_pages
+from bot.callbacks import (
+    WAITER_BACK_CATEGORIES, WAITER_BACK_DISHES, WAITER_NEXT_DISH, WAITER_PREV_DISH, WAITER_TOGGLE_MEDIA,
+    QuizAnswer, WaiterCategory, WaiterDish, WaiterPage,
+)
+from bot.routing import CallbackRoutes, RoleFilter, TextRoutes
 
 waiter_router = Router()
+waiter_router.message.filter(RoleFilter("waiter"))
+waiter_router.callback_query.filter(RoleFilter("waiter"))
+# Поиск по меню в inline-режиме нужен и админу
+waiter_router.inline_query.filter(RoleFilter("waiter", "admin"))
+waiter_buttons = TextRoutes(waiter_router)
+waiter_callbacks = CallbackRoutes(waiter_router)
+
+waiter_kb = get_keyboard("Тест", "Меню")
+
+# Telegram принимает не больше 50 результатов в одном ответе на inline-запрос
+INLINE_RESULTS_PAGE = 50
 
 class WaiterMenuStates(StatesGroup):
     waiting_for_choice = State()
     waiting_for_category = State()
     waiting_for_dish = State()
     viewing_dish = State()
+    taking_test = State()
     reg_name = State()
     reg_surname = State()
 
 
-@waiter_router.message(CommandStart())
-async def universal_start(message: Message, state: FSMContext, user):
-    # Если пользователь не найден, пробуем регистрацию по токену
-    if not user:
-        # Проверяем, есть ли токен в deep-link
-        if message.text and len(message.text.split()) > 1:
-            token = message.text.split()[1]
-            from database.invite_token_service import InviteTokenService
-            invite_service = InviteTokenService()
-            restaurant_id = await invite_service.get_restaurant_id(token)
-            if not restaurant_id:
-                await message.answer("Некорректная или устаревшая ссылка-приглашение. Обратитесь к администратору.")
-                return
-            await state.update_data(token=token, restaurant_id=restaurant_id)
-            await message.answer("Введите ваше имя:")
-            await state.set_state(WaiterMenuStates.reg_name)
-            return
-        else:
-            await message.answer("У вас нет доступа к этому боту. Обратитесь к администратору.")
-            return
-    if user.role == "waiter":
-        kb = ReplyKeyboardMarkup(
-            keyboard=[[KeyboardButton(text="Тест"), KeyboardButton(text="Меню")]],
-            resize_keyboard=True
-        )
-        await message.answer("Выберите действие:", reply_markup=kb)
-        await state.set_state(WaiterMenuStates.waiting_for_choice)
-    elif user.role in ("admin", "superadmin"):
-        kb = get_keyboard(
-            "🍽️ Блюдо",
-            "📂 Категории",
-            "🤝 Сделать приглашение",
-            "🧑‍🤝‍🧑 Штат",
-            sizes=(2, 2)
-        )
-        await message.answer(f"Добро пожаловать, {user.first_name}! Вы вошли как {user.role}.", reply_markup=kb)
-        # Можно добавить state для админа, если нужно
+def categories_keyboard(menu, page: int = 0) -> InlineKeyboardMarkup:
+    page = clamp_page(page, len(menu.categories))
+    return keyboard_pages.get(("wc", menu.restaurant_id), menu.version, page, lambda: get_paginated_keyboard(
+        menu.categories,
+        lambda c: [InlineKeyboardButton(text=c.name, callback_data=WaiterCategory(id=c.id).pack())],
+        lambda p: WaiterPage(view="c", page=p, v=menu.version).pack(),
+        page,
+    ))
+
+
+def category_dishes_keyboard(menu, category_id: int, page: int = 0) -> InlineKeyboardMarkup:
+    page = clamp_page(page, len(menu.category_dishes(category_id)))
+    return keyboard_pages.get(("wd", menu.restaurant_id, category_id), menu.version, page, lambda: get_paginated_keyboard(
+        menu.category_dishes(category_id),
+        lambda d: [InlineKeyboardButton(text=f"{d.name} 🍽️", callback_data=WaiterDish(id=d.id).pack())],
+        lambda p: WaiterPage(view="d", page=p, v=menu.version, category_id=category_id).pack(),
+        page,
+        bottom=[[InlineKeyboardButton(text="🔙 Назад", callback_data=WAITER_BACK_CATEGORIES)]],
+    ))
+
+
+@waiter_callbacks(WaiterPage)
+async def waiter_list_page(call: CallbackQuery, callback_data: WaiterPage, user, dao: DAO):
+    if not user or not user.restaurant_id:
+        await call.answer()
+        return
+    menu = await menu_cache.get(user.restaurant_id, dao)
+    if callback_data.view == "c":
+        kb = categories_keyboard(menu, callback_data.page)
+    elif callback_data.view == "d" and callback_data.category_id in menu.dishes_by_category:
+        kb = category_dishes_keyboard(menu, callback_data.category_id, callback_data.page)
     else:
-        await message.answer("У вас нет доступа к этому боту. Обратитесь к администратору.")
+        await call.answer("Список устарел, откройте меню заново.")
+        return
+    # Кнопка с номером страницы ведёт на текущую страницу — клавиатура та же
+    if kb != call.message.reply_markup:
+        await call.message.edit_reply_markup(reply_markup=kb)
+    # Страница собрана по другой версии меню — состав списка мог сдвинуться
+    await call.answer("Меню обновилось." if callback_data.v != menu.version else None)
 
 
-# FSM: регистрация официанта по deep-link токену
-@waiter_router.message(WaiterMenuStates.reg_name)
-async def reg_name(message: Message, state: FSMContext):
-    await state.update_data(first_name=message.text.strip())
-    await message.answer("Введите вашу фамилию:")
-    await state.set_state(WaiterMenuStates.reg_surname)
+@waiter_buttons("Меню")
+async def waiter_menu(message: Message, state: FSMContext, user, dao: DAO):
+    menu = await menu_cache.get(user.restaurant_id, dao)
+    if not menu.categories:
+        await message.answer("Нет категорий.")
+        return
+    await message.answer("Выберите категорию:", reply_markup=categories_keyboard(menu))
+    await state.set_state(WaiterMenuStates.waiting_for_category)
 
-@waiter_router.message(WaiterMenuStates.reg_surname)
-async def reg_surname(message: Message, state: FSMContext):
-    data = await state.get_data()
-    first_name = data.get("first_name")
-    last_name = message.text.strip()
-    restaurant_id = int(data.get("restaurant_id"))
-    token = data.get("token")
-    user_id = str(message.from_user.id)
-    username = message.from_user.username or ""
-    async with async_session_maker() as session:
-        dao = DAO(session)
-        # Проверяем, не существует ли уже такой пользователь
-        existing = await dao.get_user_by_tg_id(user_id)
-        if existing:
-            await message.answer("Вы уже зарегистрированы.")
-            await state.clear()
-            return
-        await dao.create_user(
-            first_name=first_name,
-            last_name=last_name,
-            tg_username=username,
-            tg_id=user_id,
-            role="waiter",
-            restaurant_id=restaurant_id
-        )
-    # Удаляем токен, чтобы нельзя было использовать повторно
-    from database.invite_token_service import InviteTokenService
-    invite_service = InviteTokenService()
-    await invite_service.delete_token(token)
-    await session.commit()
-    kb = ReplyKeyboardMarkup(
-        keyboard=[[KeyboardButton(text="Тест"), KeyboardButton(text="Меню")]],
-        resize_keyboard=True
-    )
-    await message.answer(f"Регистрация завершена! Добро пожаловать, {first_name}!", reply_markup=kb)
-    await state.set_state(WaiterMenuStates.waiting_for_choice)
+
+@waiter_buttons("Тест")
+async def waiter_test(message: Message, state: FSMContext, user, dao: DAO):
+    menu = await menu_cache.get(user.restaurant_id, dao)
+    bank = quiz_banks.get(menu)
+    if not bank:
+        await message.answer("В меню пока недостаточно блюд для теста.")
+        return
+    questions = start_quiz(bank, settings.QUIZ_QUESTIONS)
+    await state.update_data(quiz=questions, quiz_answers=[])
+    await state.set_state(WaiterMenuStates.taking_test)
+    text, kb = quiz_question_view(questions, 0)
+    await message.answer(text, reply_markup=kb)
 
 
 @waiter_router.message(WaiterMenuStates.waiting_for_choice)
-async def waiter_choice(message: Message, state: FSMContext, user):
-    if message.text.lower() == "меню":
-        async with async_session_maker() as session:
-            dao = DAO(session)
-            categories = await dao.get_categories_by_restaurant(user.restaurant_id)
-        if not categories:
-            await message.answer("Нет категорий.")
-            return
-        kb = InlineKeyboardMarkup(
-            inline_keyboard=[[InlineKeyboardButton(text=c.name, callback_data=f"waiter_cat_{c.id}") for c in categories]]
-        )
-        await message.answer("Выберите категорию:", reply_markup=kb)
-        await state.set_state(WaiterMenuStates.waiting_for_category)
-    elif message.text.lower() == "тест":
-        await message.answer("Тестирование пока не реализовано.")
-    else:
+async def waiter_search(message: Message, state: FSMContext, user, dao: DAO):
+    if not message.text:
         await message.answer("Пожалуйста, выберите действие через кнопки.")
-
-@waiter_router.callback_query(F.data.startswith("waiter_cat_"), WaiterMenuStates.waiting_for_category)
-async def waiter_choose_category(call: CallbackQuery, state: FSMContext, user):
-    cat_id = int(call.data.split("_")[2])
-    await state.update_data(category_id=cat_id)
-    async with async_session_maker() as session:
-        dao = DAO(session)
-        dishes = await dao.get_dishes_by_category(cat_id)
+        return
+    # Любой текст, кроме кнопок, — поиск блюда по меню
+    menu = await menu_cache.get(user.restaurant_id, dao)
+    dishes = search_indexes.get(menu).search(message.text, settings.SEARCH_RESULTS)
     if not dishes:
-        await call.message.edit_text("В этой категории нет блюд.")
+        await message.answer("Ничего не нашлось. Выберите действие через кнопки или уточните запрос.")
         return
     kb = InlineKeyboardMarkup(
-        inline_keyboard=[[InlineKeyboardButton(text=d.name, callback_data=f"waiter_dish_{d.id}") for d in dishes]] + [[InlineKeyboardButton(text="Назад", callback_data="waiter_back_cat")]]
+        inline_keyboard=[[InlineKeyboardButton(text=d.name, callback_data=WaiterDish(id=d.id).pack())] for d in dishes]
+        + [[InlineKeyboardButton(text="🔙 К категориям", callback_data=WAITER_BACK_CATEGORIES)]]
     )
+    await message.answer("Найденные блюда:", reply_markup=kb)
+    await state.set_state(WaiterMenuStates.waiting_for_dish)
+
+
+@waiter_callbacks(WaiterCategory, WaiterMenuStates.waiting_for_category)
+async def waiter_choose_category(call: CallbackQuery, callback_data: WaiterCategory, state: FSMContext, user, dao: DAO):
+    cat_id = callback_data.id
+    await state.update_data(category_id=cat_id)
+    menu = await menu_cache.get(user.restaurant_id, dao)
+    if not menu.category_dishes(cat_id):
+        await call.message.edit_text("В этой категории нет блюд.")
+        return
+    kb = category_dishes_keyboard(menu, cat_id)
     try:
         await call.message.edit_text("Выберите блюдо:", reply_markup=kb)
     except Exception:
@@ -145,14 +145,10 @@ async def waiter_choose_category(call: CallbackQuery, state: FSMContext, user):
     await state.set_state(WaiterMenuStates.waiting_for_dish)
     await call.answer()
 
-@waiter_router.callback_query(F.data == "waiter_back_cat", WaiterMenuStates.waiting_for_dish)
-async def waiter_back_to_categories(call: CallbackQuery, state: FSMContext, user):
-    async with async_session_maker() as session:
-        dao = DAO(session)
-        categories = await dao.get_categories_by_restaurant(user.restaurant_id)
-    kb = InlineKeyboardMarkup(
-        inline_keyboard=[[InlineKeyboardButton(text=c.name, callback_data=f"waiter_cat_{c.id}") for c in categories]]
-    )
+@waiter_callbacks(WAITER_BACK_CATEGORIES, WaiterMenuStates.waiting_for_dish)
+async def waiter_back_to_categories(call: CallbackQuery, state: FSMContext, user, dao: DAO):
+    menu = await menu_cache.get(user.restaurant_id, dao)
+    kb = categories_keyboard(menu)
     try:
         await call.message.edit_text("Выберите категорию:", reply_markup=kb)
     except Exception:
@@ -161,93 +157,114 @@ async def waiter_back_to_categories(call: CallbackQuery, state: FSMContext, user
     await state.set_state(WaiterMenuStates.waiting_for_category)
     await call.answer()
 
-@waiter_router.callback_query(F.data.startswith("waiter_dish_"), WaiterMenuStates.waiting_for_dish)
-async def waiter_choose_dish(call: CallbackQuery, state: FSMContext, user):
-    dish_id = int(call.data.split("_")[2])
+async def show_dish_card(call: CallbackQuery, menu, dish, dao: DAO):
+    """Показывает карточку блюда (всегда с фото) и заранее грузит фото соседних блюд."""
+    kb = WAITER_CARD_KEYBOARDS["photo"]
+    caption = dish_cards.caption(menu, dish)
+    shown = False
+    if has_dish_media(dish, "photo"):
+        try:
+            await send_dish_media(
+                lambda m: call.message.edit_media(media=InputMediaPhoto(media=m, caption=caption, parse_mode="HTML"), reply_markup=kb),
+                dish, "photo", dao
+            )
+            shown = True
+        except TelegramBadRequest as e:
+            # file_id отклонён, а загрузить заново нечего (старый путь вне MEDIA_ROOT) — карточка без фото
+            if not is_file_id_error(e):
+                raise
+            print(f"Фото блюда {dish.id} недоступно: {e.message}")
+    if not shown:
+        try:
+            await call.message.edit_text(caption, parse_mode="HTML", reply_markup=kb)
+        except Exception:
+            # Текущее сообщение с медиа — текстом его не заменить
+            await call.message.delete()
+            await call.message.answer(caption, parse_mode="HTML", reply_markup=kb)
+    # Пока официант читает карточку, соседние фото получают file_id — листание не ждёт загрузки
+    neighbours = [menu.neighbour(dish.id, -1), menu.neighbour(dish.id, 1)]
+    schedule_dish_prefetch(call.bot, [d for d in neighbours if d is not dish])
+
+
+@waiter_callbacks(WaiterDish, WaiterMenuStates.waiting_for_dish)
+async def waiter_choose_dish(call: CallbackQuery, callback_data: WaiterDish, state: FSMContext, user, dao: DAO):
+    dish_id = callback_data.id
     await state.update_data(dish_id=dish_id, dish_page=0, dish_media="photo")
-    async with async_session_maker() as session:
-        dao = DAO(session)
-        dish = await dao.get_dish_by_id(dish_id)
+    menu = await menu_cache.get(user.restaurant_id, dao)
+    dish = menu.get_dish(dish_id)
     if not dish:
         await call.message.edit_text("Блюдо не найдено.")
         return
-    from aiogram.types.input_file import FSInputFile
-    from aiogram.types import InputMediaPhoto, InputMediaVideo
-    dish_media = "photo"  # Для карточки блюда всегда фото
-    kb = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="⬅️ Назад", callback_data="waiter_prev_dish"), InlineKeyboardButton(text="➡️ Далее", callback_data="waiter_next_dish")],
-            [InlineKeyboardButton(text="📸 Фотография", callback_data="waiter_toggle_media")],
-            [InlineKeyboardButton(text="🔙 К категориям", callback_data="waiter_back_dishes")]
-        ]
-    )
-    # Форматируем состав блюда (ингредиенты)
-    if dish.composition:
-        import re
-        raw_ingredients = re.split(r",\s*|\s{2,}", dish.composition)
-        ingredients_text = '\n'.join([f"• {i.strip()}" for i in raw_ingredients if i.strip()])
-    else:
-        ingredients_text = "Нет данных"
-    caption = f"<b>{dish.name} 🍽️</b>\n\n<b>Состав:</b>\n{ingredients_text}\n\n<b>Описание:</b>\n{dish.description}"
-    # При первом показе блюда всегда фото
-    if dish.ready_photo_url:
-        media = InputMediaPhoto(media=FSInputFile(dish.ready_photo_url), caption=caption, parse_mode="HTML")
-        await call.message.edit_media(media=media, reply_markup=kb)
-    else:
-        await call.message.edit_text(caption, parse_mode="HTML", reply_markup=kb)
+    # После поиска категория в FSM не выбрана — «назад» ведёт в категорию блюда
+    await state.update_data(category_id=dish.category_id)
+    await show_dish_card(call, menu, dish, dao)
     await state.set_state(WaiterMenuStates.viewing_dish)
     await call.answer()
 
-@waiter_router.callback_query(F.data == "waiter_toggle_media", WaiterMenuStates.viewing_dish)
-async def waiter_toggle_media(call: CallbackQuery, state: FSMContext, user):
+
+@waiter_callbacks(WAITER_PREV_DISH, WaiterMenuStates.viewing_dish)
+@waiter_callbacks(WAITER_NEXT_DISH, WaiterMenuStates.viewing_dish)
+async def waiter_flip_dish(call: CallbackQuery, state: FSMContext, user, dao: DAO):
+    data = await state.get_data()
+    menu = await menu_cache.get(user.restaurant_id, dao)
+    # Соседнее блюдо берём из индекса снимка меню — без запросов к базе
+    dish = menu.neighbour(data.get("dish_id"), -1 if call.data == WAITER_PREV_DISH else 1)
+    if not dish:
+        await call.answer("Блюдо не найдено.", show_alert=True)
+        return
+    if dish.id == data.get("dish_id"):
+        await call.answer("В этой категории одно блюдо.")
+        return
+    await state.update_data(dish_id=dish.id, dish_media="photo")
+    await show_dish_card(call, menu, dish, dao)
+    await call.answer()
+
+@waiter_callbacks(WAITER_TOGGLE_MEDIA, WaiterMenuStates.viewing_dish)
+async def waiter_toggle_media(call: CallbackQuery, state: FSMContext, user, dao: DAO):
     data = await state.get_data()
     dish_id = data.get("dish_id")
     dish_media = data.get("dish_media", "photo")
-    async with async_session_maker() as session:
-        dao = DAO(session)
-        dish = await dao.get_dish_by_id(dish_id)
+    menu = await menu_cache.get(user.restaurant_id, dao)
+    dish = menu.get_dish(dish_id)
+    if not dish:
+        await call.answer("Блюдо не найдено.", show_alert=True)
+        return
     # Кнопка переключения медиа всегда чередуется
-    next_media_text = "📸 Фотография" if dish_media == "video" else "🎬 Видео"
-    kb = InlineKeyboardMarkup(
-        inline_keyboard=[
-            [InlineKeyboardButton(text="⬅️ Назад", callback_data="waiter_prev_dish"), InlineKeyboardButton(text="➡️ Далее", callback_data="waiter_next_dish")],
-            [InlineKeyboardButton(text=next_media_text, callback_data="waiter_toggle_media")],
-            [InlineKeyboardButton(text="🔙 К категориям", callback_data="waiter_back_dishes")]
-        ]
-    )
-    from aiogram.types.input_file import FSInputFile
-    from aiogram.types import InputMediaPhoto, InputMediaVideo
-    # Форматируем состав блюда (ингредиенты)
-    if dish.composition:
-        import re
-        raw_ingredients = re.split(r",\s*|\s{2,}", dish.composition)
-        ingredients_text = '\n'.join([f"• {i.strip()}" for i in raw_ingredients if i.strip()])
-    else:
-        ingredients_text = "Нет данных"
-    caption = f"<b>{dish.name} 🍽️</b>\n\n<b>Состав:</b>\n{ingredients_text}\n\n<b>Описание:</b>\n{dish.description}"
+    kb = WAITER_CARD_KEYBOARDS["photo" if dish_media == "video" else "video"]
+    caption = dish_cards.caption(menu, dish)
     # Для видео и фото всегда используем caption
-    if dish_media == "photo" and dish.video_url:
-        media = InputMediaVideo(media=FSInputFile(dish.video_url), caption=caption, parse_mode="HTML")
-        await call.message.edit_media(media=media, reply_markup=kb)
-        await state.update_data(dish_media="video")
-    elif dish_media == "video" and dish.ready_photo_url:
-        media = InputMediaPhoto(media=FSInputFile(dish.ready_photo_url), caption=caption, parse_mode="HTML")
-        await call.message.edit_media(media=media, reply_markup=kb)
-        await state.update_data(dish_media="photo")
-    else:
-        await call.message.answer("Нет медиа для переключения.")
+    try:
+        if dish_media == "photo" and has_dish_media(dish, "video"):
+            await send_dish_media(
+                lambda m: call.message.edit_media(media=InputMediaVideo(media=m, caption=caption, parse_mode="HTML"), reply_markup=kb),
+                dish, "video", dao
+            )
+            await state.update_data(dish_media="video")
+        elif dish_media == "video" and has_dish_media(dish, "photo"):
+            await send_dish_media(
+                lambda m: call.message.edit_media(media=InputMediaPhoto(media=m, caption=caption, parse_mode="HTML"), reply_markup=kb),
+                dish, "photo", dao
+            )
+            await state.update_data(dish_media="photo")
+        else:
+            await call.message.answer("Нет медиа для переключения.")
+    except TelegramBadRequest as e:
+        # file_id отклонён, а загрузить заново нечего (старый путь вне MEDIA_ROOT)
+        if not is_file_id_error(e):
+            raise
+        print(f"Медиа блюда {dish.id} недоступно: {e.message}")
+        await call.answer("Медиа недоступно.", show_alert=True)
+        return
     await call.answer()
 
-@waiter_router.callback_query(F.data == "waiter_back_dishes", WaiterMenuStates.viewing_dish)
-async def waiter_back_to_dishes(call: CallbackQuery, state: FSMContext, user):
+@waiter_callbacks(WAITER_BACK_DISHES, WaiterMenuStates.viewing_dish)
+async def waiter_back_to_dishes(call: CallbackQuery, state: FSMContext, user, dao: DAO):
     data = await state.get_data()
     cat_id = data.get("category_id")
-    async with async_session_maker() as session:
-        dao = DAO(session)
-        dishes = await dao.get_dishes_by_category(cat_id)
-    kb = InlineKeyboardMarkup(
-        inline_keyboard=[[InlineKeyboardButton(text=f"{d.name} 🍽️", callback_data=f"waiter_dish_{d.id}") for d in dishes]] + [[InlineKeyboardButton(text="🔙 Назад", callback_data="waiter_back_cat")]]
-    )
+    menu = await menu_cache.get(user.restaurant_id, dao)
+    # Возвращаемся на страницу списка, где было открытое блюдо
+    page = menu.dish_positions.get(data.get("dish_id"), 0) // settings.KEYBOARD_PAGE_SIZE
+    kb = category_dishes_keyboard(menu, cat_id, page)
     try:
         await call.message.edit_text("Выберите блюдо:", reply_markup=kb)
     except Exception:
@@ -255,3 +272,72 @@ async def waiter_back_to_dishes(call: CallbackQuery, state: FSMContext, user):
         await call.message.answer("Выберите блюдо:", reply_markup=kb)
     await state.set_state(WaiterMenuStates.waiting_for_dish)
     await call.answer()
+
+
+# ----------------------------- ПОИСК В INLINE-РЕЖИМЕ -----------------------------
+# Inline-режим включается у бота в @BotFather (/setinline)
+
+@waiter_router.inline_query()
+async def waiter_inline_search(query: InlineQuery, user, dao: DAO):
+    if not user or not user.restaurant_id or not query.query.strip():
+        await query.answer([], cache_time=settings.INLINE_SEARCH_CACHE_TIME, is_personal=True)
+        return
+    offset = int(query.offset or 0)
+    menu = await menu_cache.get(user.restaurant_id, dao)
+    dishes = search_indexes.get(menu).search(query.query, offset + INLINE_RESULTS_PAGE + 1)
+    page = dishes[offset:offset + INLINE_RESULTS_PAGE]
+    results = [
+        InlineQueryResultArticle(
+            id=str(dish.id),
+            title=dish.name,
+            description=dish.composition or dish.description,
+            input_message_content=InputTextMessageContent(message_text=dish_cards.caption(menu, dish), parse_mode="HTML"),
+        )
+        for dish in page
+    ]
+    next_offset = str(offset + INLINE_RESULTS_PAGE) if len(dishes) > offset + INLINE_RESULTS_PAGE else ""
+    # Меню у каждого ресторана своё — ответ кэшируется для пользователя, а не для всех
+    await query.answer(results, cache_time=settings.INLINE_SEARCH_CACHE_TIME, is_personal=True, next_offset=next_offset)
+
+
+# ----------------------------- ТЕСТ ПО МЕНЮ -----------------------------
+
+def quiz_question_view(questions: list, position: int) -> tuple[str, InlineKeyboardMarkup]:
+    question = questions[position]
+    kb = InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text=option, callback_data=QuizAnswer(position=position, option=i).pack())]
+            for i, option in enumerate(question["options"])
+        ]
+    )
+    return f"Вопрос {position + 1} из {len(questions)}\n\n{question['text']}", kb
+
+
+@waiter_callbacks(QuizAnswer, WaiterMenuStates.taking_test)
+async def waiter_quiz_answer(call: CallbackQuery, callback_data: QuizAnswer, state: FSMContext, user):
+    position, option = callback_data.position, callback_data.option
+    data = await state.get_data()
+    questions, answers = data.get("quiz", []), data.get("quiz_answers", [])
+    # Повторное нажатие на уже отвеченный вопрос
+    if position != len(answers) or position >= len(questions):
+        await call.answer()
+        return
+    question = questions[position]
+    correct = option == question["answer"]
+    answers.append(correct)
+    feedback = "✅ Верно!" if correct else f"❌ Неверно. Правильный ответ: {question['options'][question['answer']]}"
+    if len(answers) < len(questions):
+        # Ответы копятся в FSM, в базу пишется только итог теста
+        await state.update_data(quiz_answers=answers)
+        text, kb = quiz_question_view(questions, len(answers))
+        await call.message.edit_text(f"{feedback}\n\n{text}", reply_markup=kb)
+        await call.answer()
+        return
+    score = score_percent(answers)
+    test_results_buffer.add(user.id, user.restaurant_id, score, datetime.now(timezone.utc))
+    await state.update_data(quiz=None, quiz_answers=None)
+    await state.set_state(WaiterMenuStates.waiting_for_choice)
+    await call.message.edit_text(
+        f"{feedback}\n\nТест завершён! Правильных ответов: {sum(answers)} из {len(answers)} ({score}%)."
+    )
+    await call.answer()
@@ -0,0 +1,74 @@
+import math
+from typing import Callable, Iterable, Sequence
+
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from config import settings
+
+
+def clamp_page(page: int, count: int, page_size: int = None) -> int:
+    """Номер существующей страницы: callback_data мог устареть, пока список менялся."""
+    page_size = page_size or settings.KEYBOARD_PAGE_SIZE
+    return min(max(page, 0), max(0, math.ceil(count / page_size) - 1))
+
+
+def get_paginated_keyboard(
+    items: Sequence,
+    row: Callable[..., list[InlineKeyboardButton]],
+    page_data: Callable[[int], str],
+    page: int = 0,
+    page_size: int = None,
+    top: Iterable[list[InlineKeyboardButton]] = (),
+    bottom: Iterable[list[InlineKeyboardButton]] = (),
+) -> InlineKeyboardMarkup:
+    '''
+    Одна страница списка: строки кнопок только для элементов страницы и ряд листания.
+    row(item) возвращает ряд кнопок элемента, page_data(номер страницы) — callback_data
+    кнопки листания (см. bot/callbacks.py). top/bottom — ряды над и под списком.
+    Example:
+    get_paginated_keyboard(
+            menu.category_dishes(category_id),
+            lambda d: [InlineKeyboardButton(text=d.name, callback_data=WaiterDish(id=d.id).pack())],
+            lambda p: WaiterPage(view="d", page=p, v=menu.version, category_id=category_id).pack(),
+            page,
+            bottom=[[InlineKeyboardButton(text="Назад", callback_data=WAITER_BACK_CATEGORIES)]]
+        )
+    '''
+    page_size = page_size or settings.KEYBOARD_PAGE_SIZE
+    pages = max(1, math.ceil(len(items) / page_size))
+    page = clamp_page(page, len(items), page_size)
+    rows = [*top, *(row(item) for item in items[page * page_size:(page + 1) * page_size])]
+    if pages > 1:
+        nav = []
+        if page > 0:
+            nav.append(InlineKeyboardButton(text="⬅️", callback_data=page_data(page - 1)))
+        nav.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data=page_data(page)))
+        if page < pages - 1:
+            nav.append(InlineKeyboardButton(text="➡️", callback_data=page_data(page + 1)))
+        rows.append(nav)
+    rows.extend(bottom)
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+class KeyboardPageCache:
+    """
+    Готовые страницы клавиатур по спискам меню: {ключ списка: (версия меню, {страница: клавиатура})}.
+    Ключ включает restaurant_id; при смене версии меню страницы списка собираются заново.
+    Номер страницы перед get нужно привести clamp_page — иначе кэш растёт от чужих callback_data.
+    """
+
+    def __init__(self):
+        self._pages: dict[tuple, tuple[int, dict[int, InlineKeyboardMarkup]]] = {}
+
+    def get(self, key: tuple, version: int, page: int, build: Callable[[], InlineKeyboardMarkup]) -> InlineKeyboardMarkup:
+        cached_version, pages = self._pages.get(key, (None, None))
+        if cached_version != version:
+            pages = {}
+            self._pages[key] = (version, pages)
+        markup = pages.get(page)
+        if markup is None:
+            markup = pages[page] = build()
+        return markup
+
+
+keyboard_pages = KeyboardPageCache()
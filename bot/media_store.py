@@ -0,0 +1,139 @@
+"""
+Хранилище медиа блюд с адресацией по содержимому: файл лежит в
+MEDIA_ROOT/<2 символа хэша>/<sha256><расширение>, одинаковые загрузки хранятся один раз.
+
+Запись потоковая (aiofiles): байты пишутся во временный файл в MEDIA_ROOT/tmp, хэш
+считается на лету, затем файл атомарно переименовывается в итоговый путь (та же ФС).
+Сборщик мусора удаляет файлы, на которые не ссылается ни одно блюдо и которые
+не трогались дольше grace-периода: файлы незавершённого создания блюда
+(FSM, очередь рендера) ещё не попали в базу, grace-период их защищает.
+"""
+import asyncio
+import hashlib
+import os
+import time
+import uuid
+
+import aiofiles
+import aiofiles.os
+
+from config import settings
+from database.dao import DAO
+from database.engine import async_session_maker
+
+CHUNK_SIZE = 64 * 1024
+TMP_DIR = "tmp"
+
+
+async def read_chunks(path: str, chunk_size: int = CHUNK_SIZE):
+    async with aiofiles.open(path, "rb") as f:
+        while chunk := await f.read(chunk_size):
+            yield chunk
+
+
+async def _remove(path: str):
+    try:
+        await aiofiles.os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class MediaStore:
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.tmp_dir = os.path.join(self.root, TMP_DIR)
+
+    def path_for(self, digest: str, suffix: str = "") -> str:
+        return os.path.join(self.root, digest[:2], f"{digest}{suffix}")
+
+    def temp_path(self, suffix: str = "") -> str:
+        """Путь для временного файла внутри хранилища; готовый файл сдаётся через adopt()."""
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        return os.path.join(self.tmp_dir, f"{uuid.uuid4().hex}{suffix}")
+
+    async def save_stream(self, chunks, suffix: str = "") -> str:
+        """Сохраняет поток байтов (async-итератор) и возвращает путь к файлу в хранилище."""
+        tmp = self.temp_path(suffix)
+        digest = hashlib.sha256()
+        try:
+            async with aiofiles.open(tmp, "wb") as f:
+                async for chunk in chunks:
+                    digest.update(chunk)
+                    await f.write(chunk)
+        except BaseException:
+            await _remove(tmp)
+            raise
+        return await self._commit(tmp, digest.hexdigest(), suffix)
+
+    async def adopt(self, tmp: str, suffix: str = "") -> str:
+        """Забирает в хранилище файл, созданный по temp_path() (например, результат рендера)."""
+        digest = hashlib.sha256()
+        async for chunk in read_chunks(tmp):
+            digest.update(chunk)
+        return await self._commit(tmp, digest.hexdigest(), suffix)
+
+    async def save_telegram_file(self, bot, file_id: str, suffix: str = "") -> str:
+        """Скачивает файл из Telegram потоком прямо в хранилище, без промежуточной копии."""
+        file = await bot.get_file(file_id)
+        api = bot.session.api
+        if api.is_local:
+            chunks = read_chunks(api.wrap_local_file.to_local(file.file_path))
+        else:
+            chunks = bot.session.stream_content(
+                url=api.file_url(bot.token, file.file_path),
+                chunk_size=CHUNK_SIZE,
+                raise_for_status=True,
+            )
+        return await self.save_stream(chunks, suffix)
+
+    async def _commit(self, tmp: str, digest: str, suffix: str) -> str:
+        final = self.path_for(digest, suffix)
+        try:
+            # Такой файл уже есть: продлеваем ему grace-период, копию удаляем
+            os.utime(final)
+            await _remove(tmp)
+        except FileNotFoundError:
+            await aiofiles.os.makedirs(os.path.dirname(final), exist_ok=True)
+            await aiofiles.os.replace(tmp, final)
+        return final
+
+    def collect_garbage(self, referenced: set, grace: float) -> tuple[int, int]:
+        """
+        Удаляет файлы хранилища, которых нет в referenced и которые старше grace секунд.
+        Блокирующая, запускать в потоке. Возвращает (число файлов, освобождено байт).
+        """
+        referenced = {os.path.abspath(path) for path in referenced}
+        deadline = time.time() - grace
+        removed = freed = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                if path in referenced:
+                    continue
+                try:
+                    stat = os.stat(path)
+                    if stat.st_mtime > deadline:
+                        continue
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+                removed += 1
+                freed += stat.st_size
+        return removed, freed
+
+
+async def run_media_gc(store: MediaStore, interval: int, grace: int):
+    """Фоновая задача: раз в interval секунд удаляет медиа, на которые не ссылаются блюда."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with async_session_maker() as session:
+                referenced = await DAO(session).get_media_paths()
+            removed, freed = await asyncio.to_thread(store.collect_garbage, referenced, grace)
+            if removed:
+                print(f"Медиа: удалено файлов {removed}, освобождено {freed // 1024} КБ")
+        except Exception as e:
+            print(f"Ошибка сборки мусора в хранилище медиа: {e!r}")
+
+
+media_store = MediaStore(settings.MEDIA_ROOT)
@@ -1,25 +1,120 @@
+import asyncio
+from contextvars import ContextVar
 from aiogram import BaseMiddleware
-from aiogram.types import Message, CallbackQuery
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.types import Message, CallbackQuery, InlineQuery
 from typing import Callable, Awaitable, Dict, Any
+from config import settings
 from database.dao import DAO
 from database.engine import async_session_maker
+from database.user_cache import user_cache
+
+# (DAO апдейта, задача, которая его обрабатывает) — см. DbSessionMiddleware
+_update_dao: ContextVar[tuple | None] = ContextVar("update_dao", default=None)
+
+
+def updates_concurrency_limit() -> int:
+    """Апдейтов одновременно — не больше соединений в пуле: лишние всё равно ждали бы соединение."""
+    return min(settings.UPDATES_CONCURRENCY, settings.DB_POOL_SIZE + settings.DB_MAX_OVERFLOW)
+
+class DbSessionMiddleware(BaseMiddleware):
+    """
+    Одна сессия БД на апдейт: кладёт в data session, dao и user.
+    DAO работает без автокоммита — изменения хендлера фиксируются одним commit
+    после его завершения, а также перед каждым запросом к Bot API
+    (CommitBeforeApiCallMiddleware); при исключении откатывается незафиксированное.
+    Поиск пользователя идёт через ту же сессию (то же соединение из пула).
+    """
 
-class UserMiddleware(BaseMiddleware):
     async def __call__(
         self,
         handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
         event: Any,
         data: Dict[str, Any]
     ) -> Any:
-        # Для Message и CallbackQuery
-        user_id = None
-        if isinstance(event, Message):
-            user_id = event.from_user.id
-        elif isinstance(event, CallbackQuery):
-            user_id = event.from_user.id
-        if user_id:
-            async with async_session_maker() as session:
-                dao = DAO(session)
-                user = await dao.get_user_by_tg_id(str(user_id))
+        async with async_session_maker() as session:
+            dao = DAO(session, autocommit=False)
+            data["session"] = session
+            data["dao"] = dao
+            # Для Message, CallbackQuery и InlineQuery
+            user_id = None
+            if isinstance(event, (Message, CallbackQuery, InlineQuery)) and event.from_user:
+                user_id = event.from_user.id
+            if user_id:
+                # Версию читаем до запроса в БД: правка между ними её поднимет
+                version = await user_cache.version(user_id)
+                found, user = user_cache.get(user_id, version)
+                if not found:
+                    user = await dao.get_user_by_tg_id(str(user_id))
+                    if user is not None:
+                        # В кэше объект живёт дольше сессии — отвязываем его
+                        session.expunge(user)
+                    user_cache.set(user_id, user, version)
                 data["user"] = user
-        return await handler(event, data)
+            token = _update_dao.set((dao, asyncio.current_task()))
+            try:
+                result = await handler(event, data)
+            finally:
+                _update_dao.reset(token)
+            await dao.commit()
+            return result
+
+
+class CommitBeforeApiCallMiddleware(BaseRequestMiddleware):
+    """
+    Request middleware сессии бота: перед запросом к Bot API фиксирует транзакцию
+    апдейта. Запрос может ждать лимита частоты (до API_MAX_RETRY_AFTER секунд),
+    и всё это время транзакция держала бы соединение из пула и блокировки строк
+    (например, после сохранения file_id). После commit соединение возвращается в пул,
+    следующий запрос хендлера к БД возьмёт его снова; объекты сессии не протухают.
+    """
+
+    async def __call__(self, make_request, bot, method):
+        current = _update_dao.get()
+        if current is not None:
+            dao, task = current
+            session = dao.session
+            # Фоновые задачи хендлера наследуют контекст, но сессия — только задачи апдейта.
+            # SAVEPOINT (импорт меню) не разрываем
+            if task is asyncio.current_task() and session.in_transaction() and not session.in_nested_transaction():
+                await dao.commit()
+        return await make_request(bot, method)
+
+
+class UpdateConcurrencyMiddleware(BaseMiddleware):
+    """
+    Внешний middleware на update: ограничивает число одновременно
+    обрабатываемых апдейтов и позволяет дождаться завершения текущих (drain).
+    """
+
+    def __init__(self, limit: int):
+        self._semaphore = asyncio.Semaphore(limit)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.in_flight = 0
+
+    async def __call__(
+        self,
+        handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+        event: Any,
+        data: Dict[str, Any]
+    ) -> Any:
+        self.in_flight += 1
+        self._idle.clear()
+        try:
+            async with self._semaphore:
+                return await handler(event, data)
+        finally:
+            self.in_flight -= 1
+            if not self.in_flight:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """Ждёт завершения всех апдейтов в обработке. False — не успели за timeout."""
+        # Даём стартовать задачам, которые уже созданы, но ещё не запущены
+        await asyncio.sleep(0)
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
@@ -0,0 +1,94 @@
+"""
+Тест официантов по меню ресторана.
+Банк вопросов строится из снимка меню один раз на версию меню и кэшируется, поэтому
+одновременный старт теста у многих официантов не создаёт запросов к базе.
+Сессия теста — случайная выборка вопросов с перемешанными вариантами; вопросы
+и ответы живут в данных FSM (Redis при FSM_STORAGE=redis), в базу пишется только
+итог — пакетно, через test_results_buffer.
+"""
+import random
+from dataclasses import dataclass
+
+from bot.dish_cards import INGREDIENTS_SPLIT
+from database.menu_cache import MenuSnapshot
+
+# Вариантов ответа на вопрос, включая правильный
+OPTIONS_PER_QUESTION = 4
+
+
+@dataclass(frozen=True)
+class Question:
+    text: str
+    answer: str
+    distractors: tuple[str, ...]
+
+    def to_state(self, rng: random.Random) -> dict:
+        """Вопрос для данных FSM: текст, перемешанные варианты и индекс правильного."""
+        options = [self.answer, *self.distractors]
+        rng.shuffle(options)
+        return {"text": self.text, "options": options, "answer": options.index(self.answer)}
+
+
+def _ingredients(composition: str | None) -> set[str]:
+    return {i.strip().lower() for i in INGREDIENTS_SPLIT.split(composition or "") if i.strip()}
+
+
+def _pick(rng: random.Random, candidates) -> tuple[str, ...]:
+    candidates = sorted(set(candidates))
+    return tuple(rng.sample(candidates, min(OPTIONS_PER_QUESTION - 1, len(candidates))))
+
+
+def build_question_bank(menu: MenuSnapshot) -> list[Question]:
+    """Вопросы по всем блюдам: категория, состав, узнать блюдо по описанию."""
+    rng = random.Random(menu.version)
+    categories = {c.id: c.name for c in menu.categories}
+    dishes = list(menu.dishes.values())
+    ingredients = {d.id: _ingredients(d.composition) for d in dishes}
+    all_ingredients = set().union(*ingredients.values()) if ingredients else set()
+    questions = []
+    for dish in dishes:
+        category = categories.get(dish.category_id)
+        other_categories = [name for cid, name in categories.items() if cid != dish.category_id and name != category]
+        if category and other_categories:
+            questions.append(Question(
+                f"В какой категории меню блюдо «{dish.name}»?", category, _pick(rng, other_categories)
+            ))
+        own = ingredients[dish.id]
+        foreign = all_ingredients - own
+        if own and foreign:
+            questions.append(Question(
+                f"Что входит в состав блюда «{dish.name}»?", rng.choice(sorted(own)), _pick(rng, foreign)
+            ))
+        other_names = [d.name for d in dishes if d.name != dish.name]
+        if dish.description and other_names:
+            questions.append(Question(
+                f"О каком блюде идёт речь?\n\n{dish.description}", dish.name, _pick(rng, other_names)
+            ))
+    return questions
+
+
+class QuizBankCache:
+    """Банки вопросов: {restaurant_id: (версия меню, вопросы)}."""
+
+    def __init__(self):
+        self._banks: dict[int, tuple[int, list[Question]]] = {}
+
+    def get(self, menu: MenuSnapshot) -> list[Question]:
+        version, bank = self._banks.get(menu.restaurant_id, (None, None))
+        if version != menu.version:
+            bank = build_question_bank(menu)
+            self._banks[menu.restaurant_id] = (menu.version, bank)
+        return bank
+
+
+def start_quiz(bank: list[Question], count: int) -> list[dict]:
+    """Вопросы одной попытки теста в виде, пригодном для данных FSM."""
+    rng = random.Random()
+    return [q.to_state(rng) for q in rng.sample(bank, min(count, len(bank)))]
+
+
+def score_percent(answers: list[bool]) -> int:
+    return round(100 * sum(answers) / len(answers)) if answers else 0
+
+
+quiz_banks = QuizBankCache()
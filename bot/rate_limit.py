@@ -0,0 +1,300 @@
+"""
+Ограничение частоты запросов к Bot API.
+
+Telegram пропускает около 30 сообщений в секунду на бота, около одного в секунду
+в личный чат и 20 в минуту в группу; при превышении отвечает 429 с retry_after.
+TokenBucket выдаёт разрешения с заданной частотой, ChatLimiter держит по ведру на чат.
+ApiRateLimiter — request middleware сессии бота: через него идут все запросы хендлеров.
+Фоновые запросы (background_request) в очередь не встают: отправляются, только если
+токены есть сразу, иначе получают ApiRequestSkipped — очередь остаётся хендлерам.
+"""
+import asyncio
+import time
+from collections import deque
+from contextvars import ContextVar
+
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import EditMessageCaption, EditMessageReplyMarkup, EditMessageText
+
+from config import settings
+
+# True внутри фоновой задачи, чьи запросы можно пропустить (заблаговременная загрузка медиа)
+background_request: ContextVar[bool] = ContextVar("background_request", default=False)
+
+
+class ApiRequestSkipped(Exception):
+    """Фоновый запрос не отправлен: для него не нашлось свободного токена."""
+
+
+class TokenBucket:
+    """
+    Ведро токенов: rate токенов в секунду, не больше capacity про запас.
+    acquire ждёт токен; ожидающие обслуживаются по очереди.
+    pause(seconds) останавливает выдачу — так соблюдается retry_after из ответа 429.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        if now <= self._updated:
+            return
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def idle(self) -> bool:
+        """Ведро полное и не на паузе — его можно выбросить без потери ограничения."""
+        now = time.monotonic()
+        self._refill(now)
+        return self._tokens >= self.capacity and now >= self._paused_until and not self._lock.locked()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def try_acquire(self) -> bool:
+        """Токен без ожидания; False — токенов нет, ведро на паузе или его уже ждут."""
+        now = time.monotonic()
+        if now < self._paused_until or self._lock.locked():
+            return False
+        self._refill(now)
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+    def refund(self):
+        """Вернуть токен, который не понадобился."""
+        self._tokens = min(self.capacity, self._tokens + 1)
+
+    def pause(self, seconds: float):
+        now = time.monotonic()
+        self._paused_until = max(self._paused_until, now + seconds)
+        # После паузы — один токен: сразу повторить запрос, но без всплеска накопленных
+        self._refill(now)
+        self._tokens = min(1, self.capacity)
+        self._updated = self._paused_until
+
+
+class ChatLimiter:
+    """
+    Вёдра по чатам. Простаивающие (полные) вёдра выбрасываются, когда чатов
+    становится больше max_chats, — словарь не растёт вместе с числом получателей.
+    """
+
+    def __init__(self, rate: float, capacity: float = None, max_chats: int = 10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_chats = max_chats
+        self._buckets: dict[int, TokenBucket] = {}
+
+    def bucket(self, chat_id: int) -> TokenBucket:
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            if len(self._buckets) >= self.max_chats:
+                self._buckets = {k: b for k, b in self._buckets.items() if not b.idle}
+            bucket = self._buckets[chat_id] = TokenBucket(self.rate, self.capacity)
+        return bucket
+
+    async def acquire(self, chat_id: int):
+        await self.bucket(chat_id).acquire()
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# Правки одного сообщения одним методом: из стоящих в очереди нужна только последняя.
+# EditMessageMedia не склеиваем: по ответу вызывающий сохраняет file_id своего медиа
+MERGEABLE_EDITS = (EditMessageText, EditMessageCaption, EditMessageReplyMarkup)
+
+
+def percentiles(values, *points: float) -> list[float]:
+    values = sorted(values)
+    if not values:
+        return [0.0 for _ in points]
+    return [values[min(len(values) - 1, int(p * len(values)))] for p in points]
+
+
+class ApiStats:
+    """Счётчики запросов с запуска процесса; времена — по последним 1000 запросам."""
+
+    def __init__(self):
+        self.requests = 0
+        self.throttled = 0
+        self.retried = 0
+        self.merged = 0
+        self.skipped = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.waits = deque(maxlen=1000)
+        self.latencies = deque(maxlen=1000)
+
+    def snapshot(self) -> dict:
+        waits = percentiles(self.waits, 0.5, 0.95, 1.0)
+        latencies = percentiles(self.latencies, 0.5, 0.95, 1.0)
+        return {
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "retried": self.retried,
+            "merged": self.merged,
+            "skipped": self.skipped,
+            "queue_depth": self.waiting,
+            "max_queue_depth": self.max_waiting,
+            "wait_ms": dict(zip(("p50", "p95", "max"), (round(t * 1000, 1) for t in waits))),
+            "latency_ms": dict(zip(("p50", "p95", "max"), (round(t * 1000, 1) for t in latencies))),
+        }
+
+
+class ApiRateLimiter(BaseRequestMiddleware):
+    """
+    Запросы с chat_id (отправка и правка сообщений) ждут токен своего чата и общий токен бота;
+    остальные (getUpdates, answerCallbackQuery...) идут без ожидания.
+    На 429 чат ставится на паузу retry_after и запрос повторяется до max_retries раз.
+    Если, пока правка ждёт очереди, пришла более новая правка того же сообщения тем же методом,
+    старая не отправляется: её вызов получает результат новой.
+    Фоновые запросы берут токены только без ожидания, иначе — ApiRequestSkipped.
+    """
+
+    def __init__(
+        self,
+        rate: float = None,
+        chat_rate: float = None,
+        group_rate: float = None,
+        chat_burst: float = None,
+        max_retries: int = None,
+        max_retry_after: float = None,
+    ):
+        self.bucket = TokenBucket(rate or settings.API_RATE)
+        chat_burst = chat_burst or settings.API_CHAT_BURST
+        self.chats = ChatLimiter(chat_rate or settings.API_CHAT_RATE, chat_burst)
+        self.groups = ChatLimiter(group_rate or settings.API_GROUP_RATE, chat_burst)
+        self.max_retries = settings.API_MAX_RETRIES if max_retries is None else max_retries
+        self.max_retry_after = max_retry_after or settings.API_MAX_RETRY_AFTER
+        self.stats = ApiStats()
+        # Правки, ждущие токена: ключ -> [последний вызов (make_request, bot, method), future результата]
+        self._edits: dict[tuple, list] = {}
+        self._edit_tasks = set()
+
+    def chat_bucket(self, chat_id) -> TokenBucket:
+        # Отрицательные id и @username — группы и каналы
+        is_group = not isinstance(chat_id, int) or chat_id < 0
+        return (self.groups if is_group else self.chats).bucket(chat_id)
+
+    async def _acquire(self, bucket: TokenBucket):
+        stats = self.stats
+        stats.waiting += 1
+        stats.max_waiting = max(stats.max_waiting, stats.waiting)
+        started = time.monotonic()
+        try:
+            # Сначала чат: пока чат ждёт, он не занимает общий токен
+            await bucket.acquire()
+            await self.bucket.acquire()
+        finally:
+            stats.waiting -= 1
+        waited = time.monotonic() - started
+        stats.waits.append(waited)
+        if waited > 0.001:
+            stats.throttled += 1
+
+    def _try_acquire(self, bucket: TokenBucket):
+        if not bucket.try_acquire():
+            self.stats.skipped += 1
+            raise ApiRequestSkipped("нет свободного токена чата")
+        if not self.bucket.try_acquire():
+            bucket.refund()
+            self.stats.skipped += 1
+            raise ApiRequestSkipped("нет свободного токена бота")
+
+    async def __call__(self, make_request, bot, method):
+        self.stats.requests += 1
+        chat_id = getattr(method, "chat_id", None)
+        if chat_id is None:
+            return await self._request(make_request, bot, method, None)
+        bucket = self.chat_bucket(chat_id)
+        if background_request.get():
+            self._try_acquire(bucket)
+            return await self._request(make_request, bot, method, bucket)
+        if not (isinstance(method, MERGEABLE_EDITS) and method.message_id):
+            await self._acquire(bucket)
+            return await self._request(make_request, bot, method, bucket)
+
+        key = (type(method), chat_id, method.message_id)
+        pending = self._edits.get(key)
+        if pending is not None:
+            # Правка ещё ждёт токена — отправится новая, старый вызов получит её результат
+            pending[0] = (make_request, bot, method)
+            self.stats.merged += 1
+        else:
+            future = asyncio.get_running_loop().create_future()
+            # Результат может никто не забрать, если все вызывающие отменены
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+            pending = self._edits[key] = [(make_request, bot, method), future]
+            # Отправляет задача лимитера, а не вызывающий: его отмена не отменяет правку
+            # для остальных склеенных с ней вызовов
+            task = asyncio.create_task(self._send_edit(key, pending, bucket))
+            self._edit_tasks.add(task)
+            task.add_done_callback(self._edit_tasks.discard)
+        return await asyncio.shield(pending[1])
+
+    async def _send_edit(self, key, pending: list, bucket: TokenBucket):
+        future = pending[1]
+        try:
+            await self._acquire(bucket)
+            # Токен получен: более новые правки встанут в очередь заново
+            del self._edits[key]
+            make_request, bot, method = pending[0]
+            future.set_result(await self._request(make_request, bot, method, bucket))
+        except Exception as e:
+            future.set_exception(e)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        finally:
+            if self._edits.get(key) is pending:
+                del self._edits[key]
+
+    async def _request(self, make_request, bot, method, bucket: TokenBucket | None):
+        for attempt in range(self.max_retries + 1):
+            started = time.monotonic()
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                self.stats.retried += 1
+                # Фоновый запрос не повторяем: повтор встал бы в очередь перед хендлерами
+                if attempt == self.max_retries or e.retry_after > self.max_retry_after or background_request.get():
+                    raise
+                print(f"Bot API: 429 на {method.__api_method__}, повтор через {e.retry_after} с")
+                if bucket is None:
+                    await asyncio.sleep(e.retry_after)
+                else:
+                    bucket.pause(e.retry_after)
+                    await self._acquire(bucket)
+            finally:
+                self.stats.latencies.append(time.monotonic() - started)
+
+
+# Один на процесс: его подключает сессия бота (bot/bot.py), метрики отдаёт /metrics
+api_limiter = ApiRateLimiter()
+
+
+async def report_api_stats(limiter: ApiRateLimiter, interval: int):
+    """Фоновая задача: печатает метрики запросов к Bot API раз в interval секунд."""
+    while True:
+        await asyncio.sleep(interval)
+        print(f"Bot API: {limiter.stats.snapshot()}")
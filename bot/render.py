@@ -0,0 +1,107 @@
+import asyncio
+import uuid
+
+from database.dao import DAO
+from database.engine import async_session_maker
+from database.menu_cache import menu_cache
+from database.redis_queue import RedisQueue
+from bot.utils import send_dish_card_to_tech_group, get_message_file_id
+
+# Задания на генерацию видео (бот -> воркер) и готовые результаты (воркер -> бот)
+RENDER_JOBS_QUEUE = "render_jobs"
+RENDER_RESULTS_QUEUE = "render_results"
+
+
+async def enqueue_render_job(
+    render_queue: RedisQueue,
+    chat_id: int,
+    restaurant_id: int,
+    image_path: str,
+    audio_path: str,
+    dish: dict,
+) -> str:
+    """
+    Ставит генерацию видео в очередь воркера. dish — поля будущего блюда
+    (name, category_id, composition, description, ingredients_photo_url, ready_photo_url);
+    с ключом id — поля редактируемого блюда. Возвращает id задания.
+    """
+    job = {
+        "job_id": uuid.uuid4().hex,
+        "chat_id": chat_id,
+        "restaurant_id": restaurant_id,
+        "image_path": image_path,
+        "audio_path": audio_path,
+        "dish": dish,
+    }
+    await render_queue.enqueue(job)
+    return job["job_id"]
+
+
+async def handle_render_result(bot, result: dict):
+    """
+    Сохраняет блюдо с готовым видео (новое или, если в задании есть dish["id"], редактируемое),
+    публикует карточку в тех. группу и уведомляет админа.
+    """
+    chat_id = result["chat_id"]
+    if result.get("error"):
+        await bot.send_message(chat_id, "Не удалось сгенерировать видео для блюда. Попробуйте ещё раз.")
+        return
+    dish = result["dish"]
+    video_path = result["video_path"]
+    dish_card = {
+        "name": dish.get("name", "Блюдо"),
+        "description": dish.get("description", ""),
+        "ingredients": dish.get("composition", ""),
+        "photo_path": dish.get("ready_photo_url"),
+        "video_path": video_path
+    }
+    # Сначала публикуем карточку: file_id загруженного видео попадёт
+    # в тот же INSERT, что и само блюдо, без отдельного UPDATE
+    video_file_id = None
+    try:
+        tech_msg = await send_dish_card_to_tech_group(bot, dish_card)
+        video_file_id = get_message_file_id(tech_msg, "video")
+    except Exception as e:
+        print(f"Не удалось отправить карточку блюда в тех. группу: {e!r}")
+    values = dict(
+        name=dish.get("name", "Блюдо"),
+        category_id=dish.get("category_id"),
+        composition=dish.get("composition", ""),
+        description=dish.get("description", ""),
+        video_url=video_path,
+        ingredients_photo_url=dish.get("ingredients_photo_url"),
+        ready_photo_url=dish.get("ready_photo_url"),
+        video_file_id=video_file_id
+    )
+    async with async_session_maker() as session:
+        dao = DAO(session)
+        if dish.get("id"):
+            # Фото заменено новым — прежний file_id к нему не относится
+            found = await dao.update_dish_for_restaurant(
+                result["restaurant_id"], dish["id"], ready_photo_file_id=None, **values
+            )
+        else:
+            await dao.create_dish(restaurant_id=result["restaurant_id"], **values)
+            found = True
+    if not found:
+        await bot.send_message(chat_id, f"Блюдо '{values['name']}' удалено, пока готовилось видео, — изменения не сохранены.")
+        return
+    menu_cache.invalidate(result["restaurant_id"])
+    action = "обновлена" if dish.get("id") else "успешно создана"
+    await bot.send_message(chat_id, f"Карточка блюда '{values['name']}' {action}, фото и видео сохранены!")
+
+
+async def consume_render_results(bot, redis):
+    """Фоновая задача бота: забирает результаты рендера из очереди и обрабатывает их."""
+    queue = RedisQueue(RENDER_RESULTS_QUEUE, redis)
+    try:
+        while True:
+            result = await queue.dequeue()
+            if result is None:
+                continue
+            try:
+                await handle_render_result(bot, result)
+            except Exception as e:
+                print(f"Ошибка обработки результата рендера {result.get('job_id')}: {e!r}")
+    except asyncio.CancelledError:
+        pass
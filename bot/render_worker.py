@@ -0,0 +1,74 @@
+"""
+Воркер генерации видео. Забирает задания из очереди render_jobs, кодирует видео
+в пуле процессов (по процессу на ядро), сохраняет его в хранилище медиа
+(общий с ботом MEDIA_ROOT) и кладёт результат в render_results.
+Запуск: python -m bot.render_worker
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from config import settings
+from database.redis_queue import RedisQueue, create_redis
+from bot.media_store import media_store
+from bot.render import RENDER_JOBS_QUEUE, RENDER_RESULTS_QUEUE
+from bot.utils import make_video_from_image_and_audio
+
+
+def render_video(image_path: str, audio_path: str, output_path: str) -> str:
+    """Выполняется в дочернем процессе: генерирует mp4 по пути output_path."""
+    try:
+        make_video_from_image_and_audio(image_path, audio_path, output_path)
+    except BaseException:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    return output_path
+
+
+async def process_job(pool, job: dict, results: RedisQueue, slots: asyncio.Semaphore):
+    loop = asyncio.get_running_loop()
+    result = {key: job[key] for key in ("job_id", "chat_id", "restaurant_id", "dish")}
+    try:
+        # Кодируем во временный файл хранилища и забираем его туда по хэшу содержимого
+        output_path = await loop.run_in_executor(
+            pool, render_video, job["image_path"], job["audio_path"], media_store.temp_path(".mp4")
+        )
+        result["video_path"] = await media_store.adopt(output_path, ".mp4")
+    except Exception as e:
+        print(f"Ошибка генерации видео {job['job_id']}: {e!r}")
+        result["error"] = repr(e)
+    finally:
+        slots.release()
+    await results.enqueue(result)
+
+
+async def run_worker(workers: int = None):
+    workers = workers or settings.RENDER_WORKERS or os.cpu_count() or 1
+    redis = create_redis()
+    jobs = RedisQueue(RENDER_JOBS_QUEUE, redis)
+    results = RedisQueue(RENDER_RESULTS_QUEUE, redis)
+    # Берём новое задание только когда есть свободный процесс, чтобы
+    # остальные задания могли забрать другие экземпляры воркера
+    slots = asyncio.Semaphore(workers)
+    tasks = set()
+    print(f"Воркер генерации видео запущен, процессов: {workers}")
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            while True:
+                await slots.acquire()
+                job = await jobs.dequeue()
+                if job is None:
+                    slots.release()
+                    continue
+                task = asyncio.create_task(process_job(pool, job, results, slots))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+    finally:
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await redis.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(run_worker())
@@ -0,0 +1,106 @@
+"""
+Маршрутизация апдейтов без длинных цепочек фильтров.
+
+aiogram проверяет хендлеры роутера по очереди, а синхронные фильтры (F.text..., F.data...)
+выполняет через asyncio.to_thread — каждая проверка стоит перехода в поток
+(см. benchmarks/bench_update_dispatch.py). Поэтому:
+- роутер роли отсекается одним асинхронным RoleFilter по закэшированному user.role
+  (user кладёт DbSessionMiddleware, подключённый как outer middleware);
+- внутри роутера кнопки и callback_data ищутся в словаре: TextRoutes и CallbackRoutes
+  регистрируют по одному хендлеру без фильтров и сами выбирают обработчик.
+"""
+from dataclasses import dataclass
+
+from aiogram import Router
+from aiogram.dispatcher.event.bases import SkipHandler
+from aiogram.dispatcher.event.handler import CallableObject
+from aiogram.filters import Filter
+from aiogram.filters.callback_data import CallbackData
+from aiogram.fsm.state import State
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+
+class RoleFilter(Filter):
+    """Пропускает апдейты пользователей с одной из ролей; None — незарегистрированный."""
+
+    def __init__(self, *roles: str | None):
+        self.roles = frozenset(roles)
+
+    async def __call__(self, event: TelegramObject, user=None) -> bool:
+        return (user.role if user else None) in self.roles
+
+
+@dataclass
+class _Route:
+    states: frozenset[str] | None
+    factory: type[CallbackData] | None
+    handler: CallableObject
+
+
+class _RouteTable:
+    """{ключ: [обработчики]}; если по ключу и состоянию FSM ничего не подошло — апдейт идёт дальше."""
+
+    def __init__(self):
+        self._routes: dict[str, list[_Route]] = {}
+
+    def _add(self, key: str, factory: type[CallbackData] | None, states: tuple[State, ...]):
+        def register(handler):
+            route = _Route(frozenset(s.state for s in states) or None, factory, CallableObject(handler))
+            self._routes.setdefault(key, []).append(route)
+            return handler
+
+        return register
+
+    async def _call(self, key: str, event: TelegramObject, data: dict):
+        for route in self._routes.get(key, ()):
+            if route.states is not None and data.get("raw_state") not in route.states:
+                continue
+            if route.factory is not None:
+                try:
+                    data["callback_data"] = route.factory.unpack(event.data)
+                except (TypeError, ValueError):
+                    # Испорченный или устаревший формат кнопки
+                    continue
+            return await route.handler.call(event, **data)
+        raise SkipHandler
+
+
+class TextRoutes(_RouteTable):
+    """
+    Кнопки reply-клавиатуры роутера: текст (без учёта регистра) -> обработчик.
+    Таблица проверяется раньше хендлеров состояний FSM этого роутера: нажатая кнопка
+    меню работает в любом состоянии.
+    """
+
+    def __init__(self, router: Router):
+        super().__init__()
+        router.message.register(self._dispatch)
+
+    def __call__(self, text: str, *states: State):
+        return self._add(text.lower(), None, states)
+
+    async def _dispatch(self, message: Message, **data):
+        if not message.text:
+            raise SkipHandler
+        return await self._call(message.text.lower(), message, data)
+
+
+class CallbackRoutes(_RouteTable):
+    """
+    callback_query роутера: префикс callback_data -> обработчик.
+    Обработчик получает те же аргументы, что и обычный хендлер aiogram (user, dao, state...),
+    а для фабрик CallbackData ещё и разобранный callback_data.
+    """
+
+    def __init__(self, router: Router):
+        super().__init__()
+        router.callback_query.register(self._dispatch)
+
+    def __call__(self, callback: type[CallbackData] | str, *states: State):
+        """callback — фабрика CallbackData или строка кнопки без полей; states — состояния FSM."""
+        if isinstance(callback, str):
+            return self._add(callback, None, states)
+        return self._add(callback.__prefix__, callback, states)
+
+    async def _dispatch(self, call: CallbackQuery, **data):
+        return await self._call((call.data or "").partition(":")[0], call, data)
@@ -0,0 +1,37 @@
+"""
+FSM-хранилище бота, выбирается через FSM_STORAGE: memory (по умолчанию) или redis.
+
+В режиме redis состояния переживают перезапуск и общие для всех реплик бота.
+Раскладка ключей (DefaultKeyBuilder, prefix=FSM_KEY_PREFIX, with_bot_id=True):
+
+    {prefix}:{bot_id}:{chat_id}:{user_id}:state  — имя состояния, TTL FSM_STATE_TTL
+    {prefix}:{bot_id}:{chat_id}:{user_id}:data   — JSON данных сценария, TTL FSM_DATA_TTL
+    {prefix}:{bot_id}:{chat_id}:{user_id}:lock   — блокировка RedisEventIsolation
+
+TTL выставляется заново при каждой записи, поэтому брошенные сценарии (например,
+недоделанное создание блюда) удаляются из Redis сами. 0 — без TTL.
+Блокировка гарантирует, что апдейты одного пользователя обрабатываются по очереди,
+даже если их получили разные реплики за балансировщиком.
+"""
+import redis.asyncio as aioredis
+from aiogram.fsm.storage.base import BaseEventIsolation, BaseStorage
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.redis import DefaultKeyBuilder, RedisEventIsolation, RedisStorage
+
+from config import settings
+
+
+def create_fsm_storage(redis: aioredis.Redis) -> tuple[BaseStorage, BaseEventIsolation | None]:
+    """Возвращает (storage, events_isolation) для Dispatcher."""
+    if settings.FSM_STORAGE == "memory":
+        return MemoryStorage(), None
+    if settings.FSM_STORAGE != "redis":
+        raise ValueError(f"Неизвестный FSM_STORAGE: {settings.FSM_STORAGE}")
+    key_builder = DefaultKeyBuilder(prefix=settings.FSM_KEY_PREFIX, with_bot_id=True)
+    storage = RedisStorage(
+        redis,
+        key_builder=key_builder,
+        state_ttl=settings.FSM_STATE_TTL or None,
+        data_ttl=settings.FSM_DATA_TTL or None,
+    )
+    return storage, RedisEventIsolation(redis, key_builder=key_builder)
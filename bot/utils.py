@@ -1,7 +1,29 @@
+import asyncio
+import os
+import subprocess
+import imageio_ffmpeg
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types.input_file import FSInputFile, URLInputFile
+from moviepy.video.VideoClip import ImageClip
+from moviepy.audio.io.AudioFileClip import AudioFileClip
+from bot.rate_limit import ApiRequestSkipped, TokenBucket, background_request
+from config import settings
+from database.dao import DAO
+from database.engine import async_session_maker
+from database.menu_io import is_allowed_media_path
+
+# Вид медиа -> (атрибут с путём к файлу, атрибут с file_id в Telegram)
+DISH_MEDIA = {
+    "photo": ("ready_photo_url", "ready_photo_file_id"),
+    "video": ("video_url", "video_file_id"),
+}
+
+
 async def send_dish_card_to_tech_group(bot, dish: dict):
     """
     Отправляет карточку блюда в тех. группу.
     dish: dict с ключами name, description, ingredients, photo_path, video_path (опционально)
+    Возвращает отправленное сообщение (из него можно взять file_id медиа).
     """
     tech_group_id = settings.TECH_GROUP
     if not tech_group_id:
@@ -11,7 +33,6 @@ async def send_dish_card_to_tech_group(bot, dish: dict):
         text += f"<i>{dish['description']}</i>\n\n"
     if dish.get('ingredients'):
         text += f"Ингредиенты: {dish['ingredients']}\n\n"
-    from aiogram.types.input_file import FSInputFile
     if dish.get('video_path'):
         media = FSInputFile(dish['video_path'])
         msg = await bot.send_video(chat_id=int(tech_group_id), video=media, caption=text, parse_mode="HTML")
@@ -20,43 +41,167 @@ async def send_dish_card_to_tech_group(bot, dish: dict):
         msg = await bot.send_photo(chat_id=int(tech_group_id), photo=media, caption=text, parse_mode="HTML")
     else:
         msg = await bot.send_message(chat_id=int(tech_group_id), text=text, parse_mode="HTML")
-    return msg.message_id
-# async def send_dish_card_to_tech_group(bot, dish: dict):
+    return msg
+
+
+def get_message_file_id(msg, kind: str) -> str | None:
+    """Достаёт file_id фото или видео из ответа Telegram."""
+    if not msg or msg is True:
+        return None
+    if kind == "photo" and msg.photo:
+        return msg.photo[-1].file_id
+    if kind == "video" and msg.video:
+        return msg.video.file_id
+    return None
+
+
+async def save_dish_file_id(dish_id: int, kind: str, file_id: str, dao: DAO = None):
+    if dao is None:
+        async with async_session_maker() as session:
+            return await save_dish_file_id(dish_id, kind, file_id, DAO(session))
+    if kind == "photo":
+        await dao.set_dish_photo_file_id(dish_id, file_id)
+    else:
+        await dao.set_dish_video_file_id(dish_id, file_id)
+
+
+def dish_input_file(path: str):
+    # Файлы вне хранилища медиа (например, .env) в Telegram не отдаём
+    if not is_allowed_media_path(path):
+        raise ValueError(f"Путь к медиа вне MEDIA_ROOT: {path}")
+    # Импортированное меню может ссылаться на медиа по URL
+    if path.startswith(("http://", "https://")):
+        return URLInputFile(path)
+    return FSInputFile(path)
+
+
+def dish_media_path(dish, kind: str) -> str | None:
+    """Путь или URL медиа, который можно загрузить; старые пути вне MEDIA_ROOT (например, /tmp) — None."""
+    path = getattr(dish, DISH_MEDIA[kind][0], None)
+    return path if path and is_allowed_media_path(path) else None
+
+
+def has_dish_media(dish, kind: str) -> bool:
+    """Есть ли у блюда медиа: файл (путь или URL) либо готовый file_id (например, из импорта)."""
+    return bool(dish_media_path(dish, kind) or getattr(dish, DISH_MEDIA[kind][1], None))
+
+
+# Ответы Telegram на file_id, который больше не годится
+FILE_ID_ERRORS = (
+    "wrong file identifier", "wrong remote file identifier", "file reference", "file_reference",
+    "wrong padding", "type of file mismatch",
+)
+
+
+def is_file_id_error(error: TelegramBadRequest) -> bool:
+    message = error.message.lower()
+    return any(text in message for text in FILE_ID_ERRORS)
+
+
+async def send_dish_media(send, dish, kind: str, dao: DAO = None):
     """
-    Отправляет карточку блюда в тех. группу.
-    dish: dict с ключами name, description, ingredients, photo_path, video_path (опционально)
+    Отправляет медиа блюда через send(media) — send принимает file_id или InputFile.
+    Если file_id уже известен, файл не загружается повторно. Иначе (или если
+    Telegram отклонил file_id) файл загружается с диска, а полученный file_id
+    сохраняется в базе и в объекте dish (карточке из снимка меню).
+    dao — сессия текущего апдейта, если она есть.
     """
-    tech_group_id = settings.TECH_GROUP
-    if not tech_group_id:
-        raise ValueError("TECH_GROUP не задан в .env")
-    text = f"🍽 <b>{dish['name']}</b>\n\n"
-    if dish.get('description'):
-        text += f"<i>{dish['description']}</i>\n\n"
-    if dish.get('ingredients'):
-        text += f"Ингредиенты: {dish['ingredients']}\n\n"
-    from aiogram.types.input_file import FSInputFile
-    if dish.get('video_path'):
-        media = FSInputFile(dish['video_path'])
-        msg = await bot.send_video(chat_id=int(tech_group_id), video=media, caption=text, parse_mode="HTML")
-    elif dish.get('photo_path'):
-        media = FSInputFile(dish['photo_path'])
-        msg = await bot.send_photo(chat_id=int(tech_group_id), photo=media, caption=text, parse_mode="HTML")
-    else:
-        msg = await bot.send_message(chat_id=int(tech_group_id), text=text, parse_mode="HTML")
-    return msg.message_id
-import os
-from moviepy.video.VideoClip import ImageClip
-from moviepy.audio.io.AudioFileClip import AudioFileClip
-from config import settings
+    file_id_attr = DISH_MEDIA[kind][1]
+    file_id = getattr(dish, file_id_attr, None)
+    path = dish_media_path(dish, kind)
+    if file_id:
+        try:
+            return await send(file_id)
+        except TelegramBadRequest as e:
+            # Заново загружаем файл, только если Telegram не принял сам file_id
+            # и есть что загружать; остальные ошибки (сообщение не найдено,
+            # длинная подпись, не изменилось) к file_id не относятся
+            if not is_file_id_error(e) or not path:
+                raise
+    msg = await send(dish_input_file(path))
+    new_file_id = get_message_file_id(msg, kind)
+    if new_file_id:
+        await save_dish_file_id(dish.id, kind, new_file_id, dao)
+        setattr(dish, file_id_attr, new_file_id)
+    return msg
+
+
+# (dish_id, вид медиа), которые сейчас загружаются заранее, и ссылки на их задачи
+_prefetching = set()
+_prefetch_tasks = set()
+# Своё ведро, реже лимита группы: заблаговременные загрузки не съедают квоту Bot API
+_prefetch_bucket = TokenBucket(settings.PREFETCH_RATE, 1)
 
-def make_video_from_image_and_audio(image_path: str, audio_path: str, output_path: str, duration: int = None):
+
+async def prefetch_dish_media(bot, dish, kind: str = "photo"):
+    """
+    Заранее загружает медиа блюда в служебный чат MEDIA_CACHE_CHAT, чтобы получить file_id:
+    следующий показ карточки (листание) отправит готовый file_id, без загрузки файла.
+    Загрузка необязательна: нет свободного токена (своего или чата) — её просто нет.
+    """
+    file_id_attr = DISH_MEDIA[kind][1]
+    path = dish_media_path(dish, kind)
+    if not path or getattr(dish, file_id_attr) or not settings.MEDIA_CACHE_CHAT:
+        return
+    if not _prefetch_bucket.try_acquire():
+        return
+    send = bot.send_photo if kind == "photo" else bot.send_video
+    # Фоновый запрос: в очередь перед запросами хендлеров не встаёт
+    token = background_request.set(True)
+    try:
+        msg = await send(int(settings.MEDIA_CACHE_CHAT), dish_input_file(path), disable_notification=True)
+    except ApiRequestSkipped:
+        _prefetch_bucket.refund()
+        return
+    finally:
+        background_request.reset(token)
+    file_id = get_message_file_id(msg, kind)
+    if file_id:
+        await save_dish_file_id(dish.id, kind, file_id)
+        setattr(dish, file_id_attr, file_id)
+
+
+async def _prefetch(bot, dish, kind: str, key):
+    try:
+        await prefetch_dish_media(bot, dish, kind)
+    except Exception as e:
+        print(f"Не удалось заранее загрузить медиа блюда {dish.id}: {e!r}")
+    finally:
+        _prefetching.discard(key)
+
+
+def schedule_dish_prefetch(bot, dishes, kind: str = "photo"):
+    """
+    Запускает prefetch_dish_media в фоне; одно и то же медиа не грузится дважды одновременно,
+    а всего одновременно грузится не больше PREFETCH_CONCURRENCY медиа — лишние пропускаются.
+    """
+    if not settings.MEDIA_CACHE_CHAT:
+        return
+    file_id_attr = DISH_MEDIA[kind][1]
+    for dish in dishes:
+        if len(_prefetching) >= settings.PREFETCH_CONCURRENCY:
+            return
+        key = (dish.id, kind)
+        if key in _prefetching or getattr(dish, file_id_attr) or not dish_media_path(dish, kind):
+            continue
+        _prefetching.add(key)
+        task = asyncio.create_task(_prefetch(bot, dish, kind, key))
+        _prefetch_tasks.add(task)
+        task.add_done_callback(_prefetch_tasks.discard)
+
+
+def make_video_from_image_and_audio(image_path: str, audio_path: str, output_path: str, duration: int = None, encoder: str = None):
     """
     Создаёт видео из картинки и аудио.
     image_path: путь к картинке
     audio_path: путь к аудиофайлу
     output_path: путь для сохранения mp4
     duration: длительность видео (если None — берётся длительность аудио)
+    encoder: "still" (ffmpeg) или "moviepy"; если None — settings.VIDEO_ENCODER
     """
+    encoder = encoder or settings.VIDEO_ENCODER
+    if encoder == "still":
+        return make_still_video_ffmpeg(image_path, audio_path, output_path, duration)
     audio = AudioFileClip(audio_path)
     img = ImageClip(image_path)
     if duration is None:
@@ -67,6 +212,32 @@ def make_video_from_image_and_audio(image_path: str, audio_path: str, output_pat
     img.write_videofile(output_path, codec="libx264", audio_codec="aac")
     return output_path
 
+
+def make_still_video_ffmpeg(image_path: str, audio_path: str, output_path: str, duration: float = None):
+    """
+    Быстрый путь для статичной картинки: ffmpeg напрямую, без покадровой работы в Python.
+    Картинка кодируется один раз и зацикливается с частотой 1 кадр/с (-tune stillimage),
+    AAC копируется как есть, остальное аудио кодируется в AAC один раз.
+    Результат — такой же mp4 (H.264 + AAC), что и у moviepy.
+    """
+    audio_codec = ["-c:a", "copy"] if os.path.splitext(audio_path)[1].lower() in (".aac", ".m4a") else ["-c:a", "aac", "-b:a", "128k"]
+    length = ["-t", str(duration)] if duration else ["-shortest"]
+    cmd = [
+        imageio_ffmpeg.get_ffmpeg_exe(), "-y", "-loglevel", "error",
+        "-loop", "1", "-framerate", "1", "-i", image_path,
+        "-i", audio_path,
+        "-map", "0:v:0", "-map", "1:a:0",
+        # libx264 с yuv420p требует чётные размеры кадра
+        "-vf", "scale=trunc(iw/2)*2:trunc(ih/2)*2,setsar=1,format=yuv420p",
+        "-c:v", "libx264", "-preset", "veryfast", "-tune", "stillimage", "-r", "1",
+        *audio_codec,
+        *length,
+        "-movflags", "+faststart",
+        output_path,
+    ]
+    subprocess.run(cmd, check=True)
+    return output_path
+
 async def send_video_to_tech_group(bot, video_path: str):
     """
     Отправляет видео в техническую группу.
@@ -76,7 +247,6 @@ async def send_video_to_tech_group(bot, video_path: str):
     tech_group_id = settings.TECH_GROUP
     if not tech_group_id:
         raise ValueError("TECH_GROUP не задан в .env")
-    from aiogram.types.input_file import FSInputFile
     input_file = FSInputFile(video_path)
     msg = await bot.send_video(chat_id=int(tech_group_id), video=input_file)
     return msg.video.file_id
@@ -0,0 +1,71 @@
+"""
+Режим webhook (BOT_MODE=webhook): апдейты принимает aiohttp-приложение.
+Можно запускать несколько реплик за балансировщиком (вместе с FSM_STORAGE=redis).
+"""
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from bot.midlewares import UpdateConcurrencyMiddleware, updates_concurrency_limit
+from bot.rate_limit import api_limiter
+from config import settings
+from database.engine import pool_stats
+from database.user_cache import user_cache
+
+
+def create_app(dp: Dispatcher, bot: Bot) -> web.Application:
+    limiter = UpdateConcurrencyMiddleware(updates_concurrency_limit())
+    dp.update.outer_middleware(limiter)
+
+    async def set_webhook():
+        # Реплики вызывают это одновременно, операция идемпотентна.
+        # Вебхук при остановке не удаляем: его продолжают обслуживать другие реплики.
+        await bot.set_webhook(
+            url=f"{settings.WEBHOOK_BASE_URL.rstrip('/')}{settings.WEBHOOK_PATH}",
+            secret_token=settings.WEBHOOK_SECRET,
+            max_connections=settings.WEBHOOK_MAX_CONNECTIONS,
+            allowed_updates=dp.resolve_used_update_types(),
+            drop_pending_updates=settings.DROP_PENDING_UPDATES,
+        )
+
+    async def drain(app: web.Application):
+        # aiohttp уже перестал принимать запросы — дожидаемся апдейтов в обработке
+        if not await limiter.drain(settings.SHUTDOWN_TIMEOUT):
+            print(f"Остановка: не дождались {limiter.in_flight} апдейтов за {settings.SHUTDOWN_TIMEOUT} с")
+
+    async def healthcheck(request: web.Request):
+        return web.json_response({"status": "ok", "in_flight": limiter.in_flight})
+
+    async def metrics(request: web.Request):
+        return web.json_response({
+            "db_pool": pool_stats(),
+            "user_cache": user_cache.stats(),
+            "bot_api": api_limiter.stats.snapshot(),
+        })
+
+    dp.startup.register(set_webhook)
+    app = web.Application()
+    # drain регистрируется первым, до закрытия сессии бота и shutdown диспетчера
+    app.on_shutdown.append(drain)
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        handle_in_background=True,
+        secret_token=settings.WEBHOOK_SECRET,
+    ).register(app, path=settings.WEBHOOK_PATH)
+    app.router.add_get("/healthz", healthcheck)
+    app.router.add_get("/metrics", metrics)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+def run_webhook(dp: Dispatcher, bot: Bot):
+    if not settings.WEBHOOK_BASE_URL:
+        raise ValueError("WEBHOOK_BASE_URL не задан в .env")
+    print("Бот запущен (webhook)!")
+    web.run_app(
+        create_app(dp, bot),
+        host=settings.WEBHOOK_HOST,
+        port=settings.WEBHOOK_PORT,
+        shutdown_timeout=settings.SHUTDOWN_TIMEOUT,
+    )
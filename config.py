@@ -10,4 +10,108 @@ class Settings(BaseSettings):
     DB_URL: Optional[str] = os.getenv('DATABASE_URL') or os.getenv('DOCKER_DB_URL')
     TECH_GROUP: Optional[str] = os.getenv('TECH_GROUP')
 
+    # Режим получения апдейтов: polling или webhook (см. bot/webhook.py)
+    BOT_MODE: str = os.getenv('BOT_MODE', 'polling')
+    WEBHOOK_BASE_URL: Optional[str] = os.getenv('WEBHOOK_BASE_URL')
+    WEBHOOK_PATH: str = os.getenv('WEBHOOK_PATH', '/webhook')
+    WEBHOOK_SECRET: Optional[str] = os.getenv('WEBHOOK_SECRET')
+    WEBHOOK_HOST: str = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+    WEBHOOK_PORT: int = int(os.getenv('WEBHOOK_PORT', 8080))
+    # Сколько соединений Telegram держит к вебхуку одновременно
+    WEBHOOK_MAX_CONNECTIONS: int = int(os.getenv('WEBHOOK_MAX_CONNECTIONS', 40))
+    # Сколько апдейтов одновременно обрабатывает один процесс бота
+    # (не больше DB_POOL_SIZE + DB_MAX_OVERFLOW — у каждого апдейта своя сессия БД)
+    UPDATES_CONCURRENCY: int = int(os.getenv('UPDATES_CONCURRENCY', 100))
+    # Сколько секунд ждать апдейты в обработке при остановке
+    SHUTDOWN_TIMEOUT: int = int(os.getenv('SHUTDOWN_TIMEOUT', 30))
+    DROP_PENDING_UPDATES: bool = os.getenv('DROP_PENDING_UPDATES', 'false').lower() in ('1', 'true', 'yes')
+
+    # Пул соединений Postgres (database/engine.py)
+    DB_POOL_SIZE: int = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW: int = int(os.getenv('DB_MAX_OVERFLOW', 10))
+    DB_POOL_TIMEOUT: float = float(os.getenv('DB_POOL_TIMEOUT', 30))
+    # Пересоздавать соединения старше N секунд (-1 — никогда)
+    DB_POOL_RECYCLE: int = int(os.getenv('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING: bool = os.getenv('DB_POOL_PRE_PING', 'true').lower() in ('1', 'true', 'yes')
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = int(os.getenv('DB_PREPARED_STATEMENT_CACHE_SIZE', 100))
+    # statement_timeout на стороне Postgres, мс (0 — без ограничения)
+    DB_STATEMENT_TIMEOUT_MS: int = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 10000))
+    # Как часто печатать метрики пула, секунд (0 — не печатать)
+    DB_POOL_METRICS_INTERVAL: int = int(os.getenv('DB_POOL_METRICS_INTERVAL', 0))
+
+    # Redis: один пул соединений на процесс
+    REDIS_URL: str = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+    REDIS_MAX_CONNECTIONS: int = int(os.getenv('REDIS_MAX_CONNECTIONS', 20))
+    REDIS_POOL_TIMEOUT: int = int(os.getenv('REDIS_POOL_TIMEOUT', 10))
+
+    # FSM: memory или redis (см. bot/storage.py), TTL в секундах, 0 — без TTL
+    FSM_STORAGE: str = os.getenv('FSM_STORAGE', 'memory')
+    FSM_KEY_PREFIX: str = os.getenv('FSM_KEY_PREFIX', 'fsm')
+    FSM_STATE_TTL: int = int(os.getenv('FSM_STATE_TTL', 7 * 24 * 3600))
+    FSM_DATA_TTL: int = int(os.getenv('FSM_DATA_TTL', 7 * 24 * 3600))
+
+    # Кэш пользователей для DbSessionMiddleware
+    USER_CACHE_TTL: int = int(os.getenv('USER_CACHE_TTL', 60))
+    USER_CACHE_MAXSIZE: int = int(os.getenv('USER_CACHE_MAXSIZE', 10000))
+
+    # Хранилище медиа блюд (см. bot/media_store.py): корень, период сборки мусора
+    # и grace-период для файлов, ещё не привязанных к блюду (секунды; 0 — без сборки)
+    MEDIA_ROOT: str = os.getenv('MEDIA_ROOT', 'media')
+    MEDIA_GC_INTERVAL: int = int(os.getenv('MEDIA_GC_INTERVAL', 3600))
+    MEDIA_GC_GRACE: int = int(os.getenv('MEDIA_GC_GRACE', 24 * 3600))
+
+    # Импорт меню из файла: строк на один пакетный INSERT и предельный размер файла
+    # (Bot API отдаёт боту файлы до 20 МБ)
+    MENU_IMPORT_BATCH_SIZE: int = int(os.getenv('MENU_IMPORT_BATCH_SIZE', 500))
+    MENU_IMPORT_MAX_BYTES: int = int(os.getenv('MENU_IMPORT_MAX_BYTES', 20 * 1024 * 1024))
+
+    # Тест официантов: вопросов в попытке; результаты пишутся пакетами
+    # раз в TEST_RESULTS_FLUSH_INTERVAL секунд или по набору TEST_RESULTS_BATCH_SIZE
+    QUIZ_QUESTIONS: int = int(os.getenv('QUIZ_QUESTIONS', 10))
+    TEST_RESULTS_FLUSH_INTERVAL: int = int(os.getenv('TEST_RESULTS_FLUSH_INTERVAL', 2))
+    TEST_RESULTS_BATCH_SIZE: int = int(os.getenv('TEST_RESULTS_BATCH_SIZE', 200))
+    # Минимальный балл (%), с которым тест считается сданным — для статистики админа
+    TEST_PASS_SCORE: int = int(os.getenv('TEST_PASS_SCORE', 80))
+
+    # Строк со списком (категории, блюда) на одной странице inline-клавиатуры
+    KEYBOARD_PAGE_SIZE: int = int(os.getenv('KEYBOARD_PAGE_SIZE', 10))
+
+    # Поиск блюд (bot/dish_search.py): результатов на текстовый запрос и сколько
+    # секунд Telegram кэширует ответ на inline-запрос
+    SEARCH_RESULTS: int = int(os.getenv('SEARCH_RESULTS', 10))
+    INLINE_SEARCH_CACHE_TIME: int = int(os.getenv('INLINE_SEARCH_CACHE_TIME', 30))
+
+    # Лимиты запросов к Bot API (bot/rate_limit.py): сообщений в секунду на бота,
+    # в личный чат и в группу (Telegram: ~30/с, ~1/с, 20/мин), запас токенов на чат,
+    # повторов на 429 и самый долгий retry_after, который ещё стоит ждать (секунд)
+    API_RATE: float = float(os.getenv('API_RATE', 30))
+    API_CHAT_RATE: float = float(os.getenv('API_CHAT_RATE', 1))
+    API_GROUP_RATE: float = float(os.getenv('API_GROUP_RATE', 20 / 60))
+    API_CHAT_BURST: float = float(os.getenv('API_CHAT_BURST', 3))
+    API_MAX_RETRIES: int = int(os.getenv('API_MAX_RETRIES', 3))
+    API_MAX_RETRY_AFTER: float = float(os.getenv('API_MAX_RETRY_AFTER', 60))
+    # Как часто печатать метрики запросов к Bot API, секунд (0 — не печатать)
+    API_METRICS_INTERVAL: int = int(os.getenv('API_METRICS_INTERVAL', 0))
+    # Заблаговременная загрузка фото соседних блюд ради file_id (bot/utils.py): служебный чат,
+    # куда бот загружает фото (не TECH_GROUP — его читают люди; не задан — загрузки нет),
+    # загрузок в секунду (ниже API_GROUP_RATE) и одновременных загрузок
+    MEDIA_CACHE_CHAT: Optional[str] = os.getenv('MEDIA_CACHE_CHAT')
+    PREFETCH_RATE: float = float(os.getenv('PREFETCH_RATE', 10 / 60))
+    PREFETCH_CONCURRENCY: int = int(os.getenv('PREFETCH_CONCURRENCY', 2))
+
+    # Рассылки (bot/broadcast.py): сообщений в секунду (ниже API_RATE, чтобы
+    # оставить место ответам хендлеров), одновременных отправок, попыток на получателя
+    # и сколько секунд хранить прогресс рассылки в Redis
+    BROADCAST_RATE: float = float(os.getenv('BROADCAST_RATE', 25))
+    BROADCAST_CONCURRENCY: int = int(os.getenv('BROADCAST_CONCURRENCY', 10))
+    BROADCAST_MAX_ATTEMPTS: int = int(os.getenv('BROADCAST_MAX_ATTEMPTS', 3))
+    BROADCAST_TTL: int = int(os.getenv('BROADCAST_TTL', 7 * 24 * 3600))
+    # Отправляет одна реплика: она держит блокировку в Redis с этим TTL (секунд)
+    BROADCAST_LOCK_TTL: int = int(os.getenv('BROADCAST_LOCK_TTL', 30))
+
+    # Генерация видео: число процессов воркера (0 — по числу ядер)
+    RENDER_WORKERS: int = int(os.getenv('RENDER_WORKERS', 0))
+    # Кодировщик видео: still (ffmpeg для статичной картинки) или moviepy
+    VIDEO_ENCODER: str = os.getenv('VIDEO_ENCODER', 'still')
+
 settings = Settings()
@@ -1,8 +1,14 @@
-from sqlalchemy import select, update, delete
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+
+from sqlalchemy import select, insert, update, delete, union, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import NoResultFound
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .models import User, Restaurant, Category, Dish, TestResult
+from config import settings
+from .models import User, Restaurant, Category, Dish, TestResult, UserTestStats, RestaurantTestStats
+from .user_cache import user_cache
 
 class DAO:
     async def get_user_by_id(self, user_id):
@@ -12,10 +18,77 @@ class DAO:
     async def delete_user(self, user_id):
         user = await self.get_user_by_id(user_id)
         if user:
+            tg_id = user.tg_id
             await self.session.delete(user)
-            await self.session.commit()
-    def __init__(self, session: AsyncSession):
+            await self._save()
+            self.on_commit(lambda: user_cache.invalidate(tg_id))
+
+    def __init__(self, session: AsyncSession, autocommit: bool = True):
+        """
+        autocommit=True — каждый метод записи сам фиксирует транзакцию.
+        autocommit=False — методы только отправляют изменения (flush),
+        а фиксирует их один вызов commit() в конце (см. DbSessionMiddleware).
+        """
         self.session = session
+        self.autocommit = autocommit
+        # Есть изменения, отправленные в БД, но ещё не зафиксированные
+        self.pending_writes = False
+        self._after_commit = []
+
+    async def commit(self):
+        await self.session.commit()
+        self.pending_writes = False
+        callbacks, self._after_commit = self._after_commit, []
+        for callback in callbacks:
+            callback()
+
+    def on_commit(self, callback):
+        """Выполняет callback после фиксации текущих изменений (например, сброс кэшей)."""
+        if self.autocommit:
+            callback()
+        else:
+            self._after_commit.append(callback)
+
+    async def _save(self):
+        if self.autocommit:
+            await self.commit()
+        else:
+            await self.session.flush()
+            self.pending_writes = True
+
+    @asynccontextmanager
+    async def unit_of_work(self):
+        """
+        Несколько операций записи одной транзакцией: внутри блока методы только
+        отправляют изменения, commit — один раз на выходе, при исключении — rollback.
+        Если DAO уже без автокоммита (сессия апдейта), блок ничего не меняет.
+        """
+        if not self.autocommit:
+            yield self
+            return
+        self.autocommit = False
+        try:
+            yield self
+        except BaseException:
+            self.autocommit = True
+            self._after_commit.clear()
+            self.pending_writes = False
+            await self.session.rollback()
+            raise
+        self.autocommit = True
+        await self.commit()
+
+    async def _insert(self, model, **values):
+        # INSERT ... RETURNING: строка со всеми колонками за один запрос, без refresh
+        obj = await self.session.scalar(insert(model).values(**values).returning(model))
+        await self._save()
+        return obj
+
+    async def _update(self, model, object_id, **values) -> bool:
+        # Точечный UPDATE ... WHERE id без предварительной загрузки строки
+        result = await self.session.execute(update(model).where(model.id == object_id).values(**values))
+        await self._save()
+        return result.rowcount > 0
 
     # User methods
     async def create_user(self, first_name, last_name, tg_username, tg_id, role, restaurant_id=None):
@@ -33,7 +106,8 @@ class DAO:
             _type_: 
         """        
 
-        user = User(
+        user = await self._insert(
+            User,
             first_name=first_name,
             last_name=last_name,
             tg_username=tg_username,
@@ -41,9 +115,7 @@ class DAO:
             role=role,
             restaurant_id=restaurant_id
         )
-        self.session.add(user)
-        await self.session.commit()
-        await self.session.refresh(user)
+        self.on_commit(lambda: user_cache.invalidate(tg_id))
         return user
 
     async def get_user_by_tg_id(self, tg_id):
@@ -68,6 +140,34 @@ class DAO:
         result = await self.session.execute(select(User).where(User.role == role))
         return result.scalars().all()
 
+    async def get_staff(self, restaurant_id, role, after_id=None, limit=None):
+        """
+        Сотрудники ресторана с заданной ролью по возрастанию id.
+        Keyset-пагинация: after_id — id последнего сотрудника предыдущей страницы.
+        """
+        query = select(User).where(User.restaurant_id == restaurant_id, User.role == role)
+        if after_id is not None:
+            query = query.where(User.id > after_id)
+        query = query.order_by(User.id)
+        if limit:
+            query = query.limit(limit)
+        result = await self.session.execute(query)
+        return result.scalars().all()
+
+    async def get_broadcast_recipients(self, restaurant_id, role="waiter") -> list[int]:
+        """chat_id всех сотрудников ресторана с ролью — одним запросом по индексу (restaurant_id, role)."""
+        result = await self.session.execute(
+            select(User.tg_id).where(User.restaurant_id == restaurant_id, User.role == role, User.tg_id.is_not(None))
+        )
+        return [int(tg_id) for tg_id, in result]
+
+    async def get_staff_member(self, restaurant_id, user_id, role=None):
+        query = select(User).where(User.id == user_id, User.restaurant_id == restaurant_id)
+        if role is not None:
+            query = query.where(User.role == role)
+        result = await self.session.execute(query)
+        return result.scalar_one_or_none()
+
     # Restaurant methods
     async def create_restaurant(self, name):
         f"""
@@ -78,11 +178,7 @@ class DAO:
         Returns:
             _type_: _description_
         """        
-        restaurant = Restaurant(name=name)
-        self.session.add(restaurant)
-        await self.session.commit()
-        await self.session.refresh(restaurant)
-        return restaurant
+        return await self._insert(Restaurant, name=name)
 
     async def get_restaurant(self, restaurant_id):
         f"""
@@ -110,6 +206,17 @@ class DAO:
     async def get_category_by_id(self, category_id):
         result = await self.session.execute(select(Category).where(Category.id == category_id))
         return result.scalar_one_or_none()
+
+    async def get_category_for_restaurant(self, restaurant_id, category_id):
+        result = await self.session.execute(
+            select(Category).where(Category.id == category_id, Category.restaurant_id == restaurant_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def delete_category(self, category):
+        await self.session.delete(category)
+        await self._save()
+
     async def create_category(self, name, restaurant_id):
         f"""
 
@@ -120,11 +227,7 @@ class DAO:
         Returns:
             _type_: _description_
         """        
-        category = Category(name=name, restaurant_id=restaurant_id)
-        self.session.add(category)
-        await self.session.commit()
-        await self.session.refresh(category)
-        return category
+        return await self._insert(Category, name=name, restaurant_id=restaurant_id)
 
 
     async def get_categories_by_restaurant(self, restaurant_id):
@@ -145,7 +248,26 @@ class DAO:
     async def get_dish_by_id(self, dish_id):
         result = await self.session.execute(select(Dish).where(Dish.id == dish_id))
         return result.scalar_one_or_none()
-    async def create_dish(self, name, category_id, restaurant_id, composition=None, cook_time=None, video_url=None, description=None, ingredients_photo_url=None, ready_photo_url=None):
+
+    async def get_dish_for_restaurant(self, restaurant_id, dish_id):
+        result = await self.session.execute(
+            select(Dish).where(Dish.id == dish_id, Dish.restaurant_id == restaurant_id)
+        )
+        return result.scalar_one_or_none()
+
+    async def update_dish_for_restaurant(self, restaurant_id, dish_id, **values) -> bool:
+        """UPDATE блюда ресторана без загрузки строки; False — блюда нет (удалено или чужое)."""
+        result = await self.session.execute(
+            update(Dish).where(Dish.id == dish_id, Dish.restaurant_id == restaurant_id).values(**values)
+        )
+        await self._save()
+        return result.rowcount > 0
+
+    async def delete_dish(self, dish):
+        await self.session.delete(dish)
+        await self._save()
+
+    async def create_dish(self, name, category_id, restaurant_id, composition=None, cook_time=None, video_url=None, description=None, ingredients_photo_url=None, ready_photo_url=None, video_file_id=None, ready_photo_file_id=None):
         f"""
 
         Args:
@@ -158,12 +280,15 @@ class DAO:
             description (_type_, optional): _description_. Defaults to None.
             ingredients_photo_url (_type_, optional): _description_. Defaults to None.
             ready_photo_url (_type_, optional): _description_. Defaults to None.
+            video_file_id (_type_, optional): file_id видео в Telegram. Defaults to None.
+            ready_photo_file_id (_type_, optional): file_id фото в Telegram. Defaults to None.
 
         Returns:
             _type_: _description_
         """       
 
-        dish = Dish(
+        return await self._insert(
+            Dish,
             name=name,
             category_id=category_id,
             restaurant_id=restaurant_id,
@@ -172,12 +297,10 @@ class DAO:
             video_url=video_url,
             description=description,
             ingredients_photo_url=ingredients_photo_url,
-            ready_photo_url=ready_photo_url
+            ready_photo_url=ready_photo_url,
+            video_file_id=video_file_id,
+            ready_photo_file_id=ready_photo_file_id
         )
-        self.session.add(dish)
-        await self.session.commit()
-        await self.session.refresh(dish)
-        return dish
 
 
     async def get_dishes_by_category(self, category_id):
@@ -207,8 +330,88 @@ class DAO:
         return result.scalars().all()
 
 
+    async def get_media_paths(self) -> set:
+        """Все пути к медиа, на которые ссылаются блюда (для сборки мусора в хранилище)."""
+        query = union(
+            select(Dish.ready_photo_url.label("path")),
+            select(Dish.ingredients_photo_url),
+            select(Dish.video_url),
+        )
+        result = await self.session.execute(query)
+        return {path for path, in result if path}
+
+
+# ------------------- Bulk-методы импорта/экспорта меню ---------------------------------------------------------------->
+    async def get_category_ids_by_name(self, restaurant_id) -> dict:
+        result = await self.session.execute(
+            select(Category.name, Category.id).where(Category.restaurant_id == restaurant_id)
+        )
+        return {name: category_id for name, category_id in result}
+
+    async def create_categories(self, restaurant_id, names) -> dict:
+        """Один INSERT на все категории; возвращает {name: id}."""
+        if not names:
+            return {}
+        result = await self.session.execute(
+            insert(Category)
+            .values([{"name": name, "restaurant_id": restaurant_id} for name in names])
+            .returning(Category.name, Category.id)
+        )
+        await self._save()
+        return {name: category_id for name, category_id in result}
+
+    async def get_dishes_by_key(self, restaurant_id) -> dict:
+        """
+        {(category_id, name): строка с id, ready_photo_url, video_url} — по этому ключу
+        импорт находит уже существующие блюда, а по путям к медиа — сменившиеся файлы.
+        """
+        result = await self.session.execute(
+            select(Dish.category_id, Dish.name, Dish.id, Dish.ready_photo_url, Dish.video_url)
+            .where(Dish.restaurant_id == restaurant_id)
+        )
+        return {(row.category_id, row.name): row for row in result}
+
+    async def insert_dishes(self, rows):
+        """Пакетная вставка: строки уходят многострочными INSERT, без загрузки объектов."""
+        if rows:
+            await self.session.execute(insert(Dish), rows)
+            await self._save()
+
+    async def update_dishes(self, rows):
+        """
+        Пакетное обновление по первичному ключу: каждая строка — dict с "id".
+        Обновляются только поля, которые есть в строке; строки с разным набором полей допустимы.
+        """
+        if rows:
+            await self.session.execute(update(Dish), rows)
+            await self._save()
+
+    async def stream_menu(self, restaurant_id, batch_size=500):
+        """Строки меню (dict) с названием категории, порциями через серверный курсор."""
+        result = await self.session.stream(
+            select(
+                Category.name.label("category"),
+                Dish.name,
+                Dish.composition,
+                Dish.description,
+                Dish.cook_time,
+                Dish.ready_photo_url,
+                Dish.ingredients_photo_url,
+                Dish.video_url,
+                Dish.ready_photo_file_id,
+                Dish.video_file_id,
+            )
+            .join(Dish, Dish.category_id == Category.id)
+            .where(Category.restaurant_id == restaurant_id)
+            .order_by(Category.id, Dish.id)
+            .execution_options(yield_per=batch_size)
+        )
+        async for row in result.mappings():
+            yield dict(row)
+
+
 # ------------------- TestResult methods. --------------------------------------------------------------------------------->
-    async def add_test_result(self, user_id, score, passed_at=None):
+    async def add_test_result(self, user_id, score, passed_at=None, restaurant_id=None):
         f"""
 
         Args:
@@ -219,34 +422,107 @@ class DAO:
         Returns:
             _type_: _description_
         """        
-        test_result = TestResult(user_id=user_id, score=score, passed_at=passed_at)
-        self.session.add(test_result)
-        await self.session.commit()
-        await self.session.refresh(test_result)
-        return test_result
-
-    async def get_test_results_by_user(self, user_id):
-        f"""
+        if restaurant_id is None:
+            restaurant_id = await self.session.scalar(select(User.restaurant_id).where(User.id == user_id))
+        await self.add_test_results([
+            {"user_id": user_id, "restaurant_id": restaurant_id, "score": score, "passed_at": passed_at}
+        ])
+
+    async def add_test_results(self, rows):
+        """
+        Пакетная запись результатов: один многострочный INSERT и по одному upsert
+        в агрегаты официантов и ресторанов. rows — словари user_id, restaurant_id, score, passed_at.
+        """
+        if not rows:
+            return
+        now = datetime.now(timezone.utc)
+        rows = [{**r, "passed_at": r.get("passed_at") or now} for r in rows]
+        await self.session.execute(insert(TestResult).values([
+            {"user_id": r["user_id"], "score": r["score"], "passed_at": r["passed_at"]} for r in rows
+        ]))
+        # Сначала сворачиваем пакет в Python: на одного официанта — одна строка upsert
+        per_user, per_restaurant = {}, {}
+        for r in rows:
+            passed = int(r["score"] >= settings.TEST_PASS_SCORE)
+            stats = per_user.setdefault(r["user_id"], {
+                "user_id": r["user_id"], "restaurant_id": r.get("restaurant_id"),
+                "attempts": 0, "total_score": 0, "best_score": 0, "passed_count": 0, "last_passed_at": None,
+            })
+            stats["attempts"] += 1
+            stats["total_score"] += r["score"]
+            stats["best_score"] = max(stats["best_score"], r["score"])
+            stats["passed_count"] += passed
+            stats["last_passed_at"] = max(stats["last_passed_at"] or r["passed_at"], r["passed_at"])
+            if r.get("restaurant_id") is None:
+                continue
+            stats = per_restaurant.setdefault(r["restaurant_id"], {
+                "restaurant_id": r["restaurant_id"],
+                "attempts": 0, "total_score": 0, "passed_count": 0, "last_passed_at": None,
+            })
+            stats["attempts"] += 1
+            stats["total_score"] += r["score"]
+            stats["passed_count"] += passed
+            stats["last_passed_at"] = max(stats["last_passed_at"] or r["passed_at"], r["passed_at"])
+
+        stmt = pg_insert(UserTestStats).values(list(per_user.values()))
+        await self.session.execute(stmt.on_conflict_do_update(
+            index_elements=[UserTestStats.user_id],
+            set_={
+                "restaurant_id": stmt.excluded.restaurant_id,
+                "attempts": UserTestStats.attempts + stmt.excluded.attempts,
+                "total_score": UserTestStats.total_score + stmt.excluded.total_score,
+                "best_score": func.greatest(UserTestStats.best_score, stmt.excluded.best_score),
+                "passed_count": UserTestStats.passed_count + stmt.excluded.passed_count,
+                "last_passed_at": func.greatest(UserTestStats.last_passed_at, stmt.excluded.last_passed_at),
+            },
+        ))
+        if per_restaurant:
+            stmt = pg_insert(RestaurantTestStats).values(list(per_restaurant.values()))
+            await self.session.execute(stmt.on_conflict_do_update(
+                index_elements=[RestaurantTestStats.restaurant_id],
+                set_={
+                    "attempts": RestaurantTestStats.attempts + stmt.excluded.attempts,
+                    "total_score": RestaurantTestStats.total_score + stmt.excluded.total_score,
+                    "passed_count": RestaurantTestStats.passed_count + stmt.excluded.passed_count,
+                    "last_passed_at": func.greatest(RestaurantTestStats.last_passed_at, stmt.excluded.last_passed_at),
+                },
+            ))
+        await self._save()
+
+    async def get_test_results_by_user(self, user_id, since=None, until=None):
+        """Результаты официанта, новые сначала; since/until — границы passed_at (datetime)."""
+        query = select(TestResult).where(TestResult.user_id == user_id)
+        if since is not None:
+            query = query.where(TestResult.passed_at >= since)
+        if until is not None:
+            query = query.where(TestResult.passed_at < until)
+        result = await self.session.execute(query.order_by(TestResult.passed_at.desc()))
+        return result.scalars().all()
 
-        Args:
-            user_id (_type_): _description_
+    async def get_restaurant_test_stats(self, restaurant_id):
+        """Сводка по тестам ресторана — одна строка агрегата или None, если тестов не было."""
+        return await self.session.get(RestaurantTestStats, restaurant_id)
+
+    async def get_top_performers(self, restaurant_id, limit=10):
+        """Лучшие официанты ресторана по среднему баллу: [(User, UserTestStats)]."""
+        result = await self.session.execute(
+            select(User, UserTestStats)
+            .join(UserTestStats, UserTestStats.user_id == User.id)
+            .where(UserTestStats.restaurant_id == restaurant_id)
+            .order_by((UserTestStats.total_score / UserTestStats.attempts).desc(), UserTestStats.best_score.desc())
+            .limit(limit)
+        )
+        return result.all()
 
-        Returns:
-            _type_: _description_
-        """        
-        result = await self.session.execute(select(TestResult).where(TestResult.user_id == user_id))
-        return result.scalars().all()
-    
     async def set_dish_video_file_id(self, dish_id: int, video_file_id: str):
-        dish = await self.get_dish_by_id(dish_id)
-        if dish:
-            dish.video_file_id = video_file_id
-            await self.session.commit()
-            return True
-        return False
+        return await self._update(Dish, dish_id, video_file_id=video_file_id)
 
     async def get_dish_video_file_id(self, dish_id: int) -> str | None:
-        dish = await self.get_dish_by_id(dish_id)
-        if dish:
-            return dish.video_file_id
-        return None
+        return await self.session.scalar(select(Dish.video_file_id).where(Dish.id == dish_id))
+
+    async def set_dish_photo_file_id(self, dish_id: int, photo_file_id: str):
+        return await self._update(Dish, dish_id, ready_photo_file_id=photo_file_id)
+
+    async def get_dish_photo_file_id(self, dish_id: int) -> str | None:
+        return await self.session.scalar(select(Dish.ready_photo_file_id).where(Dish.id == dish_id))
+
@@ -1,11 +1,51 @@
+import asyncio
+
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine, AsyncSession
 
 from config import settings
+from database.pool_metrics import InstrumentedAsyncAdaptedQueuePool, pool_metrics
+
+
+def _connect_args() -> dict:
+    # Параметры драйвера asyncpg; для других драйверов не передаём
+    if not settings.DB_URL or not settings.DB_URL.startswith("postgresql+asyncpg"):
+        return {}
+    server_settings = {}
+    if settings.DB_STATEMENT_TIMEOUT_MS:
+        server_settings["statement_timeout"] = str(settings.DB_STATEMENT_TIMEOUT_MS)
+    return {
+        "prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE,
+        "server_settings": server_settings,
+    }
+
+
+engine = create_async_engine(
+    url=settings.DB_URL,
+    poolclass=InstrumentedAsyncAdaptedQueuePool,
+    pool_size=settings.DB_POOL_SIZE,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT,
+    pool_recycle=settings.DB_POOL_RECYCLE,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args=_connect_args(),
+)
+# Объекты не протухают после commit: иначе чтение атрибутов после записи
+# стоило бы ещё одного SELECT (а в async-коде падало бы на ленивой загрузке)
+async_session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+
+def pool_stats() -> dict:
+    """Текущее состояние пула соединений и накопленные метрики."""
+    return pool_metrics.snapshot(engine.pool)
+
 
-engine = create_async_engine(url=settings.DB_URL)
-async_session_maker = async_sessionmaker(engine, class_=AsyncSession)
+async def report_pool_stats(interval: int):
+    """Фоновая задача: печатает метрики пула раз в interval секунд."""
+    while True:
+        await asyncio.sleep(interval)
+        print(f"DB pool: {pool_stats()}")
 
 
 class Base(AsyncAttrs, DeclarativeBase):
-    __abstract__ = True
\ No newline at end of file
+    __abstract__ = True
@@ -0,0 +1,164 @@
+import asyncio
+from dataclasses import dataclass, field
+
+from redis.exceptions import RedisError
+
+from database.dao import DAO
+from database.engine import async_session_maker
+
+
+@dataclass
+class CategoryCard:
+    id: int
+    name: str
+
+
+@dataclass
+class DishCard:
+    """Поля блюда, нужные для карточки официанта."""
+    id: int
+    name: str
+    category_id: int
+    composition: str | None = None
+    description: str | None = None
+    ingredients_photo_url: str | None = None
+    ready_photo_url: str | None = None
+    video_url: str | None = None
+    ready_photo_file_id: str | None = None
+    video_file_id: str | None = None
+
+
+@dataclass
+class MenuSnapshot:
+    restaurant_id: int
+    version: int
+    categories: list[CategoryCard] = field(default_factory=list)
+    dishes: dict[int, DishCard] = field(default_factory=dict)
+    dishes_by_category: dict[int, list[DishCard]] = field(default_factory=dict)
+    # Позиция блюда в списке своей категории — для листания карточек
+    dish_positions: dict[int, int] = field(default_factory=dict)
+
+    def get_dish(self, dish_id) -> DishCard | None:
+        return self.dishes.get(dish_id)
+
+    def category_dishes(self, category_id) -> list[DishCard]:
+        return self.dishes_by_category.get(category_id, [])
+
+    def neighbour(self, dish_id, step: int) -> DishCard | None:
+        """Соседнее блюдо той же категории (step = -1/+1), по кругу. None — блюда нет в меню."""
+        dish = self.dishes.get(dish_id)
+        if dish is None:
+            return None
+        dishes = self.dishes_by_category[dish.category_id]
+        return dishes[(self.dish_positions[dish_id] + step) % len(dishes)]
+
+
+def menu_version_key(restaurant_id) -> str:
+    return f"menu_version:{restaurant_id}"
+
+
+class MenuCache:
+    """
+    Снимки меню ресторанов (категории -> блюда) в памяти процесса.
+    Снимок строится один раз двумя запросами и живёт до invalidate(),
+    которое вызывают все админские операции записи по меню.
+    С Redis (connect) версия меню общая для всех реплик: invalidate() поднимает её
+    INCR-ом, а get() сверяет снимок с ней, так что правка в одной реплике
+    сбрасывает снимки и кэши по версии во всех.
+    """
+
+    def __init__(self, redis=None):
+        self.redis = redis
+        self._snapshots: dict[int, MenuSnapshot] = {}
+        self._versions: dict[int, int] = {}
+        self._locks: dict[int, asyncio.Lock] = {}
+        # Ещё не дошедшие до Redis INCR версий: get() их дожидается
+        self._bumps: dict[int, set[asyncio.Task]] = {}
+
+    def connect(self, redis):
+        self.redis = redis
+
+    def version(self, restaurant_id) -> int:
+        return self._versions.get(restaurant_id, 0)
+
+    async def _sync_version(self, restaurant_id):
+        """Подтягивает версию из Redis; если её подняла другая реплика, снимок сбрасывается."""
+        bumps = self._bumps.get(restaurant_id)
+        if bumps:
+            await asyncio.gather(*bumps)
+        try:
+            version = int(await self.redis.get(menu_version_key(restaurant_id)) or 0)
+        except RedisError as e:
+            print(f"Не удалось прочитать версию меню {restaurant_id} из Redis: {e!r}")
+            return
+        if version != self.version(restaurant_id):
+            self._versions[restaurant_id] = version
+            self._snapshots.pop(restaurant_id, None)
+
+    async def get(self, restaurant_id, dao: DAO = None) -> MenuSnapshot:
+        """dao — сессия текущего апдейта; без него снимок грузится в отдельной сессии."""
+        if self.redis is not None:
+            await self._sync_version(restaurant_id)
+        snapshot = self._snapshots.get(restaurant_id)
+        if snapshot is not None:
+            return snapshot
+        lock = self._locks.setdefault(restaurant_id, asyncio.Lock())
+        async with lock:
+            snapshot = self._snapshots.get(restaurant_id)
+            if snapshot is not None:
+                return snapshot
+            version = self.version(restaurant_id)
+            snapshot = await self._load(restaurant_id, version, dao)
+            # Если меню поменяли, пока шла загрузка, снимок не сохраняем.
+            # Снимок с незафиксированными изменениями тоже: транзакцию могут откатить
+            if self.version(restaurant_id) == version and not (dao and dao.pending_writes):
+                self._snapshots[restaurant_id] = snapshot
+        return snapshot
+
+    def invalidate(self, restaurant_id):
+        """Поднимает версию меню; снимок пересоберётся при следующем чтении."""
+        self._versions[restaurant_id] = self.version(restaurant_id) + 1
+        self._snapshots.pop(restaurant_id, None)
+        if self.redis is not None:
+            bump = asyncio.create_task(self._bump(restaurant_id))
+            bumps = self._bumps.setdefault(restaurant_id, set())
+            bumps.add(bump)
+            bump.add_done_callback(bumps.discard)
+
+    async def _bump(self, restaurant_id):
+        try:
+            await self.redis.incr(menu_version_key(restaurant_id))
+        except RedisError as e:
+            print(f"Не удалось поднять версию меню {restaurant_id} в Redis: {e!r}")
+
+    async def _load(self, restaurant_id, version, dao: DAO = None) -> MenuSnapshot:
+        if dao is None:
+            async with async_session_maker() as session:
+                return await self._load(restaurant_id, version, DAO(session))
+        categories = await dao.get_categories_by_restaurant(restaurant_id)
+        dishes = await dao.get_dishes_by_restaurant(restaurant_id)
+        snapshot = MenuSnapshot(restaurant_id=restaurant_id, version=version)
+        for c in sorted(categories, key=lambda c: c.id):
+            snapshot.categories.append(CategoryCard(id=c.id, name=c.name))
+            snapshot.dishes_by_category[c.id] = []
+        for d in sorted(dishes, key=lambda d: d.id):
+            card = DishCard(
+                id=d.id,
+                name=d.name,
+                category_id=d.category_id,
+                composition=d.composition,
+                description=d.description,
+                ingredients_photo_url=d.ingredients_photo_url,
+                ready_photo_url=d.ready_photo_url,
+                video_url=d.video_url,
+                ready_photo_file_id=d.ready_photo_file_id,
+                video_file_id=d.video_file_id,
+            )
+            snapshot.dishes[card.id] = card
+            category_dishes = snapshot.dishes_by_category.setdefault(card.category_id, [])
+            snapshot.dish_positions[card.id] = len(category_dishes)
+            category_dishes.append(card)
+        return snapshot
+
+
+menu_cache = MenuCache()
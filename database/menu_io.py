@@ -0,0 +1,243 @@
+"""
+Импорт и экспорт меню ресторана: CSV (разделитель , ; или табуляция), JSON Lines (.jsonl)
+и JSON-массив объектов (.json).
+
+Файл читается потоково, строка за строкой; проверенные строки пишутся пакетами
+(одна вставка категорий и один многострочный INSERT/UPDATE блюд на пакет) в одной
+транзакции — при любой ошибке в файле не сохраняется ничего. Блюдо с тем же названием
+в той же категории обновляется, а не дублируется, поэтому повторный импорт
+выгрузки безопасен. Медиа задаются http(s)-ссылкой или путём внутри MEDIA_ROOT (*_url)
+либо готовым file_id Telegram (*_file_id). Пустые ячейки при обновлении поля не стирают;
+новый путь к медиа без file_id сбрасывает прежний file_id блюда.
+"""
+import csv
+import json
+import os
+
+from config import settings
+from database.dao import DAO
+
+FIELDS = (
+    "category",
+    "name",
+    "composition",
+    "description",
+    "cook_time",
+    "ready_photo_url",
+    "ingredients_photo_url",
+    "video_url",
+    "ready_photo_file_id",
+    "video_file_id",
+)
+REQUIRED_FIELDS = ("category", "name")
+MEDIA_PATH_FIELDS = ("ready_photo_url", "ingredients_photo_url", "video_url")
+# Путь к медиа -> его file_id в Telegram
+MEDIA_FILE_ID_FIELDS = {"ready_photo_url": "ready_photo_file_id", "video_url": "video_file_id"}
+FORMATS = ("csv", "jsonl", "json")
+# Сколько ошибок показывать пользователю; дальше файл не проверяем
+MAX_ERRORS = 20
+
+
+class MenuImportError(Exception):
+    def __init__(self, errors: list[str]):
+        self.errors = errors
+        super().__init__("\n".join(errors))
+
+
+def detect_format(filename: str | None) -> str | None:
+    """Формат по расширению файла: csv, jsonl или json; None — не поддерживается."""
+    if not filename or "." not in filename:
+        return None
+    ext = filename.rsplit(".", 1)[1].lower()
+    if ext == "ndjson":
+        return "jsonl"
+    return ext if ext in FORMATS else None
+
+
+def _iter_csv(f):
+    header = f.readline()
+    # Excel с русской локалью сохраняет CSV через ';'
+    delimiter = max(",;\t", key=header.count)
+    fieldnames = next(csv.reader([header], delimiter=delimiter), [])
+    missing = set(REQUIRED_FIELDS) - {name.strip().lower() for name in fieldnames}
+    if missing:
+        raise MenuImportError([f"CSV: в заголовке нет колонок {', '.join(sorted(missing))}"])
+    reader = csv.DictReader(f, fieldnames=fieldnames, delimiter=delimiter)
+    for row in reader:
+        # Номер строки файла с учётом заголовка
+        yield reader.line_num + 1, row
+
+
+def _iter_jsonl(f):
+    for line_no, line in enumerate(f, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield line_no, json.loads(line)
+        except json.JSONDecodeError as e:
+            raise MenuImportError([f"строка {line_no}: некорректный JSON ({e.msg})"])
+
+
+def _iter_json_array(f, chunk_size=64 * 1024):
+    # Массив разбирается по одному объекту, без загрузки всего документа
+    decoder = json.JSONDecoder()
+    buf = f.read(chunk_size).lstrip()
+    if not buf.startswith("["):
+        raise MenuImportError(["JSON: ожидается массив объектов"])
+    buf = buf[1:]
+    index = 0
+    while True:
+        buf = buf.lstrip()
+        if buf.startswith(","):
+            buf = buf[1:].lstrip()
+        if buf.startswith("]"):
+            return
+        try:
+            obj, end = decoder.raw_decode(buf)
+        except json.JSONDecodeError:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                raise MenuImportError([f"JSON: ошибка разбора после элемента {index}"])
+            buf += chunk
+            continue
+        index += 1
+        yield index, obj
+        buf = buf[end:]
+
+
+def is_allowed_media_path(path: str) -> bool:
+    """
+    http(s)-ссылка или файл внутри MEDIA_ROOT. Путь к медиа бот загружает в Telegram,
+    поэтому любой другой файл сервера (.env, ключи) через меню попасть туда не должен.
+    """
+    if path.startswith(("http://", "https://")):
+        return True
+    root = os.path.realpath(settings.MEDIA_ROOT)
+    return os.path.realpath(path).startswith(root + os.sep)
+
+
+def read_menu_rows(path: str, fmt: str):
+    """Генератор (номер строки/элемента, dict) из файла меню."""
+    readers = {"csv": _iter_csv, "jsonl": _iter_jsonl, "json": _iter_json_array}
+    with open(path, encoding="utf-8-sig", newline="") as f:
+        yield from readers[fmt](f)
+
+
+def validate_row(raw) -> tuple[dict | None, str | None]:
+    """
+    Нормализует строку меню. В результат попадают только заданные в файле поля,
+    и только непустые: пустая ячейка при обновлении не стирает заполненное поле.
+    """
+    if not isinstance(raw, dict):
+        return None, "ожидается объект с полями блюда"
+    row = {}
+    for key, value in raw.items():
+        key = str(key or "").strip().lower()
+        if key not in FIELDS:
+            continue
+        value = str(value).strip() if value is not None else ""
+        if value:
+            row[key] = value
+    for field in REQUIRED_FIELDS:
+        if not row.get(field):
+            return None, f"не заполнено поле {field}"
+    for field in MEDIA_PATH_FIELDS:
+        if row.get(field) and not is_allowed_media_path(row[field]):
+            return None, f"{field}: допускается только http(s)-ссылка или файл из хранилища медиа"
+    if row.get("cook_time") is not None:
+        try:
+            row["cook_time"] = float(row["cook_time"].replace(",", "."))
+        except ValueError:
+            return None, f"cook_time должно быть числом, а не '{row['cook_time']}'"
+    return row, None
+
+
+async def import_menu(dao: DAO, restaurant_id: int, rows, batch_size: int = None) -> dict:
+    """
+    Импортирует строки меню в ресторан. Возвращает статистику
+    {"categories": создано категорий, "created": добавлено блюд, "updated": обновлено блюд}.
+    При ошибках в данных бросает MenuImportError, изменения откатываются.
+    """
+    batch_size = batch_size or settings.MENU_IMPORT_BATCH_SIZE
+    stats = {"categories": 0, "created": 0, "updated": 0}
+    errors = []
+    async with dao.unit_of_work():
+        # SAVEPOINT: откат импорта не задевает остальную транзакцию апдейта
+        async with dao.session.begin_nested():
+            categories = await dao.get_category_ids_by_name(restaurant_id)
+            existing = await dao.get_dishes_by_key(restaurant_id)
+            seen = set()
+            batch = []
+
+            async def flush():
+                missing = sorted({row["category"] for row in batch} - categories.keys())
+                created = await dao.create_categories(restaurant_id, missing)
+                categories.update(created)
+                stats["categories"] += len(created)
+                inserts, updates = [], []
+                for row in batch:
+                    row["category_id"] = categories[row.pop("category")]
+                    dish = existing.get((row["category_id"], row["name"]))
+                    if dish:
+                        # Файл сменился, а file_id в файле не задан — старый file_id показывал бы
+                        # прежнее медиа; без него бот загрузит новый файл (как handle_render_result)
+                        for path_field, file_id_field in MEDIA_FILE_ID_FIELDS.items():
+                            if path_field in row and file_id_field not in row and row[path_field] != getattr(dish, path_field):
+                                row[file_id_field] = None
+                        updates.append({"id": dish.id, **row})
+                    else:
+                        inserts.append({"restaurant_id": restaurant_id, **row})
+                await dao.insert_dishes(inserts)
+                await dao.update_dishes(updates)
+                stats["created"] += len(inserts)
+                stats["updated"] += len(updates)
+                batch.clear()
+
+            for line_no, raw in rows:
+                row, error = validate_row(raw)
+                if row and (row["category"], row["name"]) in seen:
+                    error = f"блюдо '{row['name']}' в категории '{row['category']}' уже встречалось выше"
+                if error:
+                    errors.append(f"строка {line_no}: {error}")
+                    if len(errors) >= MAX_ERRORS:
+                        break
+                    continue
+                seen.add((row["category"], row["name"]))
+                # После первой ошибки файл только проверяем, в базу не пишем
+                if errors:
+                    continue
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    await flush()
+            if not errors and batch:
+                await flush()
+            if not errors and not seen:
+                errors.append("в файле нет ни одного блюда")
+            if errors:
+                raise MenuImportError(errors)
+    return stats
+
+
+async def export_menu(dao: DAO, restaurant_id: int, path: str, fmt: str) -> int:
+    """Потоково выгружает меню ресторана в файл; возвращает число блюд."""
+    count = 0
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=FIELDS)
+            writer.writeheader()
+        elif fmt == "json":
+            f.write("[")
+        async for row in dao.stream_menu(restaurant_id):
+            if fmt == "csv":
+                writer.writerow(row)
+            else:
+                line = json.dumps(row, ensure_ascii=False)
+                if fmt == "json":
+                    line = ("," if count else "") + "\n" + line
+                else:
+                    line += "\n"
+                f.write(line)
+            count += 1
+        if fmt == "json":
+            f.write("\n]\n")
+    return count
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Text, Float
+from sqlalchemy import Column, Integer, String, ForeignKey, Text, Float, Index, DateTime, func
 from sqlalchemy.orm import relationship, declarative_base
 
 from database.engine import Base
@@ -19,18 +19,20 @@ class User(Base):
 	first_name = Column(String, nullable=False)
 	last_name = Column(String, nullable=False)
 	tg_username = Column(String, nullable=True)
-	tg_id = Column(String, nullable=True)
-	role = Column(String, nullable=False)  # waiter, admin, superadmin
+	tg_id = Column(String, nullable=True, unique=True, index=True)
+	role = Column(String, nullable=False, index=True)  # waiter, admin, superadmin
 	restaurant_id = Column(Integer, ForeignKey("restaurants.id"), nullable=True)
 	restaurant = relationship("Restaurant", back_populates="admins")
 	test_results = relationship("TestResult", back_populates="user", cascade="all, delete-orphan")
+	# Списки штата ресторана; покрывает и запросы только по restaurant_id
+	__table_args__ = (Index("ix_users_restaurant_id_role", "restaurant_id", "role"),)
 
 
 class Category(Base):
 	__tablename__ = "categories"
 	id = Column(Integer, primary_key=True)
 	name = Column(String, nullable=False)
-	restaurant_id = Column(Integer, ForeignKey("restaurants.id"), nullable=False)
+	restaurant_id = Column(Integer, ForeignKey("restaurants.id"), nullable=False, index=True)
 	restaurant = relationship("Restaurant", back_populates="categories")
 	dishes = relationship("Dish", back_populates="category", cascade="all, delete-orphan")
 
@@ -39,14 +41,16 @@ class Dish(Base):
 	__tablename__ = "dishes"
 	id = Column(Integer, primary_key=True)
 	name = Column(String, nullable=False)
-	category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
-	restaurant_id = Column(Integer, ForeignKey("restaurants.id"), nullable=False)
+	category_id = Column(Integer, ForeignKey("categories.id"), nullable=False, index=True)
+	restaurant_id = Column(Integer, ForeignKey("restaurants.id"), nullable=False, index=True)
 	composition = Column(Text, nullable=True)
 	description = Column(Text, nullable=True)  # Описание блюда для озвучки
 	cook_time = Column(Float, nullable=True)
 	video_url = Column(String, nullable=True)
 	ingredients_photo_url = Column(String, nullable=True)  # Фото ингредиентов
 	ready_photo_url = Column(String, nullable=True)        # Фото готового блюда
+	video_file_id = Column(String, nullable=True)          # file_id видео в Telegram
+	ready_photo_file_id = Column(String, nullable=True)    # file_id фото готового блюда в Telegram
 	category = relationship("Category", back_populates="dishes")
 	restaurant = relationship("Restaurant", back_populates="dishes")
 
@@ -56,5 +60,30 @@ class TestResult(Base):
 	id = Column(Integer, primary_key=True)
 	user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
 	score = Column(Integer, nullable=False)
-	passed_at = Column(String, nullable=True) 
+	passed_at = Column(DateTime(timezone=True), nullable=True, server_default=func.now())
 	user = relationship("User", back_populates="test_results")
+	# Результаты официанта за период — диапазонный скан по индексу
+	__table_args__ = (Index("ix_test_results_user_id_passed_at", "user_id", "passed_at"),)
+
+
+# Агрегаты по результатам тестов. Обновляются в той же транзакции, что и вставка
+# результата (INSERT ... ON CONFLICT DO UPDATE в DAO.add_test_results), поэтому
+# статистика админа читается одной строкой, без обхода test_results.
+class UserTestStats(Base):
+	__tablename__ = "user_test_stats"
+	user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+	restaurant_id = Column(Integer, ForeignKey("restaurants.id", ondelete="CASCADE"), nullable=True, index=True)
+	attempts = Column(Integer, nullable=False)
+	total_score = Column(Integer, nullable=False)
+	best_score = Column(Integer, nullable=False)
+	passed_count = Column(Integer, nullable=False)  # попыток с баллом не ниже TEST_PASS_SCORE
+	last_passed_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class RestaurantTestStats(Base):
+	__tablename__ = "restaurant_test_stats"
+	restaurant_id = Column(Integer, ForeignKey("restaurants.id", ondelete="CASCADE"), primary_key=True)
+	attempts = Column(Integer, nullable=False)
+	total_score = Column(Integer, nullable=False)
+	passed_count = Column(Integer, nullable=False)
+	last_passed_at = Column(DateTime(timezone=True), nullable=True)
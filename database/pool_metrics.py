@@ -0,0 +1,65 @@
+import bisect
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Границы корзин гистограммы ожидания соединения, в секундах
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class PoolMetrics:
+    """Счётчики пула соединений: выдачи, ожидание свободного соединения, overflow, таймауты."""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.overflow_events = 0
+        self.timeouts = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+        # Последняя корзина — всё, что дольше WAIT_BUCKETS[-1]
+        self.wait_counts = [0] * (len(WAIT_BUCKETS) + 1)
+
+    def observe_wait(self, seconds: float):
+        self.checkouts += 1
+        self.wait_sum += seconds
+        self.wait_max = max(self.wait_max, seconds)
+        self.wait_counts[bisect.bisect_left(WAIT_BUCKETS, seconds)] += 1
+
+    def snapshot(self, pool) -> dict:
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "checkouts": self.checkouts,
+            "overflow_events": self.overflow_events,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": round(self.wait_sum / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+            "wait_histogram_ms": {
+                **{f"le_{b * 1000:g}": c for b, c in zip(WAIT_BUCKETS, self.wait_counts)},
+                "inf": self.wait_counts[-1],
+            },
+        }
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedAsyncAdaptedQueuePool(AsyncAdaptedQueuePool):
+    """Пул asyncpg, который пишет время ожидания соединения и overflow в pool_metrics."""
+
+    def _do_get(self):
+        overflow_before = self._overflow
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        pool_metrics.observe_wait(time.perf_counter() - start)
+        # Открыто соединение сверх pool_size
+        if self._overflow > overflow_before and self._overflow > 0:
+            pool_metrics.overflow_events += 1
+        return connection
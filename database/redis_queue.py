@@ -1,27 +1,56 @@
 import redis.asyncio as aioredis
-import os
 import json
 
-REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+from config import settings
+
+
+def create_redis(url: str = None, max_connections: int = None) -> aioredis.Redis:
+    """
+    Создаёт клиент Redis с собственным пулом соединений на всё время жизни приложения.
+    Пул блокирующий: при исчерпании соединений команда ждёт свободное
+    до REDIS_POOL_TIMEOUT секунд, а не падает с ошибкой.
+    """
+    pool = aioredis.BlockingConnectionPool.from_url(
+        url or settings.REDIS_URL,
+        max_connections=max_connections or settings.REDIS_MAX_CONNECTIONS,
+        timeout=settings.REDIS_POOL_TIMEOUT,
+        decode_responses=True,
+    )
+    return aioredis.Redis.from_pool(pool)
+
 
 class RedisQueue:
-    def __init__(self, queue_name: str):
+    def __init__(self, queue_name: str, redis: aioredis.Redis = None):
         self.queue_name = queue_name
-        self.redis = None
+        self.redis = redis
+        # Внешний (общий) клиент закрывает его владелец, а не очередь
+        self._owns_redis = redis is None
 
     async def connect(self):
-        self.redis = aioredis.from_url(REDIS_URL, decode_responses=True)
+        if self.redis is None:
+            self.redis = create_redis()
+
+    async def enqueue(self, data: dict):
+        await self.redis.rpush(self.queue_name, json.dumps(data))
+
+    async def enqueue_many(self, items, chunk_size: int = 1000):
+        """Кладёт задания пачками: один RPUSH на chunk_size заданий вместо команды на каждое."""
+        items = [json.dumps(data) for data in items]
+        for start in range(0, len(items), chunk_size):
+            await self.redis.rpush(self.queue_name, *items[start:start + chunk_size])
 
-        async def enqueue(self, data: dict):
-            await self.redis.rpush(self.queue_name, json.dumps(data))
+    async def requeue(self, data: dict):
+        """Возвращает задание в голову очереди — его заберут следующим."""
+        await self.redis.lpush(self.queue_name, json.dumps(data))
 
-        async def dequeue(self):
-            task = await self.redis.blpop(self.queue_name, timeout=5)
-            if task:
-                _, data = task
-                return json.loads(data)
-            return None
+    async def dequeue(self, timeout: int = 5):
+        task = await self.redis.blpop(self.queue_name, timeout=timeout)
+        if task:
+            _, data = task
+            return json.loads(data)
+        return None
 
     async def close(self):
-        if self.redis:
-            await self.redis.close()
+        if self.redis and self._owns_redis:
+            await self.redis.aclose()
+            self.redis = None
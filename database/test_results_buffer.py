@@ -0,0 +1,72 @@
+import asyncio
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from config import settings
+from database.dao import DAO
+from database.engine import async_session_maker
+
+
+class TestResultBuffer:
+    """
+    Копит результаты тестов и пишет их в базу пакетами: один многострочный INSERT
+    и одно обновление агрегатов (DAO.add_test_results) на пакет вместо транзакции
+    на каждый результат. Сбрасывается раз в interval секунд, при наборе batch_size
+    строк и при остановке бота.
+    """
+
+    def __init__(self, batch_size: int):
+        self.batch_size = batch_size
+        self._pending: list[dict] = []
+        self._lock = asyncio.Lock()
+        self._full = asyncio.Event()
+
+    def add(self, user_id: int, restaurant_id: int | None, score: int, passed_at: datetime = None):
+        self._pending.append({"user_id": user_id, "restaurant_id": restaurant_id, "score": score, "passed_at": passed_at})
+        if len(self._pending) >= self.batch_size:
+            self._full.set()
+
+    async def flush(self) -> int:
+        async with self._lock:
+            rows, self._pending = self._pending, []
+            if not rows:
+                return 0
+            try:
+                async with async_session_maker() as session:
+                    await DAO(session).add_test_results(rows)
+            except IntegrityError:
+                # Кто-то из пакета удалён, пока результат ждал записи — пишем по одному
+                return await self._write_one_by_one(rows)
+            except Exception:
+                # База недоступна — вернём строки в буфер и попробуем в следующий раз
+                self._pending[:0] = rows
+                raise
+            return len(rows)
+
+    async def _write_one_by_one(self, rows: list[dict]) -> int:
+        written = 0
+        for row in rows:
+            try:
+                async with async_session_maker() as session:
+                    await DAO(session).add_test_results([row])
+                written += 1
+            except IntegrityError:
+                print(f"Результат теста пропущен, пользователя {row['user_id']} уже нет")
+        return written
+
+    async def run(self, interval: float):
+        """Фоновая задача бота: периодически сбрасывает буфер в базу."""
+        while True:
+            try:
+                await asyncio.wait_for(self._full.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self._full.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Ошибка записи результатов тестов: {e!r}")
+
+
+test_results_buffer = TestResultBuffer(settings.TEST_RESULTS_BATCH_SIZE)
@@ -0,0 +1,104 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+from redis.exceptions import RedisError
+
+from config import settings
+
+
+def user_version_key(tg_id) -> str:
+    return f"user_version:{tg_id}"
+
+
+class UserCache:
+    """
+    Ограниченный по размеру TTL-кэш пользователей по tg_id.
+    Кэшируются и отрицательные ответы (пользователь не найден),
+    поэтому все записи в users должны вызывать invalidate().
+    С Redis (connect) у каждого пользователя общая для реплик версия: invalidate()
+    поднимает её INCR-ом, и запись, сохранённая с прежней версией, в любой реплике
+    считается устаревшей — новый официант не остаётся «не найден», удалённый не
+    сохраняет доступ до истечения TTL.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 60, redis=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.redis = redis
+        self._data: OrderedDict = OrderedDict()
+        self._bumps = set()
+        self.hits = 0
+        self.misses = 0
+
+    def connect(self, redis):
+        self.redis = redis
+
+    async def version(self, tg_id) -> int | None:
+        """Общая версия записи пользователя; None — Redis недоступен, кэшу верить нельзя."""
+        if self.redis is None:
+            return 0
+        try:
+            return int(await self.redis.get(user_version_key(tg_id)) or 0)
+        except RedisError as e:
+            print(f"Не удалось прочитать версию пользователя {tg_id} из Redis: {e!r}")
+            return None
+
+    def get(self, tg_id, version: int | None = 0):
+        """
+        Возвращает (found, user). found=False — записи нет, она устарела
+        или сохранена с другой версией (см. version()).
+        """
+        key = str(tg_id)
+        entry = self._data.get(key)
+        if entry is None or version is None:
+            self.misses += 1
+            return False, None
+        expires_at, entry_version, user = entry
+        if expires_at < time.monotonic() or entry_version != version:
+            del self._data[key]
+            self.misses += 1
+            return False, None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return True, user
+
+    def set(self, tg_id, user, version: int | None = 0):
+        """version — прочитанная до загрузки пользователя из БД."""
+        if version is None:
+            return
+        key = str(tg_id)
+        self._data[key] = (time.monotonic() + self.ttl, version, user)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, tg_id):
+        if tg_id is None:
+            return
+        self._data.pop(str(tg_id), None)
+        if self.redis is not None:
+            bump = asyncio.create_task(self._bump(tg_id))
+            self._bumps.add(bump)
+            bump.add_done_callback(self._bumps.discard)
+
+    async def _bump(self, tg_id):
+        try:
+            await self.redis.incr(user_version_key(tg_id))
+        except RedisError as e:
+            print(f"Не удалось поднять версию пользователя {tg_id} в Redis: {e!r}")
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+user_cache = UserCache(maxsize=settings.USER_CACHE_MAXSIZE, ttl=settings.USER_CACHE_TTL)
@@ -0,0 +1,30 @@
+"""Add dish file ids
+
+Revision ID: 4b7e2d9c1a05
+Revises: 1fcfa131ef2b
+Create Date: 2026-10-18 10:12:31.204117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4b7e2d9c1a05'
+down_revision: Union[str, None] = '1fcfa131ef2b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('dishes', sa.Column('video_file_id', sa.String(), nullable=True))
+    op.add_column('dishes', sa.Column('ready_photo_file_id', sa.String(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('dishes', 'ready_photo_file_id')
+    op.drop_column('dishes', 'video_file_id')
@@ -0,0 +1,60 @@
+"""Add lookup indexes
+
+Indexes for the columns filtered on by database/dao.py.
+Built CONCURRENTLY so a live bot is not blocked while they are created.
+ix_users_tg_id is unique: duplicate users.tg_id rows must be removed first.
+A failed CONCURRENTLY build leaves an INVALID index behind; a rerun drops and rebuilds it.
+
+Revision ID: 9d2f6a7c3e18
+Revises: 4b7e2d9c1a05
+Create Date: 2026-10-18 13:40:07.518220
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d2f6a7c3e18'
+down_revision: Union[str, None] = '4b7e2d9c1a05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+INDEXES = [
+    ('ix_users_tg_id', 'users', ['tg_id'], True),
+    ('ix_users_role', 'users', ['role'], False),
+    ('ix_users_restaurant_id_role', 'users', ['restaurant_id', 'role'], False),
+    ('ix_categories_restaurant_id', 'categories', ['restaurant_id'], False),
+    ('ix_dishes_category_id', 'dishes', ['category_id'], False),
+    ('ix_dishes_restaurant_id', 'dishes', ['restaurant_id'], False),
+    ('ix_test_results_user_id', 'test_results', ['user_id'], False),
+]
+
+
+def is_invalid_index(name) -> bool:
+    result = op.get_bind().execute(
+        sa.text("SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+        {"name": name},
+    )
+    return bool(result.scalar())
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in INDEXES:
+            # Прерванный CREATE INDEX CONCURRENTLY оставляет индекс INVALID: его не используют
+            # запросы и не проверяется уникальность, а if_not_exists пропустил бы его
+            if is_invalid_index(name):
+                op.drop_index(name, table_name=table, postgresql_concurrently=True)
+            op.create_index(name, table, columns, unique=unique, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
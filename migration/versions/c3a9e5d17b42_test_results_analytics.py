@@ -0,0 +1,103 @@
+"""Test results analytics
+
+test_results.passed_at becomes timestamptz (was a string) with a (user_id, passed_at)
+index for range scans. Adds per-user and per-restaurant rollup tables and
+backfills them from existing results.
+
+Revision ID: c3a9e5d17b42
+Revises: 9d2f6a7c3e18
+Create Date: 2026-10-18 17:05:12.304118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3a9e5d17b42'
+down_revision: Union[str, None] = '9d2f6a7c3e18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# TEST_PASS_SCORE по умолчанию на момент миграции
+PASS_SCORE = 80
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Строки, которые не похожи на дату или не разбираются (например, '2024-13-45'), превращаются в NULL.
+    # Функция нужна только на время ALTER: USING не может перехватить ошибку приведения
+    op.execute("""
+        CREATE FUNCTION pg_temp.safe_timestamptz(value text) RETURNS timestamptz AS $$
+        BEGIN
+            RETURN value::timestamptz;
+        EXCEPTION WHEN others THEN
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.alter_column(
+        'test_results', 'passed_at',
+        type_=sa.DateTime(timezone=True),
+        existing_type=sa.String(),
+        existing_nullable=True,
+        server_default=sa.func.now(),
+        postgresql_using="CASE WHEN passed_at ~ '^\\d{4}-\\d{2}-\\d{2}' THEN pg_temp.safe_timestamptz(passed_at) END",
+    )
+    op.execute("DROP FUNCTION pg_temp.safe_timestamptz(text)")
+    op.create_index('ix_test_results_user_id_passed_at', 'test_results', ['user_id', 'passed_at'])
+    op.drop_index('ix_test_results_user_id', table_name='test_results', if_exists=True)
+
+    op.create_table(
+        'user_test_stats',
+        sa.Column('user_id', sa.Integer(), sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('restaurant_id', sa.Integer(), sa.ForeignKey('restaurants.id', ondelete='CASCADE'), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('total_score', sa.Integer(), nullable=False),
+        sa.Column('best_score', sa.Integer(), nullable=False),
+        sa.Column('passed_count', sa.Integer(), nullable=False),
+        sa.Column('last_passed_at', sa.DateTime(timezone=True), nullable=True),
+    )
+    op.create_index('ix_user_test_stats_restaurant_id', 'user_test_stats', ['restaurant_id'])
+    op.create_table(
+        'restaurant_test_stats',
+        sa.Column('restaurant_id', sa.Integer(), sa.ForeignKey('restaurants.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('total_score', sa.Integer(), nullable=False),
+        sa.Column('passed_count', sa.Integer(), nullable=False),
+        sa.Column('last_passed_at', sa.DateTime(timezone=True), nullable=True),
+    )
+
+    op.execute(f"""
+        INSERT INTO user_test_stats (user_id, restaurant_id, attempts, total_score, best_score, passed_count, last_passed_at)
+        SELECT t.user_id, u.restaurant_id, count(*), sum(t.score), max(t.score),
+               count(*) FILTER (WHERE t.score >= {PASS_SCORE}), max(t.passed_at)
+        FROM test_results t JOIN users u ON u.id = t.user_id
+        GROUP BY t.user_id, u.restaurant_id
+    """)
+    op.execute("""
+        INSERT INTO restaurant_test_stats (restaurant_id, attempts, total_score, passed_count, last_passed_at)
+        SELECT restaurant_id, sum(attempts), sum(total_score), sum(passed_count), max(last_passed_at)
+        FROM user_test_stats
+        WHERE restaurant_id IS NOT NULL
+        GROUP BY restaurant_id
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('restaurant_test_stats')
+    op.drop_index('ix_user_test_stats_restaurant_id', table_name='user_test_stats')
+    op.drop_table('user_test_stats')
+    op.create_index('ix_test_results_user_id', 'test_results', ['user_id'])
+    op.drop_index('ix_test_results_user_id_passed_at', table_name='test_results')
+    op.alter_column(
+        'test_results', 'passed_at',
+        type_=sa.String(),
+        existing_type=sa.DateTime(timezone=True),
+        existing_nullable=True,
+        server_default=None,
+        postgresql_using="passed_at::text",
+    )
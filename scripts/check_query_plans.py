@@ -0,0 +1,163 @@
+"""
+Проверка планов запросов DAO на локальном Postgres.
+
+Заполняет базу реалистичным объёмом данных (внутри транзакции, которая в конце
+откатывается), выполняет каждый запрос DAO, перехватывает его SQL и прогоняет
+через EXPLAIN. Если в плане есть Seq Scan по таблице приложения — выход с кодом 1.
+Таблицы, которые помещаются в несколько страниц (SMALL_TABLE_PAGES), не проверяются:
+для них последовательное чтение дешевле индекса. Запросы из FULL_SCANS читают таблицу
+целиком по назначению (сборка мусора медиа) — их планы печатаются, но не проверяются.
+
+Схема должна быть накатана: alembic upgrade head.
+Запуск: DATABASE_URL=postgresql+asyncpg://... python -m scripts.check_query_plans
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, text
+
+from database.dao import DAO
+from database.engine import async_session_maker, engine
+
+RESTAURANTS = 300
+CATEGORIES_PER_RESTAURANT = 12
+DISHES_PER_RESTAURANT = 300
+WAITERS_PER_RESTAURANT = 40
+RESULTS_PER_WAITER = 20
+
+TABLES = {"restaurants", "users", "categories", "dishes", "test_results", "user_test_stats", "restaurant_test_stats"}
+SMALL_TABLE_PAGES = 8
+
+SEED = [
+    f"""INSERT INTO restaurants (id, name)
+        SELECT r, 'Ресторан ' || r FROM generate_series(1, {RESTAURANTS}) r""",
+    f"""INSERT INTO categories (id, name, restaurant_id)
+        SELECT (r - 1) * {CATEGORIES_PER_RESTAURANT} + c, 'Категория ' || c, r
+        FROM generate_series(1, {RESTAURANTS}) r, generate_series(1, {CATEGORIES_PER_RESTAURANT}) c""",
+    f"""INSERT INTO dishes (id, name, category_id, restaurant_id, composition, description)
+        SELECT (r - 1) * {DISHES_PER_RESTAURANT} + d, 'Блюдо ' || d,
+               (r - 1) * {CATEGORIES_PER_RESTAURANT} + (d % {CATEGORIES_PER_RESTAURANT}) + 1, r,
+               'мука, яйцо, соль', 'Описание блюда ' || d
+        FROM generate_series(1, {RESTAURANTS}) r, generate_series(1, {DISHES_PER_RESTAURANT}) d""",
+    f"""INSERT INTO users (id, first_name, last_name, tg_username, tg_id, role, restaurant_id)
+        SELECT (r - 1) * ({WAITERS_PER_RESTAURANT} + 1) + w, 'Имя', 'Фамилия', 'user' || r || '_' || w,
+               (100000000 + (r - 1) * ({WAITERS_PER_RESTAURANT} + 1) + w)::text,
+               CASE WHEN w = 0 THEN 'admin' ELSE 'waiter' END, r
+        FROM generate_series(1, {RESTAURANTS}) r, generate_series(0, {WAITERS_PER_RESTAURANT}) w""",
+    """INSERT INTO users (id, first_name, last_name, tg_id, role)
+        VALUES (1000000, 'Супер', 'Админ', '999999999', 'superadmin')""",
+    f"""INSERT INTO test_results (user_id, score, passed_at)
+        SELECT u.id, (random() * 100)::int, now() - (t || ' days')::interval
+        FROM users u, generate_series(1, {RESULTS_PER_WAITER}) t
+        WHERE u.role = 'waiter'""",
+    """INSERT INTO user_test_stats (user_id, restaurant_id, attempts, total_score, best_score, passed_count, last_passed_at)
+        SELECT t.user_id, u.restaurant_id, count(*), sum(t.score), max(t.score),
+               count(*) FILTER (WHERE t.score >= 80), max(t.passed_at)
+        FROM test_results t JOIN users u ON u.id = t.user_id
+        GROUP BY t.user_id, u.restaurant_id""",
+    """INSERT INTO restaurant_test_stats (restaurant_id, attempts, total_score, passed_count, last_passed_at)
+        SELECT restaurant_id, sum(attempts), sum(total_score), sum(passed_count), max(last_passed_at)
+        FROM user_test_stats GROUP BY restaurant_id""",
+    "ANALYZE restaurants, users, categories, dishes, test_results, user_test_stats, restaurant_test_stats",
+]
+
+# (название, вызов DAO). Аргументы подобраны под данные из SEED.
+QUERIES = [
+    ("get_user_by_tg_id", lambda dao: dao.get_user_by_tg_id("100000042")),
+    ("get_user_by_id", lambda dao: dao.get_user_by_id(42)),
+    ("get_users_by_role(superadmin)", lambda dao: dao.get_users_by_role("superadmin")),
+    ("get_staff", lambda dao: dao.get_staff(7, "waiter", after_id=250, limit=21)),
+    ("get_broadcast_recipients", lambda dao: dao.get_broadcast_recipients(7)),
+    ("get_staff_member", lambda dao: dao.get_staff_member(7, 250, role="waiter")),
+    ("get_restaurant", lambda dao: dao.get_restaurant(7)),
+    ("get_category_by_id", lambda dao: dao.get_category_by_id(7)),
+    ("get_category_for_restaurant", lambda dao: dao.get_category_for_restaurant(1, 7)),
+    ("get_categories_by_restaurant", lambda dao: dao.get_categories_by_restaurant(7)),
+    ("get_dish_by_id", lambda dao: dao.get_dish_by_id(7)),
+    ("get_dish_for_restaurant", lambda dao: dao.get_dish_for_restaurant(1, 7)),
+    ("get_dishes_by_category", lambda dao: dao.get_dishes_by_category(7)),
+    ("get_dishes_by_restaurant", lambda dao: dao.get_dishes_by_restaurant(7)),
+    ("get_test_results_by_user", lambda dao: dao.get_test_results_by_user(42)),
+    ("get_test_results_by_user(since)", lambda dao: dao.get_test_results_by_user(
+        42, since=datetime.now(timezone.utc) - timedelta(days=7),
+    )),
+    ("get_restaurant_test_stats", lambda dao: dao.get_restaurant_test_stats(7)),
+    ("get_top_performers", lambda dao: dao.get_top_performers(7)),
+    ("get_category_ids_by_name", lambda dao: dao.get_category_ids_by_name(7)),
+    ("get_dishes_by_key", lambda dao: dao.get_dishes_by_key(7)),
+    ("stream_menu", lambda dao: consume(dao.stream_menu(7))),
+    ("get_media_paths", lambda dao: dao.get_media_paths()),
+]
+FULL_SCANS = {"get_media_paths"}
+
+
+async def consume(rows) -> list:
+    return [row async for row in rows]
+
+
+def seq_scans(plan: dict, checked_tables: set[str]) -> list[str]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in checked_tables:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child, checked_tables))
+    return found
+
+
+def describe(plan: dict) -> str:
+    node = plan["Node Type"]
+    if plan.get("Index Name"):
+        node += f" ({plan['Index Name']})"
+    elif plan.get("Relation Name"):
+        node += f" ({plan['Relation Name']})"
+    children = [describe(child) for child in plan.get("Plans", [])]
+    return f"{node} -> {', '.join(children)}" if children else node
+
+
+async def main() -> int:
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    failed = []
+    async with async_session_maker() as session:
+        connection = await session.connection()
+        for sql in SEED:
+            await session.execute(text(sql))
+        pages = await session.execute(
+            text("SELECT relname, relpages FROM pg_class WHERE relname = ANY(:tables)"),
+            {"tables": list(TABLES)},
+        )
+        checked_tables = {name for name, relpages in pages if relpages > SMALL_TABLE_PAGES}
+        event.listen(engine.sync_engine, "before_cursor_execute", capture)
+        try:
+            for name, query in QUERIES:
+                captured.clear()
+                await query(DAO(session))
+                for statement, parameters in list(captured):
+                    result = await connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+                    plan = result.scalar()[0]["Plan"]
+                    scans = seq_scans(plan, checked_tables)
+                    if name in FULL_SCANS:
+                        print(f"[scan] {name}: {describe(plan)}")
+                        continue
+                    status = "FAIL" if scans else "ok"
+                    print(f"[{status:>4}] {name}: {describe(plan)}")
+                    if scans:
+                        failed.append(name)
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", capture)
+            await session.rollback()
+    await engine.dispose()
+    if failed:
+        print(f"Seq Scan в запросах: {', '.join(failed)}")
+        return 1
+    print("Все проверяемые запросы используют индексы.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))